@@ -1,50 +1,93 @@
+import asyncio
+
 from agno.storage.agent.postgres import PostgresAgentStorage
 from langchain.agents import AgentType, initialize_agent
 from langchain.memory import ConversationBufferMemory
 from langchain.tools import Tool
-from langchain_community.llms import Ollama
 
-from .connection import get_db_string
+from .clusters import CLUSTER_HELP, split_tool_input
+from .connection import close_async_db_pool, get_db_string
 from .metrics_operations import (
+    acheck_degraded_pgs,
+    acheck_recent_osd_crashes,
+    aget_ceph_daemon_counts,
+    aget_cluster_health,
+    aget_cluster_snapshot,
+    aget_diskoccupation,
+    aget_high_latency_osds,
     check_degraded_pgs,
     check_recent_osd_crashes,
     get_ceph_daemon_counts,
     get_cluster_health,
+    get_cluster_snapshot,
     get_diskoccupation,
     get_high_latency_osds,
+    registered_clusters,
 )
+from .intent_router import IntentRouter, format_degraded_pgs, format_tool_output
+from .ollama_client import OllamaLLM
+from .response_cache import response_cache
+from .time_range import TIME_RANGE_HELP
+
+
+def _tool_input(tool):
+    """Lets a tool take "cluster <ip> last 1h" as its single agent input."""
+    return lambda text=None: tool(*split_tool_input(text))
+
+
+def _atool_input(tool):
+    async def call(text=None):
+        return await tool(*split_tool_input(text))
+
+    return call
+
 
 # Define Tools
 tools = [
     Tool(
         name="Get disk occupation",
-        func=get_diskoccupation,
-        description="Fetches the disk occupation per node.",
+        func=_tool_input(get_diskoccupation),
+        coroutine=_atool_input(aget_diskoccupation),
+        description=f"Fetches the disk occupation per node. {TIME_RANGE_HELP} {CLUSTER_HELP}",
     ),
     Tool(
         name="Check degraded PGs",
-        func=check_degraded_pgs,
-        description="Checks degraded PGs.",
+        func=_tool_input(check_degraded_pgs),
+        coroutine=_atool_input(acheck_degraded_pgs),
+        description=f"Checks degraded PGs. {TIME_RANGE_HELP} {CLUSTER_HELP}",
     ),
     Tool(
         name="Check recent OSD crashes",
-        func=check_recent_osd_crashes,
-        description="Checks recent OSD crashes.",
+        func=_tool_input(check_recent_osd_crashes),
+        coroutine=_atool_input(acheck_recent_osd_crashes),
+        description=f"Checks recent OSD crashes. {TIME_RANGE_HELP} {CLUSTER_HELP}",
     ),
     Tool(
         name="Check cluster health",
-        func=get_cluster_health,
-        description="Check cluster health",
+        func=_tool_input(get_cluster_health),
+        coroutine=_atool_input(aget_cluster_health),
+        description=f"Check cluster health. {TIME_RANGE_HELP} {CLUSTER_HELP}",
     ),
     Tool(
         name="Check high latency OSDs",
-        func=get_high_latency_osds,
-        description="Check high latency OSDs",
+        func=_tool_input(get_high_latency_osds),
+        coroutine=_atool_input(aget_high_latency_osds),
+        description=f"Check high latency OSDs. {TIME_RANGE_HELP} {CLUSTER_HELP}",
     ),
     Tool(
         name="Check count of daemons",
-        func=get_ceph_daemon_counts,
-        description="Check count of daemons",
+        func=_tool_input(get_ceph_daemon_counts),
+        coroutine=_atool_input(aget_ceph_daemon_counts),
+        description=f"Check count of daemons. {TIME_RANGE_HELP} {CLUSTER_HELP}",
+    ),
+    Tool(
+        name="Get cluster snapshot",
+        func=_tool_input(get_cluster_snapshot),
+        coroutine=_atool_input(aget_cluster_snapshot),
+        description=(
+            "Gets cluster health, degraded PGs, recent OSD crashes, high latency OSDs, "
+            f"daemon counts and disk occupation in one call. {TIME_RANGE_HELP} {CLUSTER_HELP}"
+        ),
     ),
 ]
 
@@ -60,24 +103,22 @@ if not isinstance(chat_history, list):
     model="mistralai/Mistral-7B-Instruct-v0.1",
     token=HUGGINGFACEHUB_API_TOKEN
 )"""
-llm = Ollama(model="llama3")
+llm = OllamaLLM(model="llama3")
 
 agent_prompt = """You are a Ceph observability assistant. Only answer questions related to Ceph cluster status, health, storage, and performance. 
 If a query is unrelated to Ceph, respond with: 'I can only assist with Ceph-related queries.'
 
 - If the user asks for **disk occupation** (e.g., "Get disk occupation"), always use `Get disk occupation`.
-- If the user asks for **cluster status** (e.g., "What is the status of Cluster 1?"), always use `Check cluster health`.
+- If the user asks for **cluster status** (e.g., "What is the status of cluster 10.0.65.187?"), always use `Check cluster health` with that cluster in the input.
 - If the user asks to **list OSDs**, use `Check count of daemons`.
+- If the user asks for an **overall status** or summary, use `Get cluster snapshot`.
+- If the user asks about **several** of health, degraded PGs, OSD crashes, latency, daemon counts or disk occupation at once, use `Get cluster snapshot` once instead of calling each tool.
 
 Do not make assumptions. Only respond with the correct tool.
 Do NOT guess. Only respond using the correct tool.
 """
 
 
-def query_llm(prompt: str):
-    return llm.text_generation(prompt, max_new_tokens=100)
-
-
 # DB connection
 storage = PostgresAgentStorage(
     table_name="agent_sessions",
@@ -97,20 +138,101 @@ agent = initialize_agent(
 )
 
 
+def _plain(result, time_range):
+    return format_tool_output(result)
+
+
+def _formatted(tool, format_output=_plain):
+    return lambda time_range, cluster=None: format_output(tool(time_range, cluster), time_range)
+
+
+def _aformatted(tool, format_output=_plain):
+    async def call(time_range, cluster=None):
+        return format_output(await tool(time_range, cluster), time_range)
+
+    return call
+
+
+# Known questions are answered by their tool directly, without the LLM
+intent_router = IntentRouter(
+    {
+        "disk_occupation": _formatted(get_diskoccupation),
+        "degraded_pgs": _formatted(check_degraded_pgs, format_degraded_pgs),
+        "osd_crashes": _formatted(check_recent_osd_crashes),
+        "cluster_health": _formatted(get_cluster_health),
+        "high_latency_osds": _formatted(get_high_latency_osds),
+        "daemon_counts": _formatted(get_ceph_daemon_counts),
+        "cluster_snapshot": _formatted(get_cluster_snapshot),
+    },
+    {
+        "disk_occupation": _aformatted(aget_diskoccupation),
+        "degraded_pgs": _aformatted(acheck_degraded_pgs, format_degraded_pgs),
+        "osd_crashes": _aformatted(acheck_recent_osd_crashes),
+        "cluster_health": _aformatted(aget_cluster_health),
+        "high_latency_osds": _aformatted(aget_high_latency_osds),
+        "daemon_counts": _aformatted(aget_ceph_daemon_counts),
+        "cluster_snapshot": _aformatted(aget_cluster_snapshot),
+    },
+    clusters=registered_clusters,
+)
+
+
+def _answer(query: str):
+    response = intent_router.route(query)
+    if response is None:
+        return agent.run(query)
+    # Keep routed answers in the conversation for follow-up questions
+    memory.save_context({"input": query}, {"output": response})
+    return response
+
+
+async def _aanswer(query: str):
+    response = await intent_router.aroute(query)
+    if response is None:
+        return await agent.arun(query)
+    memory.save_context({"input": query}, {"output": response})
+    return response
+
+
 # Process query
 def process_query(query: str):
-    return agent.run(query)
+    found, response, generation = response_cache.get(query)
+    if found:
+        memory.save_context({"input": query}, {"output": response})
+        return response
+    response = _answer(query)
+    response_cache.put(query, response, generation)
+    return response
+
+
+# Async variant: tools are awaited, so concurrent queries share one event loop
+async def aprocess_query(query: str):
+    found, response, generation = await response_cache.aget(query)
+    if found:
+        memory.save_context({"input": query}, {"output": response})
+        return response
+    response = await _aanswer(query)
+    await response_cache.aput(query, response, generation)
+    return response
+
+
+async def amain_agentic():
+    # One event loop for the whole session, so the queries share its async pool
+    try:
+        while True:
+            query = (await asyncio.to_thread(input, "\n💬 Enter command: ")).strip()
+            if query.lower() == "exit":
+                print("👋 Exiting agent...")
+                break
+
+            response = await aprocess_query(query)
+            print(response)
+    finally:
+        await close_async_db_pool()
 
 
 def main_agentic():
-    while True:
-        query = input("\n💬 Enter command: ").strip()
-        if query.lower() == "exit":
-            print("👋 Exiting agent...")
-            break
-
-        response = process_query(query)
-        print(response)
+    asyncio.run(amain_agentic())
 
 
 if __name__ == "__main__":
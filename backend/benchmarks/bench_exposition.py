@@ -0,0 +1,122 @@
+"""Micro-benchmark of the exposition parser against the original parse loop.
+
+Run from the repository root:
+    python3 -m backend.benchmarks.bench_exposition --lines 100000
+"""
+
+import argparse
+import json
+import re
+import time
+
+from backend.exposition import ExpositionParser, _labels_json, label_dict
+
+
+def legacy_parse_labels(label_str):
+    labels = {}
+    label_pattern = r'([a-zA-Z0-9_]+)="([^"]+)"'
+    for match in re.findall(label_pattern, label_str):
+        labels[match[0]] = match[1]
+    return labels
+
+
+def legacy_parse(lines):
+    """The parse loop scrape_metrics used before backend.exposition existed."""
+    samples = []
+    cleaned_list = [line for line in lines if line.strip()]
+    for line in cleaned_list:
+        if line.startswith("#"):
+            continue
+        metric_parts = line.rsplit(" ", 1)
+        metric_name_and_labels = metric_parts[0]
+        metric_value_str = metric_parts[1]
+        metric_name = metric_name_and_labels.split("{")[0]
+        metric_labels_str = (
+            metric_name_and_labels.split("{")[1][:-1]
+            if "{" in metric_name_and_labels
+            else ""
+        )
+        metric_labels = legacy_parse_labels(metric_labels_str)
+        try:
+            metric_value = float(metric_value_str)
+        except ValueError:
+            continue
+        samples.append((metric_name, json.dumps(metric_labels), metric_value))
+    return samples
+
+
+def new_parse(lines):
+    return list(ExpositionParser().parse(lines))
+
+
+def build_fixture(line_count, osds=200, hosts=10):
+    """Ceph mgr style payload where label sets repeat like they do across scrapes."""
+    families = [
+        ("ceph_osd_up", "gauge"),
+        ("ceph_osd_in", "gauge"),
+        ("ceph_osd_apply_latency_ms", "gauge"),
+        ("ceph_osd_commit_latency_ms", "gauge"),
+        ("ceph_osd_op_r", "counter"),
+        ("ceph_osd_op_w", "counter"),
+        ("ceph_osd_metadata", "untyped"),
+        ("ceph_disk_occupation", "untyped"),
+    ]
+    lines = []
+    round_number = 0
+    while len(lines) < line_count:
+        for name, metric_type in families:
+            lines.append(f"# HELP {name} {name.replace('_', ' ')}")
+            lines.append(f"# TYPE {name} {metric_type}")
+            for osd in range(osds):
+                host = f"ceph-node{osd % hosts}"
+                if name == "ceph_osd_metadata":
+                    labels = (
+                        f'back_iface="",ceph_daemon="osd.{osd}",cluster_addr="10.0.0.{osd % 250}",'
+                        f'device_class="ssd",hostname="{host}",'
+                        f'ceph_version="ceph version 19.2.0-79.el9cp (4f3da703296998ada04b48f8565da9952ce77eb8) squid (stable)"'
+                    )
+                elif name == "ceph_disk_occupation":
+                    labels = f'ceph_daemon="osd.{osd}",device="/dev/sdb",instance="{host}:9283"'
+                else:
+                    labels = f'ceph_daemon="osd.{osd}"'
+                lines.append(f"{name}{{{labels}}} {(osd * 7 + round_number) % 300}.0")
+            lines.append("")
+        round_number += 1
+    return lines[:line_count]
+
+
+def run(func, lines, repeat):
+    best = None
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func(lines)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--lines", type=int, default=100000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    lines = build_fixture(args.lines)
+    legacy_time, legacy_samples = run(legacy_parse, lines, args.repeat)
+    _labels_json.cache_clear()
+    new_time, new_samples = run(new_parse, lines, args.repeat)
+
+    mismatches = sum(
+        1
+        for old, new in zip(legacy_samples, new_samples)
+        if (old[0], json.loads(old[1]), old[2]) != (new.name, label_dict(new.labels), new.value)
+    )
+    print(f"fixture: {len(lines)} lines, {len(new_samples)} samples")
+    print(f"legacy parser: {legacy_time:.3f}s ({len(lines) / legacy_time:,.0f} lines/s)")
+    print(f"exposition parser: {new_time:.3f}s ({len(lines) / new_time:,.0f} lines/s)")
+    print(f"speedup: {legacy_time / new_time:.1f}x, samples parsed differently: {mismatches}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,139 @@
+"""Latency and throughput of the tuned Ollama client against per-call clients.
+
+Sends bursts of concurrent generations separated by idle gaps, once the way
+the app used to (a new connection per call, the server's default keep-alive,
+no request queue) and once through backend.ollama_client. By default both run
+against a local Ollama stub whose default keep-alive is shorter than the idle
+gap, so models unloaded between bursts show up as reloads.
+
+Run from the repository root:
+    python3 -m backend.benchmarks.bench_ollama --bursts 3 --burst-size 8
+    python3 -m backend.benchmarks.bench_ollama --url http://localhost:11434 --model llama3
+"""
+
+import argparse
+import json
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+from backend.benchmarks.ollama_stub import add_stub_arguments, serve_in_thread, stub_settings
+from backend.ollama_client import DEFAULT_OPTIONS, OllamaClient
+
+PROMPT = (
+    "You are a Ceph observability assistant. Pick the tool for the question: "
+    "what is the health of cluster 10.0.65.187 in the last hour?"
+)
+
+
+def per_call_generate(url, model, prompt):
+    """One generation the way langchain's Ollama LLM sends it: a fresh
+    connection, server default keep-alive and options."""
+    response = requests.post(
+        f"{url}/api/generate",
+        json={"model": model, "prompt": prompt},
+        stream=True,
+        timeout=300,
+    )
+    with response:
+        response.raise_for_status()
+        return "".join(
+            json.loads(line).get("response", "") for line in response.iter_lines() if line
+        )
+
+
+def run_bursts(generate, bursts, burst_size, idle_seconds):
+    """Latencies of every request and the total wall time, idle gaps excluded."""
+    latencies = []
+    busy_seconds = 0.0
+
+    def timed(_):
+        start = time.perf_counter()
+        generate(PROMPT)
+        return time.perf_counter() - start
+
+    with ThreadPoolExecutor(max_workers=burst_size) as executor:
+        for burst in range(bursts):
+            if burst:
+                time.sleep(idle_seconds)
+            start = time.perf_counter()
+            latencies.extend(executor.map(timed, range(burst_size)))
+            busy_seconds += time.perf_counter() - start
+    return latencies, busy_seconds
+
+
+def server_stats(url):
+    try:
+        return requests.get(f"{url}/stub/stats", timeout=5).json()
+    except (requests.RequestException, ValueError):
+        return None
+
+
+def report(name, latencies, busy_seconds, before, after):
+    latencies = sorted(latencies)
+    p95 = latencies[max(0, round(len(latencies) * 0.95) - 1)]
+    line = (
+        f"{name}: {len(latencies)} requests, p50 {statistics.median(latencies):.2f}s, "
+        f"p95 {p95:.2f}s, max {latencies[-1]:.2f}s, "
+        f"{len(latencies) / busy_seconds:.2f} req/s"
+    )
+    if before and after:
+        line += (
+            f", {after['loads'] - before['loads']} model loads, "
+            f"{after['connections'] - before['connections']} connections"
+        )
+    print(line)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--url", help="Benchmark a real Ollama server instead of the stub")
+    parser.add_argument("--model", default="llama3")
+    parser.add_argument("--bursts", type=int, default=3)
+    parser.add_argument("--burst-size", type=int, default=8)
+    parser.add_argument("--idle-seconds", type=float, default=2.0)
+    parser.add_argument("--max-concurrency", type=int, default=2)
+    parser.add_argument("--keep-alive", default="30m")
+    add_stub_arguments(parser)
+    parser.set_defaults(default_keep_alive="1s", load_seconds=1.0, parallel=2)
+    args = parser.parse_args()
+
+    url = args.url
+    if url is None:
+        server = serve_in_thread(**stub_settings(args))
+        url = server.url
+        print(f"Ollama stub on {url}: {stub_settings(args)}")
+
+    before = server_stats(url)
+    latencies, busy_seconds = run_bursts(
+        lambda prompt: per_call_generate(url, args.model, prompt),
+        args.bursts,
+        args.burst_size,
+        args.idle_seconds,
+    )
+    after = server_stats(url)
+    report("per-call client", latencies, busy_seconds, before, after)
+
+    client = OllamaClient(url, max_concurrent=args.max_concurrency)
+    client.warm_up(args.model, args.keep_alive, DEFAULT_OPTIONS)
+    before = server_stats(url)
+    latencies, busy_seconds = run_bursts(
+        lambda prompt: client.generate(args.model, prompt, DEFAULT_OPTIONS, args.keep_alive),
+        args.bursts,
+        args.burst_size,
+        args.idle_seconds,
+    )
+    after = server_stats(url)
+    report("tuned client", latencies, busy_seconds, before, after)
+    queue = client.stats()
+    print(
+        f"tuned client queue: max {queue['max_waiting']} waiting, "
+        f"avg wait {queue['avg_wait_seconds']:.2f}s, {queue['rejected']} rejected"
+    )
+    client.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,297 @@
+"""Local stand-in for the Ollama HTTP API, to benchmark inference settings offline.
+
+It serves POST /api/generate (streamed NDJSON or one JSON answer) and
+GET /api/tags, /api/ps the way Ollama does, with simulated costs:
+- loading a model takes --load-seconds; it stays loaded for the request's
+  keep_alive (--default-keep-alive when the request has none), and a request
+  with a different num_ctx reloads it, like Ollama does,
+- every prompt token takes --prompt-token-seconds, every generated token
+  --token-seconds; at most --parallel generations run at once.
+GET /stub/stats reports requests, model loads and TCP connections accepted.
+
+Run from the repository root:
+    python3 -m backend.benchmarks.ollama_stub --port 11435
+"""
+
+import argparse
+import json
+import re
+import threading
+import time
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+DEFAULT_NUM_CTX = 2048
+WORDS = "the cluster is healthy and all placement groups are active and clean".split()
+_DURATION = re.compile(r"^(-?\d+(?:\.\d+)?)(ms|s|m|h)?$")
+_UNIT_SECONDS = {"ms": 0.001, "s": 1, "m": 60, "h": 3600, None: 1}
+
+
+def keep_alive_seconds(value, default):
+    """Seconds of an Ollama keep_alive ("5m", 300, -1); None means forever."""
+    if value is None:
+        value = default
+    match = _DURATION.match(str(value).strip())
+    if not match:
+        return keep_alive_seconds(default, 300)
+    seconds = float(match.group(1)) * _UNIT_SECONDS[match.group(2)]
+    return None if seconds < 0 else seconds
+
+
+class StubModels:
+    """Which models are loaded (with which num_ctx) and until when."""
+
+    def __init__(self, load_seconds, default_keep_alive):
+        self.load_seconds = load_seconds
+        self.default_keep_alive = default_keep_alive
+        self._loaded = {}  # model -> (num_ctx, expires_at or None)
+        self._lock = threading.Lock()
+        self.loads = 0
+
+    def ensure_loaded(self, model, num_ctx):
+        """Loads model if needed; returns the load time in seconds."""
+        with self._lock:
+            loaded = self._loaded.get(model)
+            now = time.monotonic()
+            warm = (
+                loaded is not None
+                and loaded[0] == num_ctx
+                and (loaded[1] is None or loaded[1] > now)
+            )
+            load_seconds = 0.0
+            if not warm:
+                # Loading holds the lock: Ollama loads one model at a time
+                time.sleep(self.load_seconds)
+                self.loads += 1
+                load_seconds = self.load_seconds
+            self._loaded[model] = (num_ctx, None)
+            return load_seconds
+
+    def release(self, model, keep_alive):
+        seconds = keep_alive_seconds(keep_alive, self.default_keep_alive)
+        with self._lock:
+            if model in self._loaded:
+                num_ctx, _ = self._loaded[model]
+                expires_at = None if seconds is None else time.monotonic() + seconds
+                self._loaded[model] = (num_ctx, expires_at)
+
+    def running(self):
+        now = time.monotonic()
+        with self._lock:
+            return [
+                {"name": model, "model": model, "num_ctx": num_ctx}
+                for model, (num_ctx, expires_at) in self._loaded.items()
+                if expires_at is None or expires_at > now
+            ]
+
+
+class OllamaStubServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(
+        self,
+        address,
+        load_seconds=2.0,
+        token_seconds=0.02,
+        prompt_token_seconds=0.0005,
+        response_tokens=32,
+        parallel=1,
+        default_keep_alive="5m",
+    ):
+        super().__init__(address, OllamaStubHandler)
+        self.models = StubModels(load_seconds, default_keep_alive)
+        self.token_seconds = token_seconds
+        self.prompt_token_seconds = prompt_token_seconds
+        self.response_tokens = response_tokens
+        self.slots = threading.Semaphore(parallel)
+        self.connections = 0
+        self.requests = 0
+        self._lock = threading.Lock()
+
+    def handle_error(self, request, client_address):
+        # Clients closing their connections, e.g. the per-call baseline
+        pass
+
+    def get_request(self):
+        request = super().get_request()
+        with self._lock:
+            self.connections += 1
+        return request
+
+    def count_request(self):
+        with self._lock:
+            self.requests += 1
+
+    def stats(self):
+        with self._lock:
+            return {
+                "connections": self.connections,
+                "requests": self.requests,
+                "loads": self.models.loads,
+            }
+
+    @property
+    def url(self):
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+
+class OllamaStubHandler(BaseHTTPRequestHandler):
+    # Keep-alive connections, so clients can reuse them
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, body, status=200):
+        data = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _send_chunk(self, body):
+        data = (json.dumps(body) + "\n").encode()
+        self.wfile.write(f"{len(data):X}\r\n".encode() + data + b"\r\n")
+        self.wfile.flush()
+
+    def do_GET(self):
+        if self.path == "/api/tags":
+            self._send_json({"models": [{"name": "llama3", "model": "llama3"}]})
+        elif self.path == "/api/ps":
+            self._send_json({"models": self.server.models.running()})
+        elif self.path == "/stub/stats":
+            self._send_json(self.server.stats())
+        else:
+            self._send_json({"error": "not found"}, 404)
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        try:
+            request = json.loads(self.rfile.read(length) or b"{}")
+        except ValueError:
+            self._send_json({"error": "invalid JSON"}, 400)
+            return
+        if self.path != "/api/generate":
+            self._send_json({"error": "not found"}, 404)
+            return
+        if not request.get("model"):
+            self._send_json({"error": "model is required"}, 400)
+            return
+        self.server.count_request()
+        self.generate(request)
+
+    def generate(self, request):
+        server = self.server
+        model = request["model"]
+        options = request.get("options") or {}
+        keep_alive = request.get("keep_alive")
+        prompt = request.get("prompt")
+        stream = request.get("stream", True)
+        start = time.perf_counter()
+
+        with server.slots:
+            load_seconds = server.models.ensure_loaded(
+                model, options.get("num_ctx", DEFAULT_NUM_CTX)
+            )
+            # No prompt: only load the model
+            if not prompt:
+                server.models.release(model, keep_alive)
+                self._send_json(self._message(model, "", True, start, load_seconds, 0, 0))
+                return
+
+            prompt_tokens = len(prompt.split())
+            time.sleep(prompt_tokens * server.prompt_token_seconds)
+            num_predict = options.get("num_predict", -1)
+            tokens = server.response_tokens if num_predict < 0 else min(num_predict, server.response_tokens)
+
+            if stream:
+                self.send_response(200)
+                self.send_header("Content-Type", "application/x-ndjson")
+                self.send_header("Transfer-Encoding", "chunked")
+                self.end_headers()
+            text = []
+            for index in range(tokens):
+                time.sleep(server.token_seconds)
+                token = WORDS[index % len(WORDS)] + " "
+                if stream:
+                    self._send_chunk(self._message(model, token, False))
+                else:
+                    text.append(token)
+            server.models.release(model, keep_alive)
+
+        final = self._message(
+            model, "" if stream else "".join(text), True, start, load_seconds, prompt_tokens, tokens
+        )
+        if stream:
+            self._send_chunk(final)
+            self.wfile.write(b"0\r\n\r\n")
+            self.wfile.flush()
+        else:
+            self._send_json(final)
+
+    def _message(self, model, text, done, start=None, load_seconds=0, prompt_tokens=0, tokens=0):
+        message = {
+            "model": model,
+            "created_at": datetime.now(timezone.utc).isoformat(),
+            "response": text,
+            "done": done,
+        }
+        if done:
+            message.update(
+                {
+                    "done_reason": "stop",
+                    "total_duration": int((time.perf_counter() - start) * 1e9),
+                    "load_duration": int(load_seconds * 1e9),
+                    "prompt_eval_count": prompt_tokens,
+                    "eval_count": tokens,
+                }
+            )
+        return message
+
+
+def serve_in_thread(host="127.0.0.1", port=0, **settings):
+    """Starts a stub server in a daemon thread; port 0 picks a free port."""
+    server = OllamaStubServer((host, port), **settings)
+    threading.Thread(target=server.serve_forever, name="ollama-stub", daemon=True).start()
+    return server
+
+
+def add_stub_arguments(parser):
+    parser.add_argument("--load-seconds", type=float, default=2.0)
+    parser.add_argument("--token-seconds", type=float, default=0.02)
+    parser.add_argument("--prompt-token-seconds", type=float, default=0.0005)
+    parser.add_argument("--response-tokens", type=int, default=32)
+    parser.add_argument("--parallel", type=int, default=1, help="Like OLLAMA_NUM_PARALLEL")
+    parser.add_argument("--default-keep-alive", default="5m")
+
+
+def stub_settings(args):
+    return {
+        "load_seconds": args.load_seconds,
+        "token_seconds": args.token_seconds,
+        "prompt_token_seconds": args.prompt_token_seconds,
+        "response_tokens": args.response_tokens,
+        "parallel": args.parallel,
+        "default_keep_alive": args.default_keep_alive,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=11435)
+    add_stub_arguments(parser)
+    args = parser.parse_args()
+
+    server = OllamaStubServer((args.host, args.port), **stub_settings(args))
+    print(f"Ollama stub listening on {server.url}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
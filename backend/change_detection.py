@@ -0,0 +1,113 @@
+import os
+import threading
+import time
+
+from psycopg2.extras import execute_values
+
+from .storage import DEFAULT_CLUSTER, STALE_TABLE
+
+# Only samples whose value changed are written in "append" mode; unchanged
+# series are rewritten once per heartbeat so they never look abandoned.
+CHANGES_ONLY = os.getenv("SCRAPE_CHANGES_ONLY", "true").lower() in ("1", "true", "yes")
+HEARTBEAT_SECONDS = float(os.getenv("SCRAPE_HEARTBEAT_SECONDS", "900"))
+
+
+def _same_value(a, b):
+    # NaN never compares equal, but an unchanged NaN is still unchanged
+    return a == b or (a != a and b != b)
+
+
+class ChangeDetector:
+    """Remembers the last written value of every series of one scrape target.
+
+    State changes are staged while a scrape is written and only kept once its
+    transaction commits, so a rolled back scrape is written in full next time.
+    """
+
+    def __init__(self, heartbeat=HEARTBEAT_SECONDS, cluster=DEFAULT_CLUSTER):
+        self.heartbeat = heartbeat
+        self.cluster = cluster
+        self._last = {}  # (metric_name, labels) -> (value, written_at)
+        self._pending = {}
+        self._seen = set()
+        self._now = None
+        self.written = 0
+        self.skipped = 0
+
+    def __len__(self):
+        return len(self._last)
+
+    def begin(self):
+        self._pending = {}
+        self._seen = set()
+        self._now = time.monotonic()
+        self.written = 0
+        self.skipped = 0
+
+    def filter(self, batch):
+        """Returns the samples of batch that have to be written."""
+        changed = []
+        for sample in batch:
+            key = (sample.name, sample.labels)
+            self._seen.add(key)
+            last = self._last.get(key)
+            if (
+                last is not None
+                and _same_value(last[0], sample.value)
+                and self._now - last[1] < self.heartbeat
+            ):
+                continue
+            changed.append(sample)
+            self._pending[key] = (sample.value, self._now)
+        self.written += len(changed)
+        self.skipped += len(batch) - len(changed)
+        return changed
+
+    def filter_batches(self, batches):
+        for batch in batches:
+            changed = self.filter(batch)
+            if changed:
+                yield changed
+
+    def stale_series(self):
+        """Series written before that were missing from the complete scrape."""
+        return [key for key in self._last if key not in self._seen]
+
+    def write_stale_markers(self, cur):
+        stale = self.stale_series()
+        if stale:
+            execute_values(
+                cur,
+                f"INSERT INTO {STALE_TABLE} (cluster, metric_name, labels) VALUES %s",
+                [(self.cluster, *key) for key in stale],
+                template="(%s, %s, %s::jsonb)",
+                page_size=1000,
+            )
+        return stale
+
+    def commit(self, stale=()):
+        for key in stale:
+            # A series that comes back is written again straight away
+            self._last.pop(key, None)
+        self._last.update(self._pending)
+        self._pending = {}
+
+    def rollback(self):
+        self._pending = {}
+
+    def clear(self):
+        self._last.clear()
+        self._pending = {}
+
+
+_detectors = {}
+_detectors_lock = threading.Lock()
+
+
+def get_change_detector(source):
+    """Returns the detector of one scrape target (a cluster or the sample file)."""
+    with _detectors_lock:
+        detector = _detectors.get(source)
+        if detector is None:
+            detector = _detectors[source] = ChangeDetector(cluster=source)
+        return detector
@@ -0,0 +1,137 @@
+"""Connects clusters in the background: SSH check, then a first scrape.
+
+The Streamlit app submits one job per cluster IP and polls their status, so
+the UI stays responsive and connecting many clusters takes about as long as
+the slowest one.
+"""
+
+import itertools
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from .scrape_metricsdata import scrape_error, scrape_metrics
+from .ssh_probe import probe_cluster
+
+CLUSTER_JOB_WORKERS = int(os.getenv("CLUSTER_JOB_WORKERS", "8"))
+# Finished jobs are forgotten after this many seconds
+CLUSTER_JOB_RETENTION = float(os.getenv("CLUSTER_JOB_RETENTION", "3600"))
+
+QUEUED = "queued"
+CHECKING_SSH = "checking ssh"
+SCRAPING = "scraping"
+DONE = "done"
+FAILED = "failed"
+FINISHED = (DONE, FAILED)
+
+
+def check_ssh(ip, username, password):
+    """Logs in and looks up the active mgr; the scrape reuses both."""
+    probe = probe_cluster(ip, username, password)
+    if not probe.authenticated:
+        raise ConnectionError(probe.error)
+    return probe
+
+
+class ClusterJob:
+    """Status of connecting one cluster, updated by the worker thread."""
+
+    def __init__(self, job_id, ip):
+        self.job_id = job_id
+        self.ip = ip
+        self.status = QUEUED
+        self.ssh_ok = None
+        self.error = None
+        self.probe = None  # ssh_probe.ProbeResult
+        self.result = None  # scrape_metrics() stats
+        self.submitted_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+
+    @property
+    def finished(self):
+        return self.status in FINISHED
+
+    def elapsed(self):
+        if self.started_at is None:
+            return 0.0
+        return (self.finished_at or time.time()) - self.started_at
+
+    def snapshot(self):
+        return {
+            "job_id": self.job_id,
+            "ip": self.ip,
+            "status": self.status,
+            "ssh_ok": self.ssh_ok,
+            "active_mgr": self.probe.active_mgr if self.probe else None,
+            "error": self.error,
+            "result": self.result,
+            "elapsed": self.elapsed(),
+        }
+
+
+class ClusterJobManager:
+    """Runs cluster jobs in a thread pool; callers poll get()/jobs()."""
+
+    def __init__(self, max_workers=CLUSTER_JOB_WORKERS, check=check_ssh, scrape=scrape_metrics):
+        self.check = check
+        self.scrape = scrape
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="cluster-job")
+        self._jobs = {}
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+
+    def submit(self, ip, username, password):
+        """Queues a connect job for ip, or returns the one already running for it."""
+        with self._lock:
+            self._forget_old()
+            for job in self._jobs.values():
+                if job.ip == ip and not job.finished:
+                    return job
+            job = ClusterJob(next(self._ids), ip)
+            self._jobs[job.job_id] = job
+        self._executor.submit(self._run, job, username, password)
+        return job
+
+    def _run(self, job, username, password):
+        job.started_at = time.time()
+        status = FAILED
+        try:
+            job.status = CHECKING_SSH
+            job.ssh_ok = False
+            job.probe = self.check(job.ip, username, password)
+            job.ssh_ok = True
+
+            job.status = SCRAPING
+            job.result = self.scrape(job.ip, username, password)
+            error = scrape_error(job.result)
+            if error:
+                raise RuntimeError(error)
+            status = DONE
+        except Exception as err:
+            print(f"Cluster job for {job.ip} failed: {err}")
+            job.error = str(err)
+        finally:
+            # finished_at first: a finished job always has it
+            job.finished_at = time.time()
+            job.status = status
+
+    def _forget_old(self):
+        now = time.time()
+        for job_id, job in list(self._jobs.items()):
+            if job.finished and now - job.finished_at > CLUSTER_JOB_RETENTION:
+                del self._jobs[job_id]
+
+    def get(self, job_id):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def jobs(self, job_ids=None):
+        with self._lock:
+            if job_ids is None:
+                return list(self._jobs.values())
+            return [self._jobs[job_id] for job_id in job_ids if job_id in self._jobs]
+
+    def shutdown(self, wait=False):
+        self._executor.shutdown(wait=wait, cancel_futures=True)
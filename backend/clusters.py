@@ -0,0 +1,58 @@
+"""Cluster references in questions and tool inputs, e.g. "health of cluster 10.0.65.187".
+
+Samples are tagged with the cluster they were scraped from (its IP, or
+"local" for the sample file); tools take that tag as their cluster filter.
+"""
+
+import re
+
+from .time_range import find_time_range
+
+# Tool cluster argument that runs the tool once per registered cluster
+ALL_CLUSTERS = "*"
+
+# Appended to the agent Tool descriptions next to TIME_RANGE_HELP
+CLUSTER_HELP = (
+    "To ask about one cluster add 'cluster <ip>' to the input, "
+    "e.g. 'cluster 10.0.65.187 last 1h'; 'all clusters' answers for each cluster separately."
+)
+
+_IP_SEARCH = re.compile(r"\b(\d{1,3}(?:\.\d{1,3}){3})\b")
+_ALL_SEARCH = re.compile(
+    r"\b(?:all|every|each|across(?:\s+the)?)\s+clusters?\b|\bfleet\b", re.IGNORECASE
+)
+_CLUSTER_NAME_SEARCH = re.compile(r"\bcluster\s+(\d+)\b", re.IGNORECASE)
+
+
+def find_cluster(text):
+    """The cluster a question is about: an IP, ALL_CLUSTERS or None."""
+    if not text:
+        return None
+    match = _IP_SEARCH.search(text)
+    if match:
+        return match.group(1)
+    if _ALL_SEARCH.search(text):
+        return ALL_CLUSTERS
+    return None
+
+
+def expand_cluster_names(text, clusters):
+    """Replaces the UI's cluster names with their IPs, e.g. "Cluster 1" with
+    "cluster 192.168.1.10" for clusters {"Cluster 1": "192.168.1.10"}."""
+    if not clusters:
+        return text
+
+    def replace(match):
+        ip = clusters.get(f"Cluster {match.group(1)}")
+        return f"cluster {ip}" if ip else match.group(0)
+
+    return _CLUSTER_NAME_SEARCH.sub(replace, text)
+
+
+def split_tool_input(text):
+    """(time range text, cluster) of an agent's tool input such as
+    "cluster 10.0.65.187 last 1h"."""
+    cluster = find_cluster(text) if isinstance(text, str) else None
+    if cluster is None:
+        return text, None
+    return find_time_range(text), cluster
@@ -1,10 +1,27 @@
+import asyncio
 import os
+import threading
+import time
+import weakref
+from collections import deque
+from contextlib import asynccontextmanager, contextmanager
 
+import psycopg
 import psycopg2
 from dotenv import load_dotenv
+from psycopg_pool import AsyncConnectionPool
+from psycopg_pool import PoolTimeout as AsyncPoolTimeout
 
 load_dotenv()
 
+POOL_MIN_SIZE = int(os.getenv("POSTGRES_POOL_MIN", "1"))
+POOL_MAX_SIZE = int(os.getenv("POSTGRES_POOL_MAX", "10"))
+# Connections older than this are closed instead of being handed out again
+POOL_MAX_LIFETIME = float(os.getenv("POSTGRES_POOL_MAX_LIFETIME", "1800"))
+# Connections idle for longer than this are checked with SELECT 1 before use
+POOL_HEALTH_CHECK_INTERVAL = float(os.getenv("POSTGRES_POOL_HEALTH_CHECK", "30"))
+POOL_TIMEOUT = float(os.getenv("POSTGRES_POOL_TIMEOUT", "10"))
+
 
 def get_db_string():
     database_string = "postgresql://{user}:{pw}@{host}:{port}/{dbname}"
@@ -20,7 +37,6 @@ def get_db_string():
 # Connect to PostgreSQL
 def get_db_conn():
     db_string = get_db_string()
-    print(f"{db_string = }")
 
     try:
         conn = psycopg2.connect(db_string)
@@ -29,3 +45,284 @@ def get_db_conn():
         print(err_msg)
         return None
     return conn
+
+
+class PoolTimeout(Exception):
+    pass
+
+
+class ConnectionPool:
+    """Thread-safe pool of psycopg2 connections.
+
+    Idle connections are health checked before reuse and recycled once they
+    exceed max_lifetime, so a restarted or failed-over server is picked up
+    without restarting the process.
+    """
+
+    def __init__(
+        self,
+        dsn,
+        min_size=POOL_MIN_SIZE,
+        max_size=POOL_MAX_SIZE,
+        max_lifetime=POOL_MAX_LIFETIME,
+        health_check_interval=POOL_HEALTH_CHECK_INTERVAL,
+        timeout=POOL_TIMEOUT,
+    ):
+        self.dsn = dsn
+        self.min_size = min_size
+        self.max_size = max_size
+        self.max_lifetime = max_lifetime
+        self.health_check_interval = health_check_interval
+        self.timeout = timeout
+
+        self._cond = threading.Condition()
+        self._idle = deque()  # (conn, last_used)
+        self._created_at = {}  # conn -> creation time
+        self._in_use = 0
+        self._reserved = 0  # connections being opened outside the lock
+        self._closed = False
+        self._stats = {
+            "connections_created": 0,
+            "connections_closed": 0,
+            "checkouts": 0,
+            "waits": 0,
+            "wait_seconds": 0.0,
+            "timeouts": 0,
+            "health_check_failures": 0,
+            "recycled": 0,
+        }
+
+    @property
+    def size(self):
+        return len(self._created_at)
+
+    def _connect(self):
+        conn = psycopg2.connect(self.dsn)
+        with self._cond:
+            self._created_at[conn] = time.monotonic()
+            self._stats["connections_created"] += 1
+        return conn
+
+    def _discard(self, conn):
+        try:
+            conn.close()
+        except psycopg2.Error:
+            pass
+        with self._cond:
+            if self._created_at.pop(conn, None) is not None:
+                self._stats["connections_closed"] += 1
+            self._cond.notify()
+
+    def _expired(self, conn, now):
+        return now - self._created_at.get(conn, now) > self.max_lifetime
+
+    def _healthy(self, conn):
+        try:
+            with conn.cursor() as cur:
+                cur.execute("SELECT 1")
+            conn.rollback()
+            return True
+        except psycopg2.Error:
+            return False
+
+    def getconn(self):
+        deadline = time.monotonic() + self.timeout
+        waited_from = None
+        while True:
+            with self._cond:
+                if self._closed:
+                    raise PoolTimeout("Connection pool is closed")
+                if self._idle:
+                    conn, last_used = self._idle.pop()
+                    self._in_use += 1
+                elif self.size + self._reserved < self.max_size:
+                    conn, last_used = None, None
+                    self._in_use += 1
+                    self._reserved += 1
+                else:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self._stats["timeouts"] += 1
+                        raise PoolTimeout(
+                            f"No database connection available after {self.timeout}s"
+                        )
+                    if waited_from is None:
+                        waited_from = time.monotonic()
+                        self._stats["waits"] += 1
+                    self._cond.wait(remaining)
+                    continue
+
+            if conn is None:
+                try:
+                    conn = self._connect()
+                finally:
+                    with self._cond:
+                        self._reserved -= 1
+                        if conn is None:
+                            self._in_use -= 1
+                            self._cond.notify()
+            else:
+                now = time.monotonic()
+                if self._expired(conn, now):
+                    self._release_slot(conn, "recycled")
+                    continue
+                if now - last_used > self.health_check_interval and not self._healthy(conn):
+                    self._release_slot(conn, "health_check_failures")
+                    continue
+
+            with self._cond:
+                self._stats["checkouts"] += 1
+                if waited_from is not None:
+                    self._stats["wait_seconds"] += time.monotonic() - waited_from
+            return conn
+
+    def _release_slot(self, conn, reason=None):
+        with self._cond:
+            self._in_use -= 1
+            if reason:
+                self._stats[reason] += 1
+        self._discard(conn)
+
+    def putconn(self, conn, discard=False):
+        if not discard and not conn.closed:
+            try:
+                # Never hand out a connection with an open transaction
+                if conn.status != psycopg2.extensions.STATUS_READY:
+                    conn.rollback()
+            except psycopg2.Error:
+                discard = True
+
+        if discard or conn.closed or self._closed or self._expired(conn, time.monotonic()):
+            self._release_slot(conn)
+            return
+
+        with self._cond:
+            self._in_use -= 1
+            self._idle.append((conn, time.monotonic()))
+            self._cond.notify()
+
+    @contextmanager
+    def connection(self):
+        conn = self.getconn()
+        discard = False
+        try:
+            yield conn
+        except (psycopg2.OperationalError, psycopg2.InterfaceError):
+            discard = True
+            raise
+        finally:
+            self.putconn(conn, discard=discard)
+
+    def warm_up(self):
+        conns = []
+        try:
+            for _ in range(max(self.min_size - self.size, 0)):
+                conns.append(self.getconn())
+        finally:
+            for conn in conns:
+                self.putconn(conn)
+
+    def stats(self):
+        with self._cond:
+            stats = dict(self._stats)
+            stats.update(
+                size=self.size,
+                idle=len(self._idle),
+                in_use=self._in_use,
+                max_size=self.max_size,
+            )
+        return stats
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            idle = [conn for conn, _ in self._idle]
+            self._idle.clear()
+            self._cond.notify_all()
+        for conn in idle:
+            self._discard(conn)
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_db_pool():
+    """Returns the process-wide pool configured from the POSTGRES_* variables."""
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ConnectionPool(get_db_string())
+    return _pool
+
+
+@contextmanager
+def pooled_connection():
+    """Borrows a pooled connection, yielding None when the database is unreachable."""
+    pool = get_db_pool()
+    try:
+        conn = pool.getconn()
+    except (psycopg2.OperationalError, PoolTimeout) as err:
+        print("DB Connection Error - Error: {}".format(err))
+        yield None
+        return
+
+    discard = False
+    try:
+        yield conn
+    except (psycopg2.OperationalError, psycopg2.InterfaceError):
+        discard = True
+        raise
+    finally:
+        pool.putconn(conn, discard=discard)
+
+
+# One async pool per event loop, since psycopg connections are bound to the loop
+_async_pools = weakref.WeakKeyDictionary()
+
+
+async def get_async_db_pool():
+    """Returns the psycopg 3 pool of the running event loop, opening it on first use."""
+    loop = asyncio.get_running_loop()
+    pool = _async_pools.get(loop)
+    if pool is None:
+        pool = AsyncConnectionPool(
+            get_db_string(),
+            min_size=POOL_MIN_SIZE,
+            max_size=POOL_MAX_SIZE,
+            max_lifetime=POOL_MAX_LIFETIME,
+            timeout=POOL_TIMEOUT,
+            check=AsyncConnectionPool.check_connection,
+            # The tool queries are single read-only statements
+            kwargs={"autocommit": True},
+            open=False,
+        )
+        _async_pools[loop] = pool
+        # Does not wait for the first connection; getconn() reports failures
+        await pool.open(wait=False)
+    return pool
+
+
+@asynccontextmanager
+async def async_pooled_connection():
+    """Async pooled_connection(), yielding None when the database is unreachable."""
+    pool = await get_async_db_pool()
+    try:
+        conn = await pool.getconn()
+    except (psycopg.OperationalError, AsyncPoolTimeout) as err:
+        print("DB Connection Error - Error: {}".format(err))
+        yield None
+        return
+
+    try:
+        yield conn
+    finally:
+        # Broken connections are discarded by the pool
+        await pool.putconn(conn)
+
+
+async def close_async_db_pool():
+    pool = _async_pools.pop(asyncio.get_running_loop(), None)
+    if pool is not None:
+        await pool.close()
@@ -0,0 +1,85 @@
+import argparse
+import json
+
+from .connection import get_db_conn
+from .metrics_operations import TOOL_QUERIES
+from .time_range import parse_time_range
+
+
+def _plan_nodes(plan):
+    yield plan
+    for child in plan.get("Plans", []):
+        yield from _plan_nodes(child)
+
+
+def explain_query(cur, query, params=()):
+    """Runs EXPLAIN (ANALYZE, BUFFERS) and summarises the plan."""
+    cur.execute(f"EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) {query}", params or None)
+    plan = cur.fetchone()[0]
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    root = plan[0]["Plan"]
+    nodes = list(_plan_nodes(root))
+    return {
+        "execution_ms": plan[0].get("Execution Time"),
+        "shared_hit": root.get("Shared Hit Blocks", 0),
+        "shared_read": root.get("Shared Read Blocks", 0),
+        "seq_scans": sorted(
+            {node["Relation Name"] for node in nodes if node["Node Type"] == "Seq Scan"}
+        ),
+        "index_scans": sorted(
+            {
+                node.get("Index Name")
+                for node in nodes
+                if node["Node Type"] in ("Index Scan", "Index Only Scan", "Bitmap Index Scan")
+            }
+        ),
+    }
+
+
+def explain_tool_queries(conn, time_range=None, cluster=None):
+    """Returns {tool: plan summary} for every query in metrics_operations.TOOL_QUERIES."""
+    report = {}
+    time_range = parse_time_range(time_range)
+    for tool, build_query in TOOL_QUERIES.items():
+        cur = conn.cursor()
+        try:
+            report[tool] = explain_query(cur, *build_query(time_range, cluster))
+        except Exception as err:
+            report[tool] = {"error": str(err)}
+        finally:
+            conn.rollback()
+            cur.close()
+    return report
+
+
+def print_report(report):
+    for tool, summary in report.items():
+        if "error" in summary:
+            print(f"❌ {tool}: {summary['error'].strip()}")
+            continue
+        marker = "⚠️" if summary["seq_scans"] else "✅"
+        print(
+            f"{marker} {tool}: {summary['execution_ms']:.2f} ms, "
+            f"buffers hit={summary['shared_hit']} read={summary['shared_read']}"
+        )
+        if summary["seq_scans"]:
+            print(f"    Seq Scan on: {', '.join(summary['seq_scans'])}")
+        if summary["index_scans"]:
+            print(f"    Indexes used: {', '.join(summary['index_scans'])}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="EXPLAIN ANALYZE every tool query and report Seq Scans"
+    )
+    parser.add_argument("--time-range", help="Window the tool queries are explained for")
+    parser.add_argument("--cluster", help="Explain the queries filtered to one cluster")
+    args = parser.parse_args()
+
+    conn = get_db_conn()
+    if not conn:
+        print("Database connection failed. Exiting...")
+    else:
+        print_report(explain_tool_queries(conn, args.time_range, args.cluster))
+        conn.close()
@@ -0,0 +1,155 @@
+"""Streaming parser for the Prometheus text format (0.0.4) and OpenMetrics."""
+
+import json
+import re
+from collections import namedtuple
+from functools import lru_cache
+
+# labels is the canonical JSON of the label set, timestamp is in seconds or None
+Sample = namedtuple("Sample", ["name", "labels", "value", "timestamp"])
+
+_SAMPLE_RE = re.compile(
+    r"([a-zA-Z_:][a-zA-Z0-9_:]*)"  # metric name
+    r"(?:\{((?:[^\"}]|\"(?:[^\"\\]|\\.)*\")*)\})?"  # optional label block
+    r"[ \t]+(\S+)"  # value
+    r"(?:[ \t]+([-+]?[0-9.eE+-]+))?"  # optional timestamp
+    r"(?:[ \t]+#.*)?"  # optional OpenMetrics exemplar
+    r"[ \t]*$"
+)
+_NAME_RE = re.compile(r"[a-zA-Z_:][a-zA-Z0-9_:]*")
+_LABEL_RE = re.compile(r"([a-zA-Z_][a-zA-Z0-9_]*)[ \t]*=[ \t]*\"((?:[^\"\\]|\\.)*)\"")
+_LABEL_PAIR = r"[a-zA-Z_][a-zA-Z0-9_]*[ \t]*=[ \t]*\"(?:[^\"\\]|\\.)*\""
+# A whole label block: comma separated pairs, optionally with a trailing comma
+_LABEL_BLOCK_RE = re.compile(
+    rf"[ \t]*(?:{_LABEL_PAIR}[ \t]*(?:,[ \t]*{_LABEL_PAIR}[ \t]*)*,?[ \t]*)?"
+)
+_ESCAPE_RE = re.compile(r"\\(.)")
+_ESCAPES = {"n": "\n", "\\": "\\", '"': '"'}
+
+EMPTY_LABELS = "{}"
+
+
+def canonical_labels(labels):
+    # One spelling per label set, so the same series always maps to one key
+    return json.dumps(labels, sort_keys=True, separators=(",", ":"))
+
+
+def _unescape(text):
+    if "\\" not in text:
+        return text
+    return _ESCAPE_RE.sub(lambda m: _ESCAPES.get(m.group(1), m.group(0)), text)
+
+
+def parse_label_pairs(label_str):
+    """Parses the inside of a ``{...}`` label block into (name, value) pairs."""
+    return [(name, _unescape(value)) for name, value in _LABEL_RE.findall(label_str)]
+
+
+# Label sets repeat on every scrape, so each distinct block is parsed once
+@lru_cache(maxsize=65536)
+def _labels_json(label_str):
+    if not _LABEL_BLOCK_RE.fullmatch(label_str):
+        return None  # e.g. an unterminated label value
+    return canonical_labels(dict(parse_label_pairs(label_str)))
+
+
+@lru_cache(maxsize=65536)
+def label_dict(labels_json):
+    """Returns the label dict for a Sample's labels; treat it as read-only."""
+    return json.loads(labels_json)
+
+
+class ExpositionParser:
+    """Parses exposition lines and keeps the # TYPE / # HELP / # UNIT metadata."""
+
+    def __init__(self, openmetrics=False):
+        self.openmetrics = openmetrics
+        self.types = {}
+        self.help = {}
+        self.units = {}
+        self.samples = 0
+        self.errors = 0
+        self._valid_names = set()
+
+    def _parse_comment(self, line):
+        parts = line[1:].strip().split(None, 2)
+        if len(parts) < 2:
+            return
+        keyword, name = parts[0], parts[1]
+        text = parts[2] if len(parts) == 3 else ""
+        if keyword == "TYPE":
+            self.types[name] = text
+        elif keyword == "HELP":
+            self.help[name] = _unescape(text)
+        elif keyword == "UNIT":
+            self.units[name] = text
+
+    def _split_sample(self, line):
+        """Splits a sample line into (name, label block, value, timestamp) strings."""
+        # Fast path: with no quoted backslashes or exemplars, the label block
+        # ends at the last '}' and everything after it is value [timestamp].
+        if "\\" not in line and " # " not in line:
+            brace = line.find("{")
+            if brace == -1:
+                parts = line.split()
+                name, label_str = parts[0], None
+                rest = parts[1:]
+            else:
+                close = line.rfind("}")
+                if close < brace:
+                    return None
+                name = line[:brace].rstrip()
+                label_str = line[brace + 1 : close]
+                rest = line[close + 1 :].split()
+            if len(rest) not in (1, 2):
+                return None
+            if name not in self._valid_names:
+                if not _NAME_RE.fullmatch(name):
+                    return None
+                self._valid_names.add(name)
+            return name, label_str, rest[0], rest[1] if len(rest) == 2 else None
+
+        found = _SAMPLE_RE.match(line)
+        return found.groups() if found else None
+
+    def parse(self, lines):
+        split_sample = self._split_sample
+        labels_json = _labels_json
+        for line in lines:
+            if isinstance(line, bytes):
+                line = line.decode("utf-8")
+            line = line.strip()
+            if not line:
+                continue
+            if line[0] == "#":
+                if line == "# EOF":
+                    return
+                self._parse_comment(line)
+                continue
+
+            parts = split_sample(line)
+            if parts is None:
+                self.errors += 1
+                continue
+            name, label_str, value_str, timestamp_str = parts
+            try:
+                value = float(value_str)
+                timestamp = float(timestamp_str) if timestamp_str else None
+            except ValueError:
+                self.errors += 1
+                continue
+            if timestamp is not None and not self.openmetrics:
+                timestamp /= 1000.0  # 0.0.4 timestamps are in milliseconds
+
+            labels = labels_json(label_str) if label_str else EMPTY_LABELS
+            if labels is None:
+                self.errors += 1
+                continue
+
+            self.samples += 1
+            yield Sample(name, labels, value, timestamp)
+
+
+def parse_exposition(lines, openmetrics=False):
+    """Yields a Sample for every sample line in lines."""
+    return ExpositionParser(openmetrics).parse(lines)
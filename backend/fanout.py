@@ -0,0 +1,210 @@
+"""Runs one call per cluster concurrently, e.g. a tool across the whole fleet.
+
+Every target gets FANOUT_TARGET_TIMEOUT seconds from the start of the
+fan-out; targets that have not answered by then are reported as timed out and
+the answers of the others are returned. Ranked results ("highest latency
+OSDs across all clusters") are merged through a bounded heap as they arrive,
+so only the top k rows are ever kept.
+"""
+
+import asyncio
+import heapq
+import itertools
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from concurrent.futures import TimeoutError as FuturesTimeoutError
+
+FANOUT_TARGET_TIMEOUT = float(os.getenv("FANOUT_TARGET_TIMEOUT", "10"))
+# Targets queried at the same time
+FANOUT_CONCURRENCY = int(os.getenv("FANOUT_CONCURRENCY", "16"))
+
+
+class FanOutStatus:
+    """Which targets answered, timed out or failed, and how long it took."""
+
+    def __init__(self, timeout):
+        self.timeout = timeout
+        self.answered = []
+        self.timed_out = []
+        self.failed = {}
+        self.seconds = 0.0
+
+    @property
+    def partial(self):
+        return bool(self.timed_out or self.failed)
+
+    def add(self, target, error):
+        if error is None:
+            self.answered.append(target)
+        elif isinstance(error, (asyncio.TimeoutError, FuturesTimeoutError)):
+            self.timed_out.append(target)
+        else:
+            self.failed[target] = error
+
+    def describe(self):
+        """One line for the answer text, or "" when every target answered."""
+        notes = []
+        if self.timed_out:
+            notes.append(
+                f"no answer from {', '.join(self.timed_out)} within {self.timeout:g}s"
+            )
+        for target, error in self.failed.items():
+            notes.append(f"{target} failed: {error}")
+        if not notes:
+            return ""
+        answered = len(self.answered)
+        total = answered + len(self.timed_out) + len(self.failed)
+        return f"⚠️ Partial result from {answered} of {total} clusters: " + "; ".join(notes)
+
+
+class FanOutResult(dict):
+    """{target: result} of the targets that answered, in target order."""
+
+    def __init__(self, status):
+        super().__init__()
+        self.status = status
+
+    @property
+    def partial(self):
+        return self.status.partial
+
+
+class TopK:
+    """Keeps the k rows with the largest key(row) out of every target's rows."""
+
+    def __init__(self, k, key):
+        self.k = k
+        self.key = key
+        self._heap = []  # min-heap of (key, tie breaker, target, row)
+        self._order = itertools.count()
+
+    def push(self, target, rows):
+        for row in rows:
+            item = (self.key(row), next(self._order), target, row)
+            if len(self._heap) < self.k:
+                heapq.heappush(self._heap, item)
+            elif item[0] > self._heap[0][0]:
+                heapq.heapreplace(self._heap, item)
+
+    def result(self):
+        """[(target, row)], largest first."""
+        ranked = sorted(self._heap, key=lambda item: (-item[0], item[1]))
+        return [(target, row) for _, _, target, row in ranked]
+
+
+def iter_fan_out(call, targets, timeout=FANOUT_TARGET_TIMEOUT, concurrency=FANOUT_CONCURRENCY):
+    """Yields (target, result, error) for every target as it completes.
+
+    call(target) runs in a worker thread. Targets still running when the
+    deadline passes are yielded with a TimeoutError; their threads are left
+    to finish in the background.
+    """
+    targets = list(dict.fromkeys(targets))
+    if not targets:
+        return
+    executor = ThreadPoolExecutor(
+        max_workers=min(concurrency, len(targets)), thread_name_prefix="fan-out"
+    )
+    futures = {executor.submit(call, target): target for target in targets}
+    pending = set(futures)
+    try:
+        for future in as_completed(futures, timeout=timeout):
+            pending.discard(future)
+            try:
+                yield futures[future], future.result(), None
+            except Exception as err:
+                yield futures[future], None, err
+    except FuturesTimeoutError:
+        for future in pending:
+            target = futures[future]
+            if future.done() and future.exception() is None:
+                yield target, future.result(), None
+            else:
+                future.cancel()
+                yield target, None, FuturesTimeoutError(f"{target} timed out")
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+
+
+async def aiter_fan_out(
+    call, targets, timeout=FANOUT_TARGET_TIMEOUT, concurrency=FANOUT_CONCURRENCY
+):
+    """iter_fan_out() for a coroutine function; timed out calls are cancelled."""
+    targets = list(dict.fromkeys(targets))
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def limited(target):
+        async with semaphore:
+            return await call(target)
+
+    async def run(target):
+        try:
+            return target, await asyncio.wait_for(limited(target), timeout), None
+        except Exception as err:
+            return target, None, err
+
+    for next_done in asyncio.as_completed([run(target) for target in targets]):
+        yield await next_done
+
+
+def _collect(targets, completed, status, start):
+    results = {}
+    for target, result, error in completed:
+        status.add(target, error)
+        if error is None:
+            results[target] = result
+        elif not isinstance(error, (asyncio.TimeoutError, FuturesTimeoutError)):
+            print(f"Fan-out to {target} failed: {error}")
+    fan_out_result = FanOutResult(status)
+    fan_out_result.update((target, results[target]) for target in targets if target in results)
+    status.seconds = time.perf_counter() - start
+    return fan_out_result
+
+
+def fan_out(call, targets, timeout=FANOUT_TARGET_TIMEOUT, concurrency=FANOUT_CONCURRENCY):
+    """Returns FanOutResult {target: call(target)} of the targets that answered in time."""
+    start = time.perf_counter()
+    targets = list(dict.fromkeys(targets))
+    completed = list(iter_fan_out(call, targets, timeout, concurrency))
+    return _collect(targets, completed, FanOutStatus(timeout), start)
+
+
+async def afan_out(call, targets, timeout=FANOUT_TARGET_TIMEOUT, concurrency=FANOUT_CONCURRENCY):
+    start = time.perf_counter()
+    targets = list(dict.fromkeys(targets))
+    completed = [item async for item in aiter_fan_out(call, targets, timeout, concurrency)]
+    return _collect(targets, completed, FanOutStatus(timeout), start)
+
+
+def fan_out_top_k(
+    call, targets, k, key, timeout=FANOUT_TARGET_TIMEOUT, concurrency=FANOUT_CONCURRENCY
+):
+    """Merges the rows call(target) returns into the k with the largest key.
+
+    Returns ([(target, row)], FanOutStatus); rows are merged as each target
+    answers, never collected per target.
+    """
+    start = time.perf_counter()
+    status = FanOutStatus(timeout)
+    top = TopK(k, key)
+    for target, rows, error in iter_fan_out(call, targets, timeout, concurrency):
+        status.add(target, error)
+        if error is None:
+            top.push(target, rows)
+    status.seconds = time.perf_counter() - start
+    return top.result(), status
+
+
+async def afan_out_top_k(
+    call, targets, k, key, timeout=FANOUT_TARGET_TIMEOUT, concurrency=FANOUT_CONCURRENCY
+):
+    start = time.perf_counter()
+    status = FanOutStatus(timeout)
+    top = TopK(k, key)
+    async for target, rows, error in aiter_fan_out(call, targets, timeout, concurrency):
+        status.add(target, error)
+        if error is None:
+            top.push(target, rows)
+    status.seconds = time.perf_counter() - start
+    return top.result(), status
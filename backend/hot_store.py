@@ -0,0 +1,189 @@
+import math
+import os
+import threading
+import time
+from array import array
+
+from .exposition import label_dict
+from .storage import STORAGE_MODE
+
+# Scrapes kept in memory per scrape target; 0 disables the hot store
+HOT_STORE_SCRAPES = int(os.getenv("METRICS_HOT_STORE_SCRAPES", "0"))
+
+_MISSING = math.nan
+
+
+class ScrapeRing:
+    """The last `size` scrapes of one target, one value column per series.
+
+    Each series is an array('d') of `size` slots (NaN where the series was
+    not reported), indexed like the shared array of scrape timestamps.
+    """
+
+    def __init__(self, size, source=None):
+        self.size = size
+        self.source = source
+        self.timestamps = array("d", [_MISSING] * size)
+        self.series = {}  # (metric_name, labels) -> array('d')
+        self.by_metric = {}  # metric_name -> {labels: (label dict, array('d'))}
+        self.head = -1  # slot of the latest scrape
+        self.count = 0
+
+    def add_scrape(self, timestamp, values):
+        slot = (self.head + 1) % self.size
+        for column in self.series.values():
+            column[slot] = _MISSING
+        for key, value in values.items():
+            column = self.series.get(key)
+            if column is None:
+                column = array("d", [_MISSING] * self.size)
+                self.series[key] = column
+                self.by_metric.setdefault(key[0], {})[key[1]] = (label_dict(key[1]), column)
+            column[slot] = value
+        self.timestamps[slot] = timestamp
+        self.head = slot
+        self.count = min(self.count + 1, self.size)
+        if slot == 0:
+            self._drop_absent()
+
+    def _drop_absent(self):
+        # Series missing from every held scrape only cost memory
+        for key, column in list(self.series.items()):
+            if all(math.isnan(value) for value in column):
+                del self.series[key]
+                del self.by_metric[key[0]][key[1]]
+
+    def slots(self, since=None):
+        """Slots from newest to oldest, down to the first one at or before since."""
+        slots = []
+        for age in range(self.count):
+            slot = (self.head - age) % self.size
+            slots.append(slot)
+            if since is None or self.timestamps[slot] <= since:
+                break
+        return slots
+
+    def covers(self, since):
+        if not self.count:
+            return False
+        oldest = (self.head - self.count + 1) % self.size
+        return self.timestamps[oldest] <= since
+
+
+class HotWindow:
+    """Read-only view of the held scrapes that fall inside a window."""
+
+    def __init__(self, selections):
+        self._selections = selections  # [(ScrapeRing, slots)]
+
+    def split(self):
+        """One window per scrape target, i.e. per cluster."""
+        return [HotWindow([selection]) for selection in self._selections]
+
+    @property
+    def cluster(self):
+        """The target of a window returned by split()."""
+        return self._selections[0][0].source
+
+    def samples(self, metric_name):
+        """Yields (labels dict, timestamp, value) like a row of the metric table."""
+        for ring, slots in self._selections:
+            timestamps = ring.timestamps
+            for labels, column in ring.by_metric.get(metric_name, {}).values():
+                for slot in slots:
+                    value = column[slot]
+                    if value == value:  # not NaN, i.e. reported in that scrape
+                        yield labels, timestamps[slot], value
+
+
+class HotStore:
+    """In-process copy of the most recent scrapes, so recent-window tool
+    calls can be answered without a database round trip."""
+
+    def __init__(self, size=HOT_STORE_SCRAPES):
+        self.size = size
+        self._rings = {}
+        self._staged = {}  # source -> (timestamp, values) of a scrape not committed yet
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def enabled(self):
+        return self.size > 0
+
+    def record_batches(self, source, batches):
+        """Passes batches through, staging their samples for commit(source)."""
+        values = {}
+        for batch in batches:
+            for sample in batch:
+                values[(sample.name, sample.labels)] = sample.value
+            yield batch
+        # Only reached when the whole scrape was read
+        with self._lock:
+            self._staged[source] = (time.time(), values)
+
+    def commit(self, source):
+        """Serves the staged scrape of source; call once its transaction committed."""
+        with self._lock:
+            staged = self._staged.pop(source, None)
+            if staged is None:
+                return
+            ring = self._rings.get(source)
+            if ring is None:
+                ring = self._rings[source] = ScrapeRing(self.size, source)
+            ring.add_scrape(*staged)
+
+    def rollback(self, source):
+        with self._lock:
+            self._staged.pop(source, None)
+
+    def query(self, answer, time_range, storage_mode=None, cluster=None):
+        """Returns answer(HotWindow), or None when the window reaches past the held scrapes.
+
+        cluster restricts the window to the scrapes of that one source.
+        """
+        if not self.enabled:
+            return None
+        storage_mode = storage_mode or STORAGE_MODE
+        with self._lock:
+            if cluster is None:
+                rings = list(self._rings.values())
+            else:
+                rings = [self._rings[cluster]] if cluster in self._rings else []
+            if not rings:
+                self.misses += 1
+                return None
+            if storage_mode != "append":
+                # Like the snapshot tables: just the latest scrape
+                selections = [(ring, ring.slots()[:1]) for ring in rings]
+            else:
+                seconds = time_range.seconds()
+                if seconds is None or time_range.end is not None:
+                    self.misses += 1
+                    return None
+                since = time.time() - seconds
+                if not all(ring.covers(since) for ring in rings):
+                    self.misses += 1
+                    return None
+                selections = [(ring, ring.slots(since)) for ring in rings]
+            self.hits += 1
+            return answer(HotWindow(selections))
+
+    def stats(self):
+        with self._lock:
+            return {
+                "targets": len(self._rings),
+                "series": sum(len(ring.series) for ring in self._rings.values()),
+                "scrapes": {source: ring.count for source, ring in self._rings.items()},
+                "hits": self.hits,
+                "misses": self.misses,
+            }
+
+    def clear(self):
+        with self._lock:
+            self._rings.clear()
+            self._staged.clear()
+
+
+hot_store = HotStore()
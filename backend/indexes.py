@@ -0,0 +1,151 @@
+import argparse
+import hashlib
+import os
+
+from .connection import get_db_conn
+from .storage import (
+    MAX_IDENTIFIER_LENGTH,
+    SAMPLES_TABLE,
+    SERIES_TABLE,
+    TABLE_PREFIX,
+    TABLE_SUFFIX,
+    TransactionCache,
+    commit_caches,
+    lock_schema,
+    rollback_caches,
+)
+
+# Label keys the tool queries filter and group on
+INDEXED_LABELS = [
+    key
+    for key in os.getenv("METRICS_INDEXED_LABELS", "ceph_daemon,hostname,instance").split(",")
+    if key
+]
+
+_indexed_tables = TransactionCache()
+
+
+def index_name(table_name, suffix):
+    name = f"{table_name}_{suffix}"
+    if len(name) <= MAX_IDENTIFIER_LENGTH:
+        return name
+    digest = hashlib.md5(name.encode()).hexdigest()[:8]
+    keep = MAX_IDENTIFIER_LENGTH - len(digest) - len(suffix) - 2
+    return f"{table_name[:keep]}_{digest}_{suffix}"
+
+
+def metric_index_statements(table_name, label_keys):
+    """CREATE INDEX statements for one per-metric table."""
+    statements = []
+    for key in INDEXED_LABELS:
+        if key not in label_keys:
+            continue
+        # Serves both the label filter/GROUP BY and the ORDER BY timestamp
+        # of the window queries, e.g. LAG() per ceph_daemon.
+        statements.append(
+            f"CREATE INDEX IF NOT EXISTS {index_name(table_name, key + '_idx')} "
+            f"ON {table_name} ((labels->>'{key}'), timestamp)"
+        )
+    # Per-cluster questions only read that cluster's rows
+    statements.append(
+        f"CREATE INDEX IF NOT EXISTS {index_name(table_name, 'cluster_ts_idx')} "
+        f"ON {table_name} (cluster, timestamp)"
+    )
+    statements.append(
+        f"CREATE INDEX IF NOT EXISTS {index_name(table_name, 'ts_brin')} "
+        f"ON {table_name} USING BRIN (timestamp)"
+    )
+    return statements
+
+
+def obsolete_index_statements(table_name):
+    """DROP INDEX statements for indexes no tool query uses, e.g. the GIN
+    index on labels: the queries extract label keys, they never test containment."""
+    return [f"DROP INDEX IF EXISTS {index_name(table_name, 'labels_gin')}"]
+
+
+def narrow_index_statements():
+    statements = [
+        f"CREATE INDEX IF NOT EXISTS {SERIES_TABLE}_{key}_idx "
+        f"ON {SERIES_TABLE} (metric_name, (labels->>'{key}'))"
+        for key in INDEXED_LABELS
+    ]
+    statements += [
+        f"CREATE INDEX IF NOT EXISTS {SERIES_TABLE}_cluster_idx "
+        f"ON {SERIES_TABLE} (cluster, metric_name)",
+        f"CREATE INDEX IF NOT EXISTS {SAMPLES_TABLE}_series_ts_idx "
+        f"ON {SAMPLES_TABLE} (series_id, ts)",
+        f"CREATE INDEX IF NOT EXISTS {SAMPLES_TABLE}_ts_brin "
+        f"ON {SAMPLES_TABLE} USING BRIN (ts)",
+    ]
+    return statements
+
+
+def ensure_metric_indexes(cur, table_name, label_keys):
+    # Indexes created on a partitioned table cascade to every partition
+    if _indexed_tables.get(cur, table_name):
+        return
+    lock_schema(cur)
+    for statement in metric_index_statements(table_name, label_keys):
+        cur.execute(statement)
+    _indexed_tables.set(cur, table_name)
+
+
+def ensure_narrow_indexes(cur):
+    if _indexed_tables.get(cur, SAMPLES_TABLE):
+        return
+    lock_schema(cur)
+    for statement in narrow_index_statements():
+        cur.execute(statement)
+    _indexed_tables.set(cur, SAMPLES_TABLE)
+
+
+def metric_tables(cur):
+    """Top-level per-metric tables, skipping the partitions of partitioned ones."""
+    cur.execute(
+        """
+        SELECT relname FROM pg_class
+        WHERE relkind IN ('r', 'p') AND NOT relispartition
+          AND relname LIKE %s AND relname LIKE %s
+        ORDER BY relname
+        """,
+        (f"{TABLE_PREFIX}%", f"%{TABLE_SUFFIX}"),
+    )
+    return [row[0] for row in cur.fetchall()]
+
+
+def create_all_indexes(conn):
+    """Indexes every existing metric table, e.g. after upgrading."""
+    cur = conn.cursor()
+    try:
+        for table_name in metric_tables(cur):
+            cur.execute(f"SELECT labels FROM {table_name} WHERE labels IS NOT NULL LIMIT 1")
+            row = cur.fetchone()
+            ensure_metric_indexes(cur, table_name, row[0] if row else {})
+            for statement in obsolete_index_statements(table_name):
+                cur.execute(statement)
+        cur.execute("SELECT to_regclass(%s), to_regclass(%s)", (SERIES_TABLE, SAMPLES_TABLE))
+        if all(cur.fetchone()):
+            ensure_narrow_indexes(cur)
+            cur.execute(f"DROP INDEX IF EXISTS {SERIES_TABLE}_labels_gin")
+        conn.commit()
+        commit_caches(conn)
+    except Exception as err:
+        print(f"Index error: {err}")
+        conn.rollback()
+        rollback_caches(conn)
+    finally:
+        cur.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Manage metric table indexes")
+    parser.add_argument("--create", action="store_true", help="Index every existing metric table")
+    parser.parse_args()
+
+    conn = get_db_conn()
+    if not conn:
+        print("Database connection failed. Exiting...")
+    else:
+        create_all_indexes(conn)
+        conn.close()
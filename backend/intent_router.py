@@ -0,0 +1,204 @@
+"""Answers the common, unambiguous questions without an LLM round trip.
+
+The router matches a question against keyword patterns per intent and calls
+the matching tool directly. Questions that match no intent, more than one, or
+that ask for reasoning ("why", "how do I") fall through to the agent.
+"""
+
+import asyncio
+import os
+import re
+
+from .clusters import ALL_CLUSTERS, find_cluster
+from .fanout import afan_out, fan_out
+from .time_range import find_time_range, tool_time_range
+
+INTENT_ROUTER_ENABLED = os.getenv("INTENT_ROUTER", "true").lower() in ("1", "true", "yes")
+# Longer questions are rarely a plain lookup
+INTENT_ROUTER_MAX_WORDS = int(os.getenv("INTENT_ROUTER_MAX_WORDS", "25"))
+
+# intent -> patterns, any of which selects it
+INTENT_PATTERNS = {
+    "disk_occupation": [
+        r"\bdisk\b",
+        r"\boccupation\b",
+        r"\b(?:storage|capacity)\b.*\b(?:usage|used|full|left)\b",
+    ],
+    "degraded_pgs": [r"\bdegraded\b"],
+    "osd_crashes": [
+        r"\bcrash",
+        r"\bosds?\b.*\b(?:down|failed|failures?)\b",
+        r"\b(?:down|failed)\b.*\bosds?\b",
+    ],
+    "cluster_health": [
+        r"\bhealth",
+        r"\bcluster\s+status\b",
+        r"\bstatus\s+of\s+(?:the\s+)?cluster\b",
+    ],
+    "high_latency_osds": [r"\blatenc", r"\bslow\b.*\bosds?\b"],
+    "daemon_counts": [
+        r"\bdaemons?\b",
+        r"\b(?:count|number|how many)\b.*\b(?:osds?|mons?|mgrs?|monitors?|managers?)\b",
+        r"\blist\b.*\bosds?\b",
+    ],
+    "cluster_snapshot": [
+        r"\b(?:overall|full|complete|general)\b.*\bstatus\b",
+        r"\bsnapshot\b",
+        r"\boverview\b",
+        r"\bsummary\b|\bsummari[sz]e\b",
+    ],
+}
+# Intents whose handler merges all clusters itself (e.g. the fleet's top
+# latency OSDs), instead of answering once per cluster
+FLEET_INTENTS = {"high_latency_osds"}
+# The snapshot answers every other intent, so it wins when matched with them
+SUPERSEDES = {"cluster_snapshot": set(INTENT_PATTERNS) - {"cluster_snapshot"}}
+# Questions that need reasoning, not just a lookup
+FALL_THROUGH_PATTERN = re.compile(
+    r"\bwhy\b|\bhow\s+(?:do|can|to|should|would)\b|\bexplain\b|\bfix\b|\brecommend"
+    r"|\bcompare\b|\bwhat if\b|\bshould\b",
+    re.IGNORECASE,
+)
+
+_COMPILED_PATTERNS = {
+    intent: [re.compile(pattern, re.IGNORECASE) for pattern in patterns]
+    for intent, patterns in INTENT_PATTERNS.items()
+}
+
+
+def match_intent(query):
+    """Returns (intent, time range text or None, cluster or None), or None when
+    the LLM should decide."""
+    if len(query.split()) > INTENT_ROUTER_MAX_WORDS or FALL_THROUGH_PATTERN.search(query):
+        return None
+    matched = {
+        intent
+        for intent, patterns in _COMPILED_PATTERNS.items()
+        if any(pattern.search(query) for pattern in patterns)
+    }
+    for intent, superseded in SUPERSEDES.items():
+        if intent in matched:
+            matched -= superseded
+    if len(matched) != 1:
+        return None
+    return matched.pop(), find_time_range(query), find_cluster(query)
+
+
+def format_tool_output(result):
+    """Renders a tool's str/dict/list result as the text of a chat answer."""
+    if result is None:
+        return "⚠️ No data available."
+    if isinstance(result, str):
+        return "\n".join(line.strip() for line in result.strip().splitlines() if line.strip())
+    if isinstance(result, list):
+        return "\n".join(format_tool_output(item) for item in result)
+    if isinstance(result, dict):
+        if "partial" in result:
+            rest = {key: value for key, value in result.items() if key != "partial"}
+            return f"{format_tool_output(rest)}\n\n{result['partial']}"
+        if "osd_id" in result:
+            return f"{result['osd_id']}: {result['max_latency']} ms, {result['status']}"
+        fields = {key: value for key, value in result.items() if key != "status"}
+        if len(fields) == 1:
+            # e.g. {"status": ..., "health": ...} or {"high_latency_osds": [...]}
+            return format_tool_output(next(iter(fields.values())))
+        lines = []
+        for key, value in fields.items():
+            text = format_tool_output(value)
+            separator = "\n" if "\n" in text else " "
+            lines.append(f"**{key.replace('_', ' ').capitalize()}**:{separator}{text}")
+        return "\n\n".join(lines)
+    return str(result)
+
+
+def format_degraded_pgs(result, time_range=None):
+    """The "True"/"False" of the degraded PGs tool as a sentence."""
+    if result == "True":
+        return f"🟡 Degraded PGs detected ({tool_time_range(time_range)})."
+    if result == "False":
+        return f"✅ No degraded PGs ({tool_time_range(time_range)})."
+    return format_tool_output(result)
+
+
+def cluster_sections(answers):
+    """{cluster: answer} as a single chat answer, one section per cluster.
+
+    For a fanout.FanOutResult the clusters that did not answer are noted.
+    """
+    status = getattr(answers, "status", None)
+    if not answers and not (status and status.partial):
+        return "⚠️ No clusters have been scraped yet."
+    sections = [f"### Cluster {cluster}\n{answer}" for cluster, answer in answers.items()]
+    if status and status.partial:
+        sections.append(status.describe())
+    return "\n\n".join(sections)
+
+
+class IntentRouter:
+    """Calls handlers[intent](time_range, cluster) for questions that match an intent.
+
+    Handlers return the answer text; async_handlers, when given, are awaited
+    by aroute() instead. With clusters (a function listing the registered
+    clusters), questions about all clusters get one answer per cluster,
+    queried concurrently; FLEET_INTENTS handlers get ALL_CLUSTERS instead.
+    """
+
+    def __init__(
+        self, handlers, async_handlers=None, enabled=INTENT_ROUTER_ENABLED, clusters=None
+    ):
+        self.handlers = handlers
+        self.async_handlers = async_handlers or {}
+        self.enabled = enabled
+        self.clusters = clusters
+        self.routed = 0
+        self.fell_through = 0
+
+    def _match(self, query):
+        match = match_intent(query) if self.enabled else None
+        if match is None or match[0] not in self.handlers:
+            self.fell_through += 1
+            return None
+        self.routed += 1
+        print(
+            f"Routed to {match[0]} ({match[1] or 'default time range'}, "
+            f"cluster {match[2] or 'any'})"
+        )
+        return match
+
+    def _per_cluster(self, intent, cluster):
+        return (
+            cluster == ALL_CLUSTERS
+            and self.clusters is not None
+            and intent not in FLEET_INTENTS
+        )
+
+    def route(self, query):
+        """The answer to query, or None when it should go to the LLM."""
+        match = self._match(query)
+        if match is None:
+            return None
+        intent, time_range, cluster = match
+        handler = self.handlers[intent]
+        if self._per_cluster(intent, cluster):
+            answers = fan_out(lambda name: handler(time_range, name), self.clusters())
+            return cluster_sections(answers)
+        return handler(time_range, cluster)
+
+    async def aroute(self, query):
+        match = self._match(query)
+        if match is None:
+            return None
+        intent, time_range, cluster = match
+
+        async def answer(name):
+            if intent in self.async_handlers:
+                return await self.async_handlers[intent](time_range, name)
+            return await asyncio.to_thread(self.handlers[intent], time_range, name)
+
+        if self._per_cluster(intent, cluster):
+            clusters = await asyncio.to_thread(self.clusters)
+            return cluster_sections(await afan_out(answer, clusters))
+        return await answer(cluster)
+
+    def stats(self):
+        return {"routed": self.routed, "fell_through": self.fell_through}
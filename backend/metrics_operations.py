@@ -1,278 +1,774 @@
-import os
-import sys
-
-sys.path.append(os.path.dirname(os.path.abspath(__file__)))
-from connection import get_db_conn
-
-
-# Tool Functions
-def get_diskoccupation():
-    print("get_diskoccupation function called")
-    query_disk_occupation = """
+from datetime import datetime
+
+from .change_detection import CHANGES_ONLY, HEARTBEAT_SECONDS
+from .clusters import ALL_CLUSTERS
+from .connection import async_pooled_connection, pooled_connection
+from . import fanout
+from .hot_store import hot_store
+from .rollups import windowed_source
+from .storage import STORAGE_MODE, list_clusters_query, metric_source
+from .time_range import tool_time_range
+from .tool_cache import cached_tool
+
+# Unchanged series are only rewritten once per heartbeat, so the value a
+# series holds at the start of a window may have been written before it.
+HOLD_SECONDS = HEARTBEAT_SECONDS if CHANGES_ONLY else 0
+# OSDs listed by the high latency tool, per cluster and fleet-wide
+HIGH_LATENCY_OSDS_LIMIT = 5
+
+
+def window(time_range, cluster=None, column="timestamp"):
+    conditions, params = [], []
+    # A "replace" snapshot only ever holds the latest scrape
+    if STORAGE_MODE == "append":
+        condition, params = time_range.where(column, lookback=HOLD_SECONDS)
+        conditions.append(condition)
+    if cluster is not None:
+        conditions.append("cluster = %s")
+        params = params + [cluster]
+    return " AND ".join(conditions) or "TRUE", params
+
+
+# Tool Queries, each returning (query, params) for a TimeRange and an
+# optional cluster; without one they cover every cluster
+def disk_occupation_query(time_range, cluster=None):
+    # Summing every sample in the window would count each series once per
+    # scrape (and, with changes-only writes, a different number of times per
+    # series), so only the latest value of each series is summed.
+    source, source_params = windowed_source("ceph_disk_occupation", time_range, aggregate="last")
+    condition, params = window(time_range, cluster)
+    query = f"""
         SELECT 
-            labels->>'instance' AS instance, 
+            instance, 
             SUM(value) AS total_disk_occupation 
-        FROM ceph_cephdiskoccupation_metrics 
+        FROM (
+            SELECT DISTINCT ON (cluster, metric_name, labels)
+                labels->>'instance' AS instance, value
+            FROM {source}
+            WHERE {condition}
+            ORDER BY cluster, metric_name, labels, timestamp DESC
+        ) latest
         GROUP BY instance;
         """
+    return query, source_params + params
 
-    conn = get_db_conn()
-    if not conn:
-        return "❌ Database connection failed."
-    cursor = conn.cursor()
-    try:
-        cursor.execute(query_disk_occupation)
-        disk_occupation_results = cursor.fetchall()
-
-        print("\n### Ceph Disk Occupation Per Node ###")
-
-        occupation_results = []
-        for row in disk_occupation_results:
-            occupation_results.append(f"Node: {row[0]}, Disk Occupation: {row[1]}")
 
-        print(f"{occupation_results = }")
-
-        return "\n".join(occupation_results)
-    except Exception as e:
-        print("❌ Error getting disk occupation status:", e)
-    finally:
-        cursor.close()
-        conn.close()
-
-
-def check_degraded_pgs():
+def degraded_pgs_query(time_range, cluster=None):
     # Query to check if any degraded PGs exist
-    query = """
+    source, source_params = windowed_source("ceph_pg_degraded", time_range, aggregate="max")
+    condition, params = window(time_range, cluster)
+    query = f"""
     SELECT 
         CASE 
             WHEN MAX(value) > 0 THEN 'True'
             ELSE 'False'
         END AS degraded_pgs
-    FROM ceph_cephpgdegraded_metrics;
+    FROM {source}
+    WHERE {condition};
     """
-    conn = get_db_conn()
-    if not conn:
-        return "❌ Database connection failed."
-    cursor = conn.cursor()
-    try:
-        cursor.execute(query)
-        result = cursor.fetchone()[0]
-
-        print(f"Degraded PGs: {result}")
-        cursor.close()
-        conn.close()
-        return result
-
-    except Exception as e:
-        print("❌ Error checking degraded PGs:", e)
-    finally:
-        cursor.close()
-        conn.close()
+    return query, source_params + params
 
 
-def check_recent_osd_crashes():
+def osd_crashes_query(time_range, cluster=None):
     # Query to check if any failed OSDs exist
-    query = """
+    source, source_params = metric_source("ceph_osd_up")
+    condition, params = window(time_range, cluster)
+    query = f"""
         WITH osd_status AS (
         SELECT 
             labels->>'ceph_daemon' AS osd_id, 
             value, 
             timestamp,
             LAG(value) OVER (
-                PARTITION BY labels->>'ceph_daemon' 
+                PARTITION BY cluster, labels->>'ceph_daemon' 
                 ORDER BY timestamp ASC
             ) AS previous_value
-        FROM ceph_cephosdup_metrics
-        WHERE metric_name = 'ceph_osd_up'
+        FROM {source}
+        WHERE metric_name = 'ceph_osd_up' AND {condition}
     )
     SELECT osd_id, value AS current_status, previous_value, timestamp 
     FROM osd_status
     WHERE previous_value = 1.0 AND value = 0.0
     ORDER BY timestamp DESC;
     """
+    return query, source_params + params
+
+
+def cluster_health_query(time_range, cluster=None):
+    # The current health is the latest sample; over several clusters the worst
+    # of their latest samples
+    source, source_params = windowed_source("ceph_health_status", time_range, aggregate="last")
+    condition, params = window(time_range, cluster)
+    query = f"""
+    SELECT MAX(value) FROM (
+        SELECT DISTINCT ON (cluster) value
+        FROM {source}
+        WHERE {condition}
+        ORDER BY cluster, timestamp DESC
+    ) latest;
+    """
+    return query, source_params + params
 
-    conn = get_db_conn()
-    if not conn:
-        return "❌ Database connection failed."
-    cursor = conn.cursor()
 
+def high_latency_osds_query(time_range, cluster=None, limit=HIGH_LATENCY_OSDS_LIMIT):
+    source, source_params = windowed_source(
+        "ceph_osd_apply_latency_ms", time_range, aggregate="max"
+    )
+    condition, params = window(time_range, cluster)
+    query = f"""
+    SELECT 
+        cluster,
+        labels->>'ceph_daemon' AS osd_id, 
+        MAX(value) AS max_latency 
+    FROM {source}
+    WHERE {condition}
+    GROUP BY cluster, labels->>'ceph_daemon'
+    ORDER BY max_latency DESC
+    LIMIT %s;
+    """
+    return query, source_params + params + [limit]
+
+
+def daemon_counts_query(time_range, cluster=None):
+    condition, params = window(time_range, cluster)
+    mon, mon_params = windowed_source("ceph_mon_metadata", time_range, aggregate="max")
+    mgr, mgr_params = windowed_source("ceph_mgr_metadata", time_range, aggregate="max")
+    osd, osd_params = windowed_source("ceph_osd_metadata", time_range, aggregate="max")
+    query = f"""
+    SELECT 'MON' AS daemon_type, COUNT(DISTINCT labels->>'ceph_daemon') AS count
+    FROM {mon}
+    WHERE value = 1.0 AND {condition}
+
+    UNION ALL
+
+    SELECT 'MGR' AS daemon_type, COUNT(DISTINCT labels->>'hostname') AS count
+    FROM {mgr}
+    WHERE value = 1.0 AND {condition}
+    UNION ALL
+
+    SELECT 'OSD' AS daemon_type, COUNT(DISTINCT labels->>'hostname') AS count
+    FROM {osd}
+    WHERE value = 1.0 AND {condition};
+    """
+    return query, mon_params + params + mgr_params + params + osd_params + params
+
+
+# Query behind each tool, e.g. for python3 -m backend.explain_queries
+TOOL_QUERIES = {
+    "get_diskoccupation": disk_occupation_query,
+    "check_degraded_pgs": degraded_pgs_query,
+    "check_recent_osd_crashes": osd_crashes_query,
+    "get_cluster_health": cluster_health_query,
+    "get_high_latency_osds": high_latency_osds_query,
+    "get_ceph_daemon_counts": daemon_counts_query,
+}
+
+
+# In-memory equivalents of the tool queries, returning the same rows
+def latest_samples(window, metric_name):
+    """[(labels, value)] of the most recent sample of every series, per cluster."""
+    latest = []
+    for cluster_window in window.split():
+        series = {}
+        for labels, timestamp, value in cluster_window.samples(metric_name):
+            key = tuple(sorted(labels.items()))
+            if key not in series or timestamp >= series[key][0]:
+                series[key] = (timestamp, labels, value)
+        latest.extend((labels, value) for _, labels, value in series.values())
+    return latest
+
+
+def disk_occupation_hot(window):
+    totals = {}
+    for labels, value in latest_samples(window, "ceph_disk_occupation"):
+        instance = labels.get("instance")
+        totals[instance] = totals.get(instance, 0.0) + value
+    return list(totals.items())
+
+
+def degraded_pgs_hot(window):
+    values = [value for _, _, value in window.samples("ceph_pg_degraded")]
+    return [("True" if values and max(values) > 0 else "False",)]
+
+
+def osd_crashes_hot(window):
+    by_osd = {}
+    # OSD ids repeat across clusters, each cluster has its own history
+    for cluster, cluster_window in enumerate(window.split()):
+        for labels, timestamp, value in cluster_window.samples("ceph_osd_up"):
+            osd_key = (cluster, labels.get("ceph_daemon"))
+            by_osd.setdefault(osd_key, []).append((timestamp, value))
+
+    crashes = []
+    for (_, osd_id), points in by_osd.items():
+        points.sort()
+        for (_, previous_value), (timestamp, value) in zip(points, points[1:]):
+            if previous_value == 1.0 and value == 0.0:
+                crashes.append((osd_id, value, previous_value, datetime.fromtimestamp(timestamp)))
+    crashes.sort(key=lambda crash: crash[3], reverse=True)
+    return crashes
+
+
+def cluster_health_hot(window):
+    values = [value for _, value in latest_samples(window, "ceph_health_status")]
+    return [(max(values) if values else None,)]
+
+
+def high_latency_osds_hot(window, limit=HIGH_LATENCY_OSDS_LIMIT):
+    latencies = {}
+    # OSD ids repeat across clusters, each cluster's OSDs are ranked on their own
+    for cluster_window in window.split():
+        for labels, _, value in cluster_window.samples("ceph_osd_apply_latency_ms"):
+            osd_key = (cluster_window.cluster, labels.get("ceph_daemon"))
+            latencies[osd_key] = max(value, latencies.get(osd_key, value))
+    ranked = sorted(latencies.items(), key=lambda osd: osd[1], reverse=True)[:limit]
+    return [(cluster, osd_id, max_latency) for (cluster, osd_id), max_latency in ranked]
+
+
+def daemon_counts_hot(window):
+    def count(metric_name, label):
+        daemons = {
+            labels.get(label)
+            for labels, _, value in window.samples(metric_name)
+            if value == 1.0 and labels.get(label) is not None
+        }
+        return len(daemons)
+
+    return [
+        ("MON", count("ceph_mon_metadata", "ceph_daemon")),
+        ("MGR", count("ceph_mgr_metadata", "hostname")),
+        ("OSD", count("ceph_osd_metadata", "hostname")),
+    ]
+
+
+def fetch_rows(build_query, hot_query, time_range, cluster=None):
+    """Rows of a tool query, from the hot store when it holds the whole window.
+
+    Returns None when the database is needed but unreachable.
+    """
+    rows = hot_store.query(hot_query, time_range, cluster=cluster)
+    if rows is not None:
+        return rows
+
+    with pooled_connection() as conn:
+        if not conn:
+            return None
+        cursor = conn.cursor()
+        try:
+            cursor.execute(*build_query(time_range, cluster))
+            return cursor.fetchall()
+        finally:
+            cursor.close()
+
+
+async def afetch_rows(build_query, hot_query, time_range, cluster=None):
+    """fetch_rows() on the async pool, so independent tools can run concurrently."""
+    rows = hot_store.query(hot_query, time_range, cluster=cluster)
+    if rows is not None:
+        return rows
+
+    async with async_pooled_connection() as conn:
+        if not conn:
+            return None
+        async with conn.cursor() as cursor:
+            await cursor.execute(*build_query(time_range, cluster))
+            return await cursor.fetchall()
+
+
+def run_query(build_query, hot_query, time_range, cluster=None):
+    """(rows, error) of fetch_rows(), the input of the *_response formatters."""
     try:
-        cursor.execute(query)
-        crashed_osds = cursor.fetchall()
-
-        if crashed_osds:
-            response = "\n🚨 **YES!! AN OSD CRASH DETECTED!** 🚨\n"
-            for osd in crashed_osds:
-                osd_id, current_status, previous_value, timestamp = osd
-                response += f"🛑 **OSD {osd_id} went DOWN at {timestamp}**\n"
-            return response  # Return a formatted response with OSD crash details
-        else:
-            return "✅ No OSD failures detected."
+        return fetch_rows(build_query, hot_query, time_range, cluster), None
+    except Exception as e:
+        return None, e
 
+
+async def arun_query(build_query, hot_query, time_range, cluster=None):
+    try:
+        return await afetch_rows(build_query, hot_query, time_range, cluster), None
     except Exception as e:
-        return f"❌ Error executing query: {e}"
-    finally:
-        cursor.close()
-        conn.close()
+        return None, e
 
 
-def get_cluster_health():
-    query = "SELECT MAX(value) FROM ceph_cephhealthstatus_metrics;"
+def registered_clusters():
+    """Every cluster that has been scraped, for the fan-out mode of the tools."""
+    try:
+        with pooled_connection() as conn:
+            if not conn:
+                return []
+            cursor = conn.cursor()
+            try:
+                cursor.execute(*list_clusters_query())
+                return [row[0] for row in cursor.fetchall()]
+            finally:
+                cursor.close()
+    except Exception as e:
+        print("❌ Error listing clusters:", e)
+        return []
 
-    conn = get_db_conn()
-    if not conn:
-        return {"status": "error", "message": "❌ Database connection failed."}
 
-    cursor = conn.cursor()
+async def aregistered_clusters():
     try:
-        cursor.execute(query)
-        result = cursor.fetchone()
+        async with async_pooled_connection() as conn:
+            if not conn:
+                return []
+            async with conn.cursor() as cursor:
+                await cursor.execute(*list_clusters_query())
+                return [row[0] for row in await cursor.fetchall()]
+    except Exception as e:
+        print("❌ Error listing clusters:", e)
+        return []
 
-        if not result or result[0] is None:
-            return {"status": "error", "message": "⚠️ No health data available."}
 
-        health_status = int(result[0])
+def fan_out(tool, time_range):
+    """Fan-out mode of the tools: {cluster: tool(time_range, cluster)} for
+    every registered cluster, each answered from that cluster's data only.
 
-        health_messages = {
-            0: "🟢 Cluster is healthy (HEALTH_OK)",
-            1: "🟡 Cluster has warnings (HEALTH_WARN)",
-            2: "🔴 Cluster has critical issues (HEALTH_ERR)",
-        }
+    The clusters are queried concurrently; the result is a fanout.FanOutResult
+    that leaves out clusters which did not answer within FANOUT_TARGET_TIMEOUT.
+    """
+    return fanout.fan_out(lambda cluster: tool(time_range, cluster), registered_clusters())
 
-        return {
-            "status": "success",
-            "health": health_messages.get(health_status, "Unknown health status"),
-        }
 
-    except Exception as e:
+async def afan_out(tool, time_range):
+    clusters = await aregistered_clusters()
+    return await fanout.afan_out(lambda cluster: tool(time_range, cluster), clusters)
+
+
+def cluster_rows(build_query, hot_query, time_range, cluster):
+    """fetch_rows() for one cluster of a fleet-wide merge, raising instead of
+    returning None so the cluster is reported as failed."""
+    rows = fetch_rows(build_query, hot_query, time_range, cluster)
+    if rows is None:
+        raise ConnectionError("Database connection failed")
+    return rows
+
+
+async def acluster_rows(build_query, hot_query, time_range, cluster):
+    rows = await afetch_rows(build_query, hot_query, time_range, cluster)
+    if rows is None:
+        raise ConnectionError("Database connection failed")
+    return rows
+
+
+# Tool responses, shared by the sync and async tools
+def disk_occupation_response(time_range, disk_occupation_results, error):
+    if error is not None:
+        print("❌ Error getting disk occupation status:", error)
+        return None
+    if disk_occupation_results is None:
+        return "❌ Database connection failed."
+
+    print("\n### Ceph Disk Occupation Per Node ###")
+
+    occupation_results = []
+    for row in disk_occupation_results:
+        occupation_results.append(f"Node: {row[0]}, Disk Occupation: {row[1]}")
+
+    print(f"{occupation_results = }")
+
+    return "\n".join(occupation_results)
+
+
+def degraded_pgs_response(time_range, rows, error):
+    if error is not None:
+        print("❌ Error checking degraded PGs:", error)
+        return None
+    if rows is None:
+        return "❌ Database connection failed."
+
+    result = rows[0][0]
+    print(f"Degraded PGs: {result}")
+    return result
+
+
+def osd_crashes_response(time_range, crashed_osds, error):
+    if error is not None:
+        return f"❌ Error executing query: {error}"
+    if crashed_osds is None:
+        return "❌ Database connection failed."
+
+    if crashed_osds:
+        response = "\n🚨 **YES!! AN OSD CRASH DETECTED!** 🚨\n"
+        for osd in crashed_osds:
+            osd_id, current_status, previous_value, timestamp = osd
+            response += f"🛑 **OSD {osd_id} went DOWN at {timestamp}**\n"
+        return response  # Return a formatted response with OSD crash details
+    else:
+        return f"✅ No OSD failures detected ({time_range})."
+
+
+def cluster_health_response(time_range, rows, error):
+    if error is not None:
         return {
             "status": "error",
-            "message": f"❌ Error fetching cluster health: {str(e)}",
+            "message": f"❌ Error fetching cluster health: {str(error)}",
         }
+    if rows is None:
+        return {"status": "error", "message": "❌ Database connection failed."}
 
-    finally:
-        cursor.close()
-        conn.close()
+    result = rows[0] if rows else None
+    if not result or result[0] is None:
+        return {"status": "error", "message": f"⚠️ No health data available ({time_range})."}
 
+    health_status = int(result[0])
 
-def get_high_latency_osds():
-    query = """
-    SELECT 
-        labels->>'ceph_daemon' AS osd_id, 
-        MAX(value) AS max_latency 
-    FROM ceph_cephosdapplylatencyms_metrics
-    WHERE timestamp >= %s AND timestamp <= %s
-    GROUP BY labels->>'ceph_daemon'
-    ORDER BY max_latency DESC
-    LIMIT 5;
-    """
+    health_messages = {
+        0: "🟢 Cluster is healthy (HEALTH_OK)",
+        1: "🟡 Cluster has warnings (HEALTH_WARN)",
+        2: "🔴 Cluster has critical issues (HEALTH_ERR)",
+    }
 
-    conn = get_db_conn()
-    if not conn:
-        return {"status": "error", "message": "❌ Database connection failed."}
+    return {
+        "status": "success",
+        "health": health_messages.get(health_status, "Unknown health status"),
+    }
 
-    cursor = conn.cursor()
-    try:
-        start_time = "2025-02-14 16:40:00"
-        end_time = "2025-02-17 16:40:10"
-
-        cursor.execute(query, (start_time, end_time))
-        results = cursor.fetchall()
-
-        if not results:
-            return {"status": "error", "message": "⚠️ No high-latency OSDs found."}
-
-        latency_thresholds = {
-            "low": {
-                "status": "🟢 Latency is within normal range",
-                "description": "The OSD is performing well with acceptable latency.",
-            },
-            "medium": {
-                "status": "🟡 Latency is higher than usual",
-                "description": "The OSD has some latency, but it is not critical.",
-            },
-            "high": {
-                "status": "🔴 High latency detected",
-                "description": "The OSD is experiencing significant latency, which may impact cluster performance.",
-            },
+
+def high_latency_osds_response(time_range, results, error):
+    if error is not None:
+        return {
+            "status": "error",
+            "message": f"❌ Error fetching high-latency OSDs: {str(error)}",
         }
+    if results is None:
+        return {"status": "error", "message": "❌ Database connection failed."}
 
-        high_latency_osds = []
+    if not results:
+        return {"status": "error", "message": f"⚠️ No high-latency OSDs found ({time_range})."}
+
+    latency_thresholds = {
+        "low": {
+            "status": "🟢 Latency is within normal range",
+            "description": "The OSD is performing well with acceptable latency.",
+        },
+        "medium": {
+            "status": "🟡 Latency is higher than usual",
+            "description": "The OSD has some latency, but it is not critical.",
+        },
+        "high": {
+            "status": "🔴 High latency detected",
+            "description": "The OSD is experiencing significant latency, which may impact cluster performance.",
+        },
+    }
+
+    high_latency_osds = []
+    # OSD ids repeat across clusters, so tag them when the OSDs span several
+    tag_clusters = len({row[0] for row in results}) > 1
+
+    for row in results:
+        cluster, osd_id, max_latency = row
+        if tag_clusters:
+            osd_id = f"{osd_id} ({cluster})"
+
+        # Determine latency category based on thresholds
+        if max_latency < 50:
+            latency_category = "low"
+        elif max_latency < 200:
+            latency_category = "medium"
+        else:
+            latency_category = "high"
 
-        for row in results:
-            osd_id, max_latency = row
+        latency_info = latency_thresholds[latency_category]
 
-            # Determine latency category based on thresholds
-            if max_latency < 50:
-                latency_category = "low"
-            elif max_latency < 200:
-                latency_category = "medium"
-            else:
-                latency_category = "high"
+        high_latency_osds.append(
+            {
+                "osd_id": osd_id,
+                "cluster": cluster,
+                "max_latency": max_latency,
+                "status": latency_info["status"],
+                "description": latency_info["description"],
+            }
+        )
 
-            latency_info = latency_thresholds[latency_category]
+    return {"high_latency_osds": high_latency_osds}
 
-            high_latency_osds.append(
-                {
-                    "osd_id": osd_id,
-                    "max_latency": max_latency,
-                    "status": latency_info["status"],
-                    "description": latency_info["description"],
-                }
-            )
 
-        return {"high_latency_osds": high_latency_osds}
+def fleet_high_latency_osds_response(time_range, ranked, status):
+    """high_latency_osds_response() of the top OSDs of every cluster, merged.
 
-    except Exception as e:
+    ranked is [(cluster, row)]; "partial" says which clusters did not answer.
+    """
+    response = high_latency_osds_response(time_range, [row for _, row in ranked], None)
+    if status.partial:
+        response["partial"] = status.describe()
+    return response
+
+
+def daemon_counts_response(time_range, results, error):
+    if error is not None:
         return {
             "status": "error",
-            "message": f"❌ Error fetching high-latency OSDs: {str(e)}",
+            "message": f"❌ Error fetching Ceph daemon counts: {str(error)}",
         }
+    if results is None:
+        return {"message": "❌ Database connection failed."}
 
-    finally:
-        cursor.close()
-        conn.close()
+    message = ""
+    for daemon_type, count in results:
+        message += f"\n **{daemon_type} Count**: {count}\n"
 
+    return {"status": "success", "message": message}
 
-def get_ceph_daemon_counts():
-    query = """
-    SELECT 'MON' AS daemon_type, COUNT(DISTINCT labels->>'ceph_daemon') AS count
-    FROM ceph_cephmonmetadata_metrics
-    WHERE value = 1.0
 
-    UNION ALL
+# Tool Functions
+@cached_tool
+def get_diskoccupation(time_range=None, cluster=None):
+    if cluster == ALL_CLUSTERS:
+        return fan_out(get_diskoccupation, time_range)
+    time_range = tool_time_range(time_range)
+    print("get_diskoccupation function called")
+    return disk_occupation_response(
+        time_range,
+        *run_query(disk_occupation_query, disk_occupation_hot, time_range, cluster),
+    )
 
-    SELECT 'MGR' AS daemon_type, COUNT(DISTINCT labels->>'hostname') AS count
-    FROM ceph_cephmgrmetadata_metrics
-    WHERE value = 1.0
-    UNION ALL
 
-    SELECT 'OSD' AS daemon_type, COUNT(DISTINCT labels->>'hostname') AS count
-    FROM ceph_cephosdmetadata_metrics
-    WHERE value = 1.0;
-    """
+@cached_tool
+def check_degraded_pgs(time_range=None, cluster=None):
+    if cluster == ALL_CLUSTERS:
+        return fan_out(check_degraded_pgs, time_range)
+    time_range = tool_time_range(time_range)
+    return degraded_pgs_response(
+        time_range, *run_query(degraded_pgs_query, degraded_pgs_hot, time_range, cluster)
+    )
 
-    conn = get_db_conn()
-    if not conn:
-        return {"message": "❌ Database connection failed."}
 
-    cursor = conn.cursor()
-    try:
-        cursor.execute(query)
-        results = cursor.fetchall()
+@cached_tool
+def check_recent_osd_crashes(time_range=None, cluster=None):
+    if cluster == ALL_CLUSTERS:
+        return fan_out(check_recent_osd_crashes, time_range)
+    time_range = tool_time_range(time_range)
+    return osd_crashes_response(
+        time_range, *run_query(osd_crashes_query, osd_crashes_hot, time_range, cluster)
+    )
+
+
+@cached_tool
+def get_cluster_health(time_range=None, cluster=None):
+    if cluster == ALL_CLUSTERS:
+        return fan_out(get_cluster_health, time_range)
+    time_range = tool_time_range(time_range)
+    return cluster_health_response(
+        time_range,
+        *run_query(cluster_health_query, cluster_health_hot, time_range, cluster),
+    )
+
+
+@cached_tool
+def get_high_latency_osds(time_range=None, cluster=None):
+    time_range = tool_time_range(time_range)
+    if cluster == ALL_CLUSTERS:
+        ranked, status = fanout.fan_out_top_k(
+            lambda target: cluster_rows(
+                high_latency_osds_query, high_latency_osds_hot, time_range, target
+            ),
+            registered_clusters(),
+            HIGH_LATENCY_OSDS_LIMIT,
+            key=lambda row: row[2],
+        )
+        return fleet_high_latency_osds_response(time_range, ranked, status)
+    return high_latency_osds_response(
+        time_range,
+        *run_query(high_latency_osds_query, high_latency_osds_hot, time_range, cluster),
+    )
+
+
+@cached_tool
+def get_ceph_daemon_counts(time_range=None, cluster=None):
+    if cluster == ALL_CLUSTERS:
+        return fan_out(get_ceph_daemon_counts, time_range)
+    time_range = tool_time_range(time_range)
+    return daemon_counts_response(
+        time_range, *run_query(daemon_counts_query, daemon_counts_hot, time_range, cluster)
+    )
+
+
+# Async Tool Functions, same results as the ones above
+@cached_tool
+async def aget_diskoccupation(time_range=None, cluster=None):
+    if cluster == ALL_CLUSTERS:
+        return await afan_out(aget_diskoccupation, time_range)
+    time_range = tool_time_range(time_range)
+    print("aget_diskoccupation function called")
+    return disk_occupation_response(
+        time_range,
+        *await arun_query(disk_occupation_query, disk_occupation_hot, time_range, cluster),
+    )
+
 
-        message = ""
-        for daemon_type, count in results:
-            message += f"\n **{daemon_type} Count**: {count}\n"
+@cached_tool
+async def acheck_degraded_pgs(time_range=None, cluster=None):
+    if cluster == ALL_CLUSTERS:
+        return await afan_out(acheck_degraded_pgs, time_range)
+    time_range = tool_time_range(time_range)
+    return degraded_pgs_response(
+        time_range,
+        *await arun_query(degraded_pgs_query, degraded_pgs_hot, time_range, cluster),
+    )
+
+
+@cached_tool
+async def acheck_recent_osd_crashes(time_range=None, cluster=None):
+    if cluster == ALL_CLUSTERS:
+        return await afan_out(acheck_recent_osd_crashes, time_range)
+    time_range = tool_time_range(time_range)
+    return osd_crashes_response(
+        time_range,
+        *await arun_query(osd_crashes_query, osd_crashes_hot, time_range, cluster),
+    )
 
-        return {"status": "success", "message": message}
 
+@cached_tool
+async def aget_cluster_health(time_range=None, cluster=None):
+    if cluster == ALL_CLUSTERS:
+        return await afan_out(aget_cluster_health, time_range)
+    time_range = tool_time_range(time_range)
+    return cluster_health_response(
+        time_range,
+        *await arun_query(cluster_health_query, cluster_health_hot, time_range, cluster),
+    )
+
+
+@cached_tool
+async def aget_high_latency_osds(time_range=None, cluster=None):
+    time_range = tool_time_range(time_range)
+    if cluster == ALL_CLUSTERS:
+        ranked, status = await fanout.afan_out_top_k(
+            lambda target: acluster_rows(
+                high_latency_osds_query, high_latency_osds_hot, time_range, target
+            ),
+            await aregistered_clusters(),
+            HIGH_LATENCY_OSDS_LIMIT,
+            key=lambda row: row[2],
+        )
+        return fleet_high_latency_osds_response(time_range, ranked, status)
+    return high_latency_osds_response(
+        time_range,
+        *await arun_query(high_latency_osds_query, high_latency_osds_hot, time_range, cluster),
+    )
+
+
+@cached_tool
+async def aget_ceph_daemon_counts(time_range=None, cluster=None):
+    if cluster == ALL_CLUSTERS:
+        return await afan_out(aget_ceph_daemon_counts, time_range)
+    time_range = tool_time_range(time_range)
+    return daemon_counts_response(
+        time_range,
+        *await arun_query(daemon_counts_query, daemon_counts_hot, time_range, cluster),
+    )
+
+
+# Sections of the cluster snapshot: (key, query, hot query, response)
+SNAPSHOT_SECTIONS = [
+    ("health", cluster_health_query, cluster_health_hot, cluster_health_response),
+    ("degraded_pgs", degraded_pgs_query, degraded_pgs_hot, degraded_pgs_response),
+    ("osd_crashes", osd_crashes_query, osd_crashes_hot, osd_crashes_response),
+    (
+        "high_latency_osds",
+        high_latency_osds_query,
+        high_latency_osds_hot,
+        high_latency_osds_response,
+    ),
+    ("daemon_counts", daemon_counts_query, daemon_counts_hot, daemon_counts_response),
+    ("disk_occupation", disk_occupation_query, disk_occupation_hot, disk_occupation_response),
+]
+
+
+def hot_snapshot_rows(time_range, cluster=None):
+    """Rows of every snapshot section from the hot store, or None unless it holds them all."""
+    hot_rows = [
+        hot_store.query(hot_query, time_range, cluster=cluster)
+        for _, _, hot_query, _ in SNAPSHOT_SECTIONS
+    ]
+    if all(rows is not None for rows in hot_rows):
+        return hot_rows
+    return None
+
+
+def fetch_snapshot_rows(time_range, cluster=None):
+    """Rows of every snapshot section, on the sync pool.
+
+    The queries run one after the other in a single REPEATABLE READ
+    transaction, so all sections see the same scrapes. Returns None when the
+    database is unreachable.
+    """
+    hot_rows = hot_snapshot_rows(time_range, cluster)
+    if hot_rows is not None:
+        return hot_rows
+
+    with pooled_connection() as conn:
+        if not conn:
+            return None
+        cursor = conn.cursor()
+        try:
+            # The pool rolls the read-only transaction back when conn is returned
+            cursor.execute("SET TRANSACTION ISOLATION LEVEL REPEATABLE READ, READ ONLY")
+            section_rows = []
+            for _, build_query, _, _ in SNAPSHOT_SECTIONS:
+                cursor.execute(*build_query(time_range, cluster))
+                section_rows.append(cursor.fetchall())
+            return section_rows
+        finally:
+            cursor.close()
+
+
+async def afetch_snapshot_rows(time_range, cluster=None):
+    """fetch_snapshot_rows() on the async pool, with the queries pipelined
+    so the snapshot takes a single round trip."""
+    hot_rows = hot_snapshot_rows(time_range, cluster)
+    if hot_rows is not None:
+        return hot_rows
+
+    async with async_pooled_connection() as conn:
+        if not conn:
+            return None
+        async with conn.transaction():
+            async with conn.pipeline():
+                await conn.execute("SET TRANSACTION ISOLATION LEVEL REPEATABLE READ, READ ONLY")
+                cursors = [
+                    await conn.execute(*build_query(time_range, cluster))
+                    for _, build_query, _, _ in SNAPSHOT_SECTIONS
+                ]
+            return [await cursor.fetchall() for cursor in cursors]
+
+
+def snapshot_response(time_range, cluster, section_rows, error):
+    if section_rows is None:
+        section_rows = [None] * len(SNAPSHOT_SECTIONS)
+
+    snapshot = {"time_range": str(time_range)}
+    if cluster is not None:
+        snapshot["cluster"] = cluster
+    for (key, _, _, response), rows in zip(SNAPSHOT_SECTIONS, section_rows):
+        snapshot[key] = response(time_range, rows, error)
+    return snapshot
+
+
+@cached_tool
+def get_cluster_snapshot(time_range=None, cluster=None):
+    """Health, degraded PGs, OSD crashes, top-latency OSDs, daemon counts and
+    disk occupation, as returned by the individual tools."""
+    if cluster == ALL_CLUSTERS:
+        return fan_out(get_cluster_snapshot, time_range)
+    time_range = tool_time_range(time_range)
+    print("get_cluster_snapshot function called")
+    try:
+        section_rows, error = fetch_snapshot_rows(time_range, cluster), None
     except Exception as e:
-        return {
-            "status": "error",
-            "message": f"❌ Error fetching Ceph daemon counts: {str(e)}",
-        }
+        section_rows, error = None, e
+    return snapshot_response(time_range, cluster, section_rows, error)
+
 
-    finally:
-        cursor.close()
-        conn.close()
+@cached_tool
+async def aget_cluster_snapshot(time_range=None, cluster=None):
+    if cluster == ALL_CLUSTERS:
+        return await afan_out(aget_cluster_snapshot, time_range)
+    time_range = tool_time_range(time_range)
+    print("aget_cluster_snapshot function called")
+    try:
+        section_rows, error = await afetch_snapshot_rows(time_range, cluster), None
+    except Exception as e:
+        section_rows, error = None, e
+    return snapshot_response(time_range, cluster, section_rows, error)
@@ -0,0 +1,214 @@
+import json
+import os
+import threading
+import time
+from urllib.parse import urlsplit
+
+import paramiko
+import requests
+
+MGR_CACHE_TTL = float(os.getenv("CEPH_MGR_CACHE_TTL", "300"))
+SSH_CONNECT_TIMEOUT = float(os.getenv("CEPH_SSH_CONNECT_TIMEOUT", "10"))
+SSH_COMMAND_TIMEOUT = float(os.getenv("CEPH_SSH_COMMAND_TIMEOUT", "120"))
+MGR_PROBE_TIMEOUT = float(os.getenv("CEPH_MGR_PROBE_TIMEOUT", "5"))
+MGR_METRICS_PORT = 9283
+MGR_DUMP_COMMAND = "cephadm shell ceph mgr dump -f json"
+
+
+class SSHSessionPool:
+    """Keeps one authenticated SSH client per (host, username) for reuse."""
+
+    def __init__(self, connect_timeout=SSH_CONNECT_TIMEOUT):
+        self.connect_timeout = connect_timeout
+        self._clients = {}
+        self._locks = {}
+        self._lock = threading.Lock()
+
+    def _host_lock(self, key):
+        with self._lock:
+            return self._locks.setdefault(key, threading.Lock())
+
+    @staticmethod
+    def _alive(client):
+        transport = client.get_transport()
+        return transport is not None and transport.is_active()
+
+    def adopt(self, host, username, client):
+        """Hands an already authenticated client over to the pool."""
+        with self._lock:
+            old = self._clients.get((host, username))
+            self._clients[(host, username)] = client
+        if old is not None and old is not client:
+            old.close()
+
+    def get(self, host, username, password):
+        key = (host, username)
+        with self._host_lock(key):
+            client = self._clients.get(key)
+            if client is not None and self._alive(client):
+                return client
+
+            client = paramiko.SSHClient()
+            client.set_missing_host_key_policy(paramiko.AutoAddPolicy())
+            client.connect(
+                host,
+                username=username,
+                password=password,
+                timeout=self.connect_timeout,
+            )
+            # Keep idle sessions from being dropped by firewalls between scrapes
+            client.get_transport().set_keepalive(30)
+            self.adopt(host, username, client)
+            return client
+
+    def run(self, host, username, password, command, timeout=SSH_COMMAND_TIMEOUT):
+        for attempt in range(2):
+            client = self.get(host, username, password)
+            try:
+                stdin, stdout, stderr = client.exec_command(command, timeout=timeout)
+                return stdout.read().decode()
+            except (paramiko.SSHException, EOFError, OSError):
+                # The pooled session died between uses, reconnect once
+                self.close(host, username)
+                if attempt:
+                    raise
+
+    def close(self, host=None, username=None):
+        with self._lock:
+            keys = [
+                key
+                for key in self._clients
+                if (host is None or key[0] == host) and (username is None or key[1] == username)
+            ]
+            clients = [self._clients.pop(key) for key in keys]
+        for client in clients:
+            client.close()
+
+
+def parse_mgr_dump(output):
+    """Extracts the active mgr address, its prometheus URL and the standby hosts."""
+    mgr_data = json.loads(output)
+
+    active_addr = mgr_data.get("active_addr")
+    active = active_addr.split(":")[0] if active_addr else None
+
+    metrics_url = None
+    prometheus = mgr_data.get("services", {}).get("prometheus")
+    if prometheus:
+        metrics_url = prometheus.rstrip("/") + "/metrics"
+    elif active:
+        metrics_url = f"http://{active}:{MGR_METRICS_PORT}/metrics"
+
+    # cephadm names mgr daemons <host>.<suffix>
+    standbys = [
+        standby["name"].split(".")[0]
+        for standby in mgr_data.get("standbys", [])
+        if standby.get("name")
+    ]
+    return {"active": active, "metrics_url": metrics_url, "standbys": standbys}
+
+
+def is_standby_response(status_code, headers):
+    # Standby mgrs answer /metrics with an empty body, or an error status
+    # when the prometheus module's standby_behaviour is "error".
+    return status_code >= 400 or headers.get("Content-Length") == "0"
+
+
+class MgrResolver:
+    """Caches the active mgr of each cluster and follows failovers cheaply.
+
+    The SSH round trip (which starts a cephadm container) only happens when
+    the cache entry is older than ttl or no known mgr answers any more.
+    """
+
+    def __init__(self, ttl=MGR_CACHE_TTL, ssh_sessions=None):
+        self.ttl = ttl
+        self.ssh_sessions = ssh_sessions or SSHSessionPool()
+        self._endpoints = {}
+        self._locks = {}
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "ssh_resolves": 0, "failovers": 0}
+
+    def _cluster_lock(self, cluster_ip):
+        with self._lock:
+            return self._locks.setdefault(cluster_ip, threading.RLock())
+
+    def resolve(self, cluster_ip, ssh_username, ssh_password, refresh=False):
+        """Returns the cached endpoint of cluster_ip, resolving it over SSH if needed."""
+        with self._cluster_lock(cluster_ip):
+            endpoint = self._endpoints.get(cluster_ip)
+            if (
+                not refresh
+                and endpoint is not None
+                and time.monotonic() - endpoint["resolved_at"] < self.ttl
+            ):
+                self.stats["hits"] += 1
+                return endpoint
+
+            output = self.ssh_sessions.run(
+                cluster_ip, ssh_username, ssh_password, MGR_DUMP_COMMAND
+            )
+            self.stats["ssh_resolves"] += 1
+            endpoint = parse_mgr_dump(output)
+            endpoint["resolved_at"] = time.monotonic()
+            self._endpoints[cluster_ip] = endpoint
+            return endpoint
+
+    def metrics_url(self, cluster_ip, ssh_username, ssh_password):
+        return self.resolve(cluster_ip, ssh_username, ssh_password)["metrics_url"]
+
+    def invalidate(self, cluster_ip):
+        with self._lock:
+            self._endpoints.pop(cluster_ip, None)
+
+    def follow_redirect(self, cluster_ip, location):
+        """A standby redirected us to the active mgr; remember where it lives."""
+        parts = urlsplit(location)
+        with self._cluster_lock(cluster_ip):
+            endpoint = self._endpoints.get(cluster_ip)
+            if endpoint is None or not parts.hostname:
+                return location
+            self._set_active(endpoint, parts.hostname, parts.port or MGR_METRICS_PORT)
+            return endpoint["metrics_url"]
+
+    def _set_active(self, endpoint, host, port=MGR_METRICS_PORT):
+        old_active = endpoint["active"]
+        endpoint["standbys"] = [
+            standby for standby in endpoint["standbys"] if standby != host
+        ]
+        if old_active and old_active != host:
+            endpoint["standbys"].append(old_active)
+        endpoint["active"] = host
+        endpoint["metrics_url"] = f"http://{host}:{port}/metrics"
+        self.stats["failovers"] += 1
+
+    def failover(self, cluster_ip, ssh_username, ssh_password):
+        """Finds the new active mgr after the cached one stopped answering.
+
+        Standbys are probed directly first: a standby that redirects points
+        at the active mgr, one that serves metrics has taken over. Only when
+        none of them helps is the cluster resolved over SSH again.
+        """
+        with self._cluster_lock(cluster_ip):
+            endpoint = self._endpoints.get(cluster_ip)
+            for host in list(endpoint["standbys"]) if endpoint else []:
+                url = f"http://{host}:{MGR_METRICS_PORT}/metrics"
+                try:
+                    response = requests.get(
+                        url, allow_redirects=False, stream=True, timeout=MGR_PROBE_TIMEOUT
+                    )
+                    response.close()
+                except requests.RequestException:
+                    continue
+                if response.is_redirect and response.headers.get("Location"):
+                    return self.follow_redirect(cluster_ip, response.headers["Location"])
+                if not is_standby_response(response.status_code, response.headers):
+                    self._set_active(endpoint, host)
+                    return endpoint["metrics_url"]
+
+            return self.resolve(cluster_ip, ssh_username, ssh_password, refresh=True)[
+                "metrics_url"
+            ]
+
+
+mgr_resolver = MgrResolver()
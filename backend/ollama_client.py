@@ -0,0 +1,288 @@
+"""Ollama inference tuned for the agents: one warm model, one HTTP session.
+
+langchain's Ollama LLM posts every generation with a new connection and lets
+the server unload the model after its default keep-alive, so an idle app pays
+the model load again on the next question. OllamaLLM sends every request of
+the process through one shared OllamaClient, which
+- keeps the model loaded for OLLAMA_KEEP_ALIVE,
+- reuses the connections of a single requests.Session,
+- lets at most OLLAMA_MAX_CONCURRENCY generations run at once; the others
+  wait in a FIFO queue for up to OLLAMA_QUEUE_TIMEOUT seconds.
+
+num_ctx, num_predict and num_thread come from OLLAMA_NUM_CTX,
+OLLAMA_NUM_PREDICT and OLLAMA_NUM_THREAD, and any call can pass its own:
+llm.invoke(prompt, options={"num_predict": 64}) or llm.with_options(...).
+The ReAct agents write their final answers with the same calls that pick
+tools, so they use the defaults; a low num_predict would cut answers short.
+"""
+
+import json
+import os
+import threading
+import time
+from collections import deque
+from contextlib import closing, contextmanager
+from typing import Any, Dict, Iterator, List, Optional
+
+import requests
+from langchain_core.callbacks import CallbackManagerForLLMRun
+from langchain_core.language_models.llms import LLM
+from langchain_core.outputs import GenerationChunk
+from pydantic import Field
+from requests.adapters import HTTPAdapter
+
+OLLAMA_BASE_URL = os.getenv("OLLAMA_BASE_URL", "http://localhost:11434")
+OLLAMA_MODEL = os.getenv("OLLAMA_MODEL", "llama3")
+# How long the server keeps the model loaded after a request, e.g. "30m"; -1 forever
+OLLAMA_KEEP_ALIVE = os.getenv("OLLAMA_KEEP_ALIVE", "30m")
+OLLAMA_MAX_CONCURRENCY = int(os.getenv("OLLAMA_MAX_CONCURRENCY", "2"))
+OLLAMA_QUEUE_TIMEOUT = float(os.getenv("OLLAMA_QUEUE_TIMEOUT", "120"))
+# Seconds to wait for the server to answer (connect, read)
+OLLAMA_TIMEOUT = float(os.getenv("OLLAMA_TIMEOUT", "300"))
+
+INFERENCE_OPTIONS = ("num_ctx", "num_predict", "num_thread")
+
+
+def options_from_env(prefix="OLLAMA_"):
+    """{"num_ctx": 4096, ...} of the <prefix>NUM_CTX, <prefix>NUM_PREDICT and
+    <prefix>NUM_THREAD variables that are set."""
+    options = {}
+    for name in INFERENCE_OPTIONS:
+        value = os.getenv(prefix + name.upper())
+        if value:
+            options[name] = int(value)
+    return options
+
+
+DEFAULT_OPTIONS = options_from_env()
+
+
+def keep_alive_value(keep_alive):
+    """Ollama takes a duration ("30m") or a number of seconds (-1: forever)."""
+    if isinstance(keep_alive, str) and keep_alive.lstrip("-").isdigit():
+        return int(keep_alive)
+    return keep_alive
+
+
+class RequestQueue:
+    """Lets max_concurrent requests run at once; the others wait in arrival order."""
+
+    def __init__(self, max_concurrent=OLLAMA_MAX_CONCURRENCY, timeout=OLLAMA_QUEUE_TIMEOUT):
+        self.max_concurrent = max_concurrent
+        self.timeout = timeout
+        self.running = 0
+        self.served = 0
+        self.rejected = 0
+        self.max_waiting = 0
+        self.wait_seconds = 0.0
+        self._waiting = deque()
+        self._cond = threading.Condition()
+
+    @contextmanager
+    def slot(self):
+        """Waits for a free slot, or raises TimeoutError after timeout seconds."""
+        start = time.perf_counter()
+        ticket = object()
+        with self._cond:
+            self._waiting.append(ticket)
+            self.max_waiting = max(self.max_waiting, len(self._waiting))
+            turn = self._cond.wait_for(
+                lambda: self._waiting[0] is ticket and self.running < self.max_concurrent,
+                self.timeout,
+            )
+            self._waiting.remove(ticket)
+            if not turn:
+                self.rejected += 1
+                self._cond.notify_all()
+                raise TimeoutError(
+                    f"Ollama is busy: no free slot within {self.timeout:g}s"
+                )
+            self.running += 1
+            self.wait_seconds += time.perf_counter() - start
+            # The next in line may fit into another free slot
+            self._cond.notify_all()
+        try:
+            yield
+        finally:
+            with self._cond:
+                self.running -= 1
+                self.served += 1
+                self._cond.notify_all()
+
+    def stats(self):
+        with self._cond:
+            return {
+                "max_concurrent": self.max_concurrent,
+                "running": self.running,
+                "waiting": len(self._waiting),
+                "max_waiting": self.max_waiting,
+                "served": self.served,
+                "rejected": self.rejected,
+                "avg_wait_seconds": self.wait_seconds / self.served if self.served else 0.0,
+            }
+
+
+class OllamaClient:
+    """Calls the Ollama HTTP API through one session and one request queue."""
+
+    def __init__(
+        self,
+        base_url=OLLAMA_BASE_URL,
+        max_concurrent=OLLAMA_MAX_CONCURRENCY,
+        queue_timeout=OLLAMA_QUEUE_TIMEOUT,
+        timeout=OLLAMA_TIMEOUT,
+    ):
+        self.base_url = base_url.rstrip("/")
+        self.timeout = timeout
+        self.queue = RequestQueue(max_concurrent, queue_timeout)
+        self.session = requests.Session()
+        # One pooled connection per request that may run at once
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max(max_concurrent, 1))
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self.last_stats = {}
+
+    def _payload(self, model, prompt, options, keep_alive, stop, stream):
+        options = dict(options or {})
+        if stop:
+            options["stop"] = list(stop)
+        payload = {
+            "model": model,
+            "prompt": prompt,
+            "stream": stream,
+            "keep_alive": keep_alive_value(keep_alive),
+        }
+        if options:
+            payload["options"] = options
+        return payload
+
+    def stream(self, model, prompt, options=None, keep_alive=OLLAMA_KEEP_ALIVE, stop=None):
+        """Yields the generated text as the server produces it.
+
+        The final message's timings (load_duration, eval_count, ...) are kept
+        in last_stats. The queue slot is held until the generator finishes or
+        is closed, so consume it inside closing() when you may stop early.
+        """
+        payload = self._payload(model, prompt, options, keep_alive, stop, True)
+        with self.queue.slot():
+            with self.session.post(
+                f"{self.base_url}/api/generate", json=payload, stream=True, timeout=self.timeout
+            ) as response:
+                response.raise_for_status()
+                for line in response.iter_lines():
+                    if not line:
+                        continue
+                    message = json.loads(line)
+                    if "error" in message:
+                        raise RuntimeError(f"Ollama error: {message['error']}")
+                    if message.get("response"):
+                        yield message["response"]
+                    # Read on to the end of the body, so the connection is reused
+                    if message.get("done"):
+                        self.last_stats = {
+                            key: value
+                            for key, value in message.items()
+                            if key.endswith(("_duration", "_count"))
+                        }
+
+    def generate(self, model, prompt, options=None, keep_alive=OLLAMA_KEEP_ALIVE, stop=None):
+        with closing(self.stream(model, prompt, options, keep_alive, stop)) as tokens:
+            return "".join(tokens)
+
+    def warm_up(self, model, keep_alive=OLLAMA_KEEP_ALIVE, options=None):
+        """Loads the model without generating, so the first question does not wait for it."""
+        payload = {"model": model, "keep_alive": keep_alive_value(keep_alive)}
+        if options:
+            payload["options"] = dict(options)
+        try:
+            with self.queue.slot():
+                response = self.session.post(
+                    f"{self.base_url}/api/generate", json=payload, timeout=self.timeout
+                )
+                response.raise_for_status()
+            return True
+        except (requests.RequestException, TimeoutError) as err:
+            print(f"Ollama warm-up of {model} failed: {err}")
+            return False
+
+    def stats(self):
+        return {"base_url": self.base_url, **self.queue.stats()}
+
+    def close(self):
+        self.session.close()
+
+
+_clients = {}
+_clients_lock = threading.Lock()
+
+
+def get_client(base_url=OLLAMA_BASE_URL):
+    """The process-wide client of base_url."""
+    base_url = base_url.rstrip("/")
+    with _clients_lock:
+        if base_url not in _clients:
+            _clients[base_url] = OllamaClient(base_url)
+        return _clients[base_url]
+
+
+class OllamaLLM(LLM):
+    """Drop-in replacement of langchain's Ollama LLM using the shared client.
+
+    Tokens are reported to the callbacks as they arrive, so streaming to the
+    chat (backend/streaming.py) works as before.
+    """
+
+    model: str = OLLAMA_MODEL
+    base_url: str = OLLAMA_BASE_URL
+    keep_alive: Any = OLLAMA_KEEP_ALIVE
+    options: Dict[str, Any] = Field(default_factory=lambda: dict(DEFAULT_OPTIONS))
+
+    @property
+    def _llm_type(self) -> str:
+        return "ollama-tuned"
+
+    @property
+    def _identifying_params(self) -> Dict[str, Any]:
+        return {"model": self.model, "base_url": self.base_url, "options": self.options}
+
+    @property
+    def client(self) -> OllamaClient:
+        return get_client(self.base_url)
+
+    def with_options(self, **options) -> "OllamaLLM":
+        """A copy using options on top of this LLM's, e.g. with_options(num_ctx=8192)."""
+        return self.model_copy(update={"options": {**self.options, **options}})
+
+    def warm_up(self) -> bool:
+        return self.client.warm_up(self.model, self.keep_alive, self.options)
+
+    def _stream(
+        self,
+        prompt: str,
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[CallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> Iterator[GenerationChunk]:
+        options = {**self.options, **kwargs.get("options", {})}
+        # Closing this generator, e.g. when a consumer stops early, closes the
+        # client's stream too and frees its queue slot
+        with closing(self.client.stream(self.model, prompt, options, self.keep_alive, stop)) as tokens:
+            for text in tokens:
+                chunk = GenerationChunk(text=text)
+                if run_manager:
+                    run_manager.on_llm_new_token(text, chunk=chunk)
+                yield chunk
+
+    def _call(
+        self,
+        prompt: str,
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[CallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> str:
+        return "".join(chunk.text for chunk in self._stream(prompt, stop, run_manager, **kwargs))
+
+
+def warm_up_in_background(llm):
+    """Loads llm's model in a daemon thread, e.g. while the app starts."""
+    threading.Thread(target=llm.warm_up, name="ollama-warm-up", daemon=True).start()
@@ -0,0 +1,213 @@
+"""Cache of answers to user questions, valid until the next scrape commits.
+
+Questions are looked up by their normalised text; with an embedding model
+configured, a question close enough to a cached one also hits.
+"""
+
+import asyncio
+import math
+import os
+import re
+import threading
+from collections import OrderedDict, namedtuple
+
+from .time_range import find_time_range
+from .tool_cache import ensure_listener, tool_cache
+
+RESPONSE_CACHE_SIZE = int(os.getenv("RESPONSE_CACHE_SIZE", "512"))
+# Ollama embedding model for similarity lookups, e.g. nomic-embed-text; empty disables them
+RESPONSE_CACHE_EMBEDDING_MODEL = os.getenv("RESPONSE_CACHE_EMBEDDING_MODEL", "")
+RESPONSE_CACHE_SIMILARITY = float(os.getenv("RESPONSE_CACHE_SIMILARITY", "0.92"))
+
+_STOP_WORDS = set(
+    "a an the is are was were be do does of for in on to me my our please can could "
+    "you tell show give what whats s".split()
+)
+# Follow-ups only make sense with the conversation before them
+_CONTEXT_PATTERN = re.compile(
+    r"\b(?:it|that|those|these|them|again|previous|above|before)\b", re.IGNORECASE
+)
+
+_Entry = namedtuple("_Entry", ["response", "scope", "embedding"])
+
+
+def normalize_query(query):
+    """Lowercase words without punctuation and filler, e.g. "Is the cluster healthy?" -> "cluster healthy"."""
+    text = re.sub(r"'s\b", "", query.lower()).replace("'", "")
+    words = re.findall(r"[a-z0-9_.]+", text)
+    return " ".join(word for word in words if word not in _STOP_WORDS)
+
+
+def query_scope(query):
+    """What must be equal for two similar questions to share an answer: the
+    time range and any numbers (OSD ids, counts) they mention."""
+    return find_time_range(query), tuple(re.findall(r"\d+", query))
+
+
+def _cosine(left, right):
+    dot = sum(a * b for a, b in zip(left, right))
+    norm = math.sqrt(sum(a * a for a in left)) * math.sqrt(sum(b * b for b in right))
+    return dot / norm if norm else 0.0
+
+
+def ollama_embedder(model):
+    """Returns an embed(text) function using a local Ollama model, or None."""
+    try:
+        from langchain_community.embeddings import OllamaEmbeddings
+    except ImportError as err:
+        print(f"Response cache embeddings disabled: {err}")
+        return None
+    return OllamaEmbeddings(model=model).embed_query
+
+
+class ResponseCache:
+    """LRU cache of process_query answers, emptied whenever a scrape commits.
+
+    Entries are tagged with the tool cache generation, which the scrape
+    listener bumps on every committed scrape, so an answer never outlives the
+    data it was computed from.
+    """
+
+    def __init__(
+        self,
+        maxsize=RESPONSE_CACHE_SIZE,
+        embed=None,
+        similarity=RESPONSE_CACHE_SIMILARITY,
+    ):
+        self.maxsize = maxsize
+        self.embed = embed
+        self.similarity = similarity
+        self.generation = tool_cache.generation
+        self._entries = OrderedDict()  # normalised query -> _Entry
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.semantic_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def _sync_generation(self):
+        # Called with the lock held
+        if tool_cache.generation != self.generation:
+            self._entries.clear()
+            self.generation = tool_cache.generation
+
+    def _embedding(self, key):
+        if self.embed is None:
+            return None
+        try:
+            return self.embed(key)
+        except Exception as err:
+            print(f"Response cache embedding error: {err}")
+            return None
+
+    def _lookup(self, query):
+        """(result, key, generation, candidates): result is the answer of get()
+        unless it is None, else the embedding of key is compared to the candidates."""
+        generation = tool_cache.generation
+        # Without the listener, scrapes by other processes would go unnoticed
+        if not ensure_listener().connected.is_set() or _CONTEXT_PATTERN.search(query):
+            return (False, None, None), None, None, []
+        key = normalize_query(query)
+        scope = query_scope(query)
+        with self._lock:
+            self._sync_generation()
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return (True, entry.response, generation), key, generation, []
+            candidates = [
+                (cached_key, cached)
+                for cached_key, cached in self._entries.items()
+                if cached.embedding is not None and cached.scope == scope
+            ]
+        return None, key, generation, candidates
+
+    def _closest(self, embedding, generation, candidates):
+        if embedding is not None:
+            best_key, best_score = None, self.similarity
+            for cached_key, cached in candidates:
+                score = _cosine(embedding, cached.embedding)
+                if score >= best_score:
+                    best_key, best_score = cached_key, score
+            with self._lock:
+                entry = self._entries.get(best_key)
+                if entry is not None and self.generation == generation:
+                    self._entries.move_to_end(best_key)
+                    self.hits += 1
+                    self.semantic_hits += 1
+                    return True, entry.response, generation
+
+        with self._lock:
+            self.misses += 1
+        return False, None, generation
+
+    def get(self, query):
+        """Returns (found, response, generation); pass generation on to put()."""
+        result, key, generation, candidates = self._lookup(query)
+        if result is not None:
+            return result
+        embedding = self._embedding(key) if candidates else None
+        return self._closest(embedding, generation, candidates)
+
+    async def aget(self, query):
+        """get() for the event loop: the embedding model is called in a thread."""
+        result, key, generation, candidates = self._lookup(query)
+        if result is not None:
+            return result
+        embedding = await asyncio.to_thread(self._embedding, key) if candidates else None
+        return self._closest(embedding, generation, candidates)
+
+    def _cacheable(self, response, generation):
+        if generation is None or not isinstance(response, str) or not response.strip():
+            return False
+        return not response.lstrip().startswith(("❌", "⚠️"))
+
+    def _store(self, query, key, response, generation, embedding):
+        entry = _Entry(response, query_scope(query), embedding)
+        with self._lock:
+            self._sync_generation()
+            # A scrape committed while the answer was being computed
+            if generation != self.generation:
+                return
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def put(self, query, response, generation):
+        if not self._cacheable(response, generation):
+            return
+        key = normalize_query(query)
+        self._store(query, key, response, generation, self._embedding(key))
+
+    async def aput(self, query, response, generation):
+        if not self._cacheable(response, generation):
+            return
+        key = normalize_query(query)
+        embedding = await asyncio.to_thread(self._embedding, key)
+        self._store(query, key, response, generation, embedding)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "maxsize": self.maxsize,
+                "generation": self.generation,
+                "hits": self.hits,
+                "semantic_hits": self.semantic_hits,
+                "misses": self.misses,
+                "hit_ratio": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+            }
+
+
+response_cache = ResponseCache(
+    embed=ollama_embedder(RESPONSE_CACHE_EMBEDDING_MODEL) if RESPONSE_CACHE_EMBEDDING_MODEL else None
+)
@@ -0,0 +1,338 @@
+import argparse
+import os
+import time
+from datetime import datetime, timedelta
+
+from .connection import get_db_conn
+from .storage import (
+    DEFAULT_CLUSTER,
+    SAMPLES_TABLE,
+    SERIES_TABLE,
+    STORAGE_LAYOUT,
+    STORAGE_MODE,
+    commit_caches,
+    load_registry,
+    metric_source,
+    metric_table_name,
+    rollback_caches,
+)
+from .tool_cache import notify_scrape, scrape_committed
+
+ROLLUPS_ENABLED = os.getenv("METRICS_ROLLUPS", "true").lower() in ("1", "true", "yes")
+# A window is answered from the coarsest rollup that still gives it this many buckets
+ROLLUP_MIN_BUCKETS = int(os.getenv("METRICS_ROLLUP_MIN_BUCKETS", "24"))
+# Buckets this far behind the watermark are recomputed, for scrapes that
+# committed after a later one had already been rolled up
+ROLLUP_LAG_SECONDS = int(os.getenv("METRICS_ROLLUP_LAG", "120"))
+ROLLUP_RETENTION_INTERVAL_SECONDS = 3600
+# Only the metrics the tool queries read through windowed_source() are rolled up
+ROLLUP_METRICS = [
+    name.strip()
+    for name in os.getenv(
+        "METRICS_ROLLUP_METRICS",
+        "ceph_disk_occupation,ceph_pg_degraded,ceph_health_status,"
+        "ceph_osd_apply_latency_ms,ceph_mon_metadata,ceph_mgr_metadata,ceph_osd_metadata",
+    ).split(",")
+    if name.strip()
+]
+
+# (name, bucket seconds, retention days), finest first; each level is
+# computed from the one before it, the first from the raw samples.
+RESOLUTIONS = [
+    ("1m", 60, 30),
+    ("5m", 300, 90),
+    ("1h", 3600, 730),
+]
+WATERMARKS_TABLE = "ceph_rollup_watermarks"
+ALL_METRICS = "*"
+
+AGGREGATE_COLUMNS = {
+    "min": "min_value",
+    "max": "max_value",
+    "sum": "sum_value",
+    "count": "sample_count",
+    "last": "last_value",
+    "avg": "sum_value / NULLIF(sample_count, 0)",
+}
+
+_last_retention_run = 0.0
+
+
+def rollup_table(resolution):
+    return f"ceph_rollup_{resolution}"
+
+
+def _bucket(column, seconds):
+    return (
+        f"(to_timestamp(floor(extract(epoch FROM {column}) / {seconds}) * {seconds}) "
+        "AT TIME ZONE 'UTC')"
+    )
+
+
+EPOCH = datetime(1970, 1, 1)
+
+
+def _bucket_start(ts, seconds):
+    if ts is None:
+        return EPOCH
+    epoch = (ts - EPOCH).total_seconds() - ROLLUP_LAG_SECONDS
+    return EPOCH + timedelta(seconds=epoch // seconds * seconds)
+
+
+def ensure_rollup_tables(cur):
+    for resolution, _, _ in RESOLUTIONS:
+        table = rollup_table(resolution)
+        cur.execute(
+            f"""
+            CREATE TABLE IF NOT EXISTS {table} (
+                cluster VARCHAR NOT NULL DEFAULT '{DEFAULT_CLUSTER}',
+                metric_name VARCHAR NOT NULL,
+                labels JSONB NOT NULL,
+                bucket TIMESTAMP NOT NULL,
+                min_value DOUBLE PRECISION,
+                max_value DOUBLE PRECISION,
+                sum_value DOUBLE PRECISION,
+                sample_count BIGINT,
+                last_value DOUBLE PRECISION,
+                last_ts TIMESTAMP,
+                PRIMARY KEY (cluster, metric_name, bucket, labels)
+            );
+            CREATE INDEX IF NOT EXISTS {table}_bucket_idx ON {table} (bucket);
+            """
+        )
+        _add_cluster_column(cur, table)
+    cur.execute(
+        f"""
+        CREATE TABLE IF NOT EXISTS {WATERMARKS_TABLE} (
+            resolution VARCHAR NOT NULL,
+            source VARCHAR NOT NULL,
+            watermark TIMESTAMP NOT NULL,
+            PRIMARY KEY (resolution, source)
+        );
+        """
+    )
+
+
+def _add_cluster_column(cur, table):
+    """Upgrades a rollup table created before samples were tagged with a cluster."""
+    cur.execute(
+        "SELECT 1 FROM information_schema.columns WHERE table_name = %s AND column_name = 'cluster'",
+        (table,),
+    )
+    if cur.fetchone():
+        return
+    cur.execute(
+        f"""
+        ALTER TABLE {table} ADD COLUMN cluster VARCHAR NOT NULL DEFAULT '{DEFAULT_CLUSTER}';
+        ALTER TABLE {table} DROP CONSTRAINT IF EXISTS {table}_pkey;
+        ALTER TABLE {table} ADD PRIMARY KEY (cluster, metric_name, bucket, labels);
+        """
+    )
+
+
+def raw_sources(cur, storage_layout):
+    """(source, SELECT exposing cluster, metric_name, labels, value, timestamp, params)
+    of the raw samples of ROLLUP_METRICS."""
+    if storage_layout == "narrow":
+        return [
+            (
+                SAMPLES_TABLE,
+                f"""
+                SELECT s.cluster, s.metric_name, s.labels, p.value, p.ts AS timestamp
+                FROM {SAMPLES_TABLE} p JOIN {SERIES_TABLE} s ON s.series_id = p.series_id
+                WHERE s.metric_name = ANY(%s)
+                """,
+                [ROLLUP_METRICS],
+            )
+        ]
+    tables = {metric_table_name(name) for name in ROLLUP_METRICS}
+    tables = sorted(tables & load_registry(cur).keys())
+    return [
+        (table, f"SELECT cluster, metric_name, labels, value, timestamp FROM {table}", [])
+        for table in tables
+    ]
+
+
+def _watermark(cur, resolution, source):
+    cur.execute(
+        f"SELECT watermark FROM {WATERMARKS_TABLE} WHERE resolution = %s AND source = %s",
+        (resolution, source),
+    )
+    row = cur.fetchone()
+    return row[0] if row else None
+
+
+def _upsert_rollup(cur, resolution, source, select, params):
+    """Recomputes every bucket from the watermark on and moves the watermark."""
+    cur.execute(
+        f"""
+        WITH upserted AS (
+            INSERT INTO {rollup_table(resolution)} (
+                cluster, metric_name, labels, bucket, min_value, max_value,
+                sum_value, sample_count, last_value, last_ts
+            )
+            {select}
+            ON CONFLICT (cluster, metric_name, bucket, labels) DO UPDATE SET
+                min_value = EXCLUDED.min_value,
+                max_value = EXCLUDED.max_value,
+                sum_value = EXCLUDED.sum_value,
+                sample_count = EXCLUDED.sample_count,
+                last_value = EXCLUDED.last_value,
+                last_ts = EXCLUDED.last_ts
+            RETURNING last_ts
+        )
+        SELECT COUNT(*), MAX(last_ts) FROM upserted
+        """,
+        params,
+    )
+    buckets, watermark = cur.fetchone()
+    if watermark is not None:
+        cur.execute(
+            f"""
+            INSERT INTO {WATERMARKS_TABLE} (resolution, source, watermark) VALUES (%s, %s, %s)
+            ON CONFLICT (resolution, source) DO UPDATE
+            SET watermark = GREATEST({WATERMARKS_TABLE}.watermark, EXCLUDED.watermark)
+            """,
+            (resolution, source, watermark),
+        )
+    return buckets
+
+
+def refresh_from_raw(cur, resolution, seconds, source, raw_select, raw_params):
+    since = _bucket_start(_watermark(cur, resolution, source), seconds)
+    select = f"""
+        SELECT cluster, metric_name, COALESCE(labels, '{{}}'::jsonb), {_bucket("timestamp", seconds)},
+               MIN(value), MAX(value), SUM(value), COUNT(*),
+               (ARRAY_AGG(value ORDER BY timestamp DESC))[1], MAX(timestamp)
+        FROM ({raw_select}) raw
+        WHERE timestamp >= %s AND value <> 'NaN'
+        GROUP BY 1, 2, 3, 4
+    """
+    return _upsert_rollup(cur, resolution, source, select, raw_params + [since])
+
+
+def refresh_from_rollup(cur, resolution, seconds, finer):
+    since = _bucket_start(_watermark(cur, resolution, ALL_METRICS), seconds)
+    select = f"""
+        SELECT cluster, metric_name, labels, {_bucket("bucket", seconds)},
+               MIN(min_value), MAX(max_value), SUM(sum_value), SUM(sample_count),
+               (ARRAY_AGG(last_value ORDER BY last_ts DESC))[1], MAX(last_ts)
+        FROM {rollup_table(finer)}
+        WHERE bucket >= %s
+        GROUP BY 1, 2, 3, 4
+    """
+    return _upsert_rollup(cur, resolution, ALL_METRICS, select, [since])
+
+
+def drop_expired_rollups(cur):
+    for resolution, _, retention_days in RESOLUTIONS:
+        cur.execute(
+            f"DELETE FROM {rollup_table(resolution)} "
+            "WHERE bucket < LOCALTIMESTAMP - make_interval(days => %s)",
+            (retention_days,),
+        )
+
+
+def refresh_rollups(conn, storage_layout=STORAGE_LAYOUT, rebuild=False):
+    """Brings every rollup level up to date with the raw samples written so far.
+
+    rebuild recomputes everything from the oldest raw sample, e.g. after
+    importing history that lies behind the watermarks.
+    """
+    global _last_retention_run
+    start = time.perf_counter()
+    counts = {}
+    cur = conn.cursor()
+    try:
+        # Concurrent scrapes would upsert the same buckets; one refresh is
+        # enough since the next one picks up from the watermark anyway.
+        cur.execute("SELECT pg_try_advisory_xact_lock(hashtext(%s))", (WATERMARKS_TABLE,))
+        if not cur.fetchone()[0]:
+            conn.rollback()
+            return counts
+        ensure_rollup_tables(cur)
+        if rebuild:
+            cur.execute(f"DELETE FROM {WATERMARKS_TABLE}")
+
+        finest, seconds, _ = RESOLUTIONS[0]
+        counts[finest] = 0
+        for source, raw_select, raw_params in raw_sources(cur, storage_layout):
+            counts[finest] += refresh_from_raw(
+                cur, finest, seconds, source, raw_select, raw_params
+            )
+        for (finer, _, _), (resolution, seconds, _) in zip(RESOLUTIONS, RESOLUTIONS[1:]):
+            counts[resolution] = refresh_from_rollup(cur, resolution, seconds, finer)
+
+        now = time.monotonic()
+        if now - _last_retention_run >= ROLLUP_RETENTION_INTERVAL_SECONDS:
+            drop_expired_rollups(cur)
+            _last_retention_run = now
+        # Cached tool results may have been answered from the old rollups
+        notify_scrape(cur)
+        conn.commit()
+        commit_caches(conn)
+        scrape_committed()
+    except Exception as err:
+        print(f"Rollup error: {err}")
+        conn.rollback()
+        rollback_caches(conn)
+        return {}
+    finally:
+        cur.close()
+
+    print(
+        f"Refreshed rollups in {time.perf_counter() - start:.2f}s "
+        + ", ".join(f"{name}={count}" for name, count in counts.items())
+    )
+    return counts
+
+
+def pick_resolution(time_range):
+    """The coarsest resolution with at least ROLLUP_MIN_BUCKETS buckets in the window."""
+    span = time_range.seconds()
+    if span is None:
+        # All history: as coarse as it gets
+        return RESOLUTIONS[-1][0]
+    chosen = None
+    for resolution, seconds, _ in RESOLUTIONS:
+        if span / seconds >= ROLLUP_MIN_BUCKETS:
+            chosen = resolution
+    return chosen
+
+
+def windowed_source(metric_name, time_range, aggregate="max"):
+    """Like metric_source, but served from a rollup when the window is long enough.
+
+    value holds the requested per-bucket aggregate and timestamp the bucket
+    start, so MAX/MIN/SUM queries over the window give the same answer as
+    on the raw samples, up to whole buckets at the window edges. With
+    aggregate="last", the latest bucket of a series holds its latest value.
+    """
+    resolution = None
+    if ROLLUPS_ENABLED and STORAGE_MODE == "append" and metric_name in ROLLUP_METRICS:
+        resolution = pick_resolution(time_range)
+    if resolution is None:
+        return metric_source(metric_name)
+    source = f"""(
+        SELECT cluster, metric_name, labels, {AGGREGATE_COLUMNS[aggregate]} AS value,
+               bucket AS timestamp
+        FROM {rollup_table(resolution)}
+        WHERE metric_name = %s
+    ) AS {metric_table_name(metric_name)}"""
+    return source, [metric_name]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Refresh the metric rollup tables")
+    parser.add_argument("--layout", choices=["wide", "narrow"], default=STORAGE_LAYOUT)
+    parser.add_argument(
+        "--rebuild", action="store_true", help="Recompute the rollups from all raw samples"
+    )
+    args = parser.parse_args()
+
+    conn = get_db_conn()
+    if not conn:
+        print("Database connection failed. Exiting...")
+    else:
+        refresh_rollups(conn, args.layout, args.rebuild)
+        conn.close()
@@ -0,0 +1,313 @@
+import argparse
+import asyncio
+import os
+import random
+import threading
+import time
+
+import httpx
+
+from .connection import get_db_pool
+from .mgr_resolver import is_standby_response, mgr_resolver
+from .scrape_metricsdata import (
+    LOCAL_SAMPLE_METRICS_FILE,
+    LOCAL_SOURCE,
+    MGR_FETCH_ATTEMPTS,
+    ingest_metric_lines,
+    scrape_error,
+)
+
+SCRAPE_INTERVAL = float(os.getenv("SCRAPE_INTERVAL", "60"))
+SCRAPE_TARGET_TIMEOUT = float(os.getenv("SCRAPE_TARGET_TIMEOUT", "45"))
+SCRAPE_JITTER = float(os.getenv("SCRAPE_JITTER", "5"))
+SCRAPE_CONCURRENCY = int(os.getenv("SCRAPE_CONCURRENCY", "8"))
+LOCAL_TARGET = LOCAL_SOURCE
+
+# Lines are handed to the database writer in chunks through a bounded queue,
+# so a slow database applies back-pressure to the HTTP read.
+LINES_PER_CHUNK = 1000
+QUEUED_CHUNKS = 8
+
+
+def _drain(queue, loop):
+    """Blocking iterator over the lines an async producer puts on queue."""
+    while True:
+        chunk = asyncio.run_coroutine_threadsafe(queue.get(), loop).result()
+        if chunk is None:
+            return
+        if isinstance(chunk, BaseException):
+            raise chunk
+        yield from chunk
+
+
+def _cancellable(lines, cancelled):
+    for line in lines:
+        if cancelled.is_set():
+            raise RuntimeError("Scrape cancelled before the payload was read")
+        yield line
+
+
+def _abort(queue, err):
+    if not isinstance(err, Exception):
+        # Timeouts cancel the producer; the writer should roll back, not die
+        err = RuntimeError("Scrape cancelled before the payload was read")
+    # Make room so the writer thread always sees the error and stops
+    while not queue.empty():
+        queue.get_nowait()
+    queue.put_nowait(err)
+
+
+class ScrapeDaemon:
+    """Scrapes every cluster on a fixed interval, each target in its own task."""
+
+    def __init__(
+        self,
+        targets,
+        ssh_username=None,
+        ssh_password=None,
+        interval=SCRAPE_INTERVAL,
+        timeout=SCRAPE_TARGET_TIMEOUT,
+        jitter=SCRAPE_JITTER,
+        concurrency=SCRAPE_CONCURRENCY,
+    ):
+        self.targets = list(targets)
+        self.ssh_username = ssh_username
+        self.ssh_password = ssh_password
+        self.interval = interval
+        self.timeout = timeout
+        self.jitter = jitter
+        self._semaphore = asyncio.Semaphore(concurrency)
+        # A target's next scrape waits until its last writer has finished
+        self._target_locks = {target: asyncio.Lock() for target in self.targets}
+        self.stats = {
+            target: {
+                "scrapes": 0,
+                "failures": 0,
+                "duration_seconds": None,
+                "samples": 0,
+                "unchanged": 0,
+                "rows_per_sec": 0.0,
+                "last_success": None,
+                "last_error": None,
+            }
+            for target in self.targets
+        }
+
+    async def _put(self, queue, item, ingest):
+        """Queues item unless the writer has already stopped consuming."""
+        put = asyncio.ensure_future(queue.put(item))
+        await asyncio.wait({put, ingest}, return_when=asyncio.FIRST_COMPLETED)
+        if not put.done():
+            put.cancel()
+            return False
+        return True
+
+    async def _stream_into(self, response, queue, ingest):
+        chunk = []
+        async for line in response.aiter_lines():
+            chunk.append(line)
+            if len(chunk) >= LINES_PER_CHUNK:
+                if not await self._put(queue, chunk, ingest):
+                    return
+                chunk = []
+        if chunk and not await self._put(queue, chunk, ingest):
+            return
+        await self._put(queue, None, ingest)
+
+    async def _stop_writer(self, ingest, abort, target):
+        """Cancelling does not stop the writer thread: makes it roll back, then
+        waits for it, so it never commits after the scrape was counted as failed
+        or overlaps the next scrape of target."""
+        if ingest.done():
+            return
+        abort()
+        await asyncio.wait({ingest})
+        if ingest.exception() is None:
+            # It had read the whole payload and was already committing
+            print(f"Scrape of {target} was committed after it had been cancelled")
+
+    async def _ingest_response(self, response, target):
+        loop = asyncio.get_running_loop()
+        queue = asyncio.Queue(maxsize=QUEUED_CHUNKS)
+        ingest = asyncio.ensure_future(
+            asyncio.to_thread(ingest_metric_lines, _drain(queue, loop), source=target)
+        )
+        try:
+            await self._stream_into(response, queue, ingest)
+            return await asyncio.shield(ingest)
+        except BaseException as err:
+            await self._stop_writer(ingest, lambda: _abort(queue, err), target)
+            raise
+
+    async def scrape_target(self, client, target):
+        if target == LOCAL_TARGET:
+            cancelled = threading.Event()
+            with open(LOCAL_SAMPLE_METRICS_FILE, "r") as metrics_file:
+                ingest = asyncio.ensure_future(
+                    asyncio.to_thread(
+                        ingest_metric_lines,
+                        _cancellable(metrics_file, cancelled),
+                        source=LOCAL_TARGET,
+                    )
+                )
+                try:
+                    return await asyncio.shield(ingest)
+                except BaseException:
+                    await self._stop_writer(ingest, cancelled.set, target)
+                    raise
+
+        credentials = (self.ssh_username, self.ssh_password)
+        url = await asyncio.to_thread(mgr_resolver.metrics_url, target, *credentials)
+        for _ in range(MGR_FETCH_ATTEMPTS):
+            if not url:
+                break
+            try:
+                async with client.stream("GET", url) as response:
+                    location = response.headers.get("Location")
+                    if response.is_redirect and location:
+                        url = await asyncio.to_thread(
+                            mgr_resolver.follow_redirect, target, location
+                        )
+                        continue
+                    if not is_standby_response(response.status_code, response.headers):
+                        return await self._ingest_response(response, target)
+            except httpx.TransportError as err:
+                print(f"Fetching {url} failed: {err}")
+            # The cached mgr is gone or turned standby, find the active one
+            url = await asyncio.to_thread(mgr_resolver.failover, target, *credentials)
+        raise RuntimeError(f"No mgr of {target} is serving metrics")
+
+    async def _scrape_once(self, client, target):
+        stats = self.stats[target]
+        start = time.perf_counter()
+        async with self._target_locks[target], self._semaphore:
+            try:
+                result = await asyncio.wait_for(
+                    self.scrape_target(client, target), self.timeout
+                )
+                error = scrape_error(result)
+                if error:
+                    raise RuntimeError(error)
+            except Exception as err:
+                stats["failures"] += 1
+                stats["last_error"] = f"{type(err).__name__}: {err}"
+                print(f"Scrape of {target} failed: {stats['last_error']}")
+            else:
+                stats["samples"] = result["rows"]
+                stats["unchanged"] = result["unchanged"]
+                stats["rows_per_sec"] = result["rows_per_sec"]
+                stats["last_success"] = time.time()
+                stats["last_error"] = None
+            finally:
+                stats["scrapes"] += 1
+                stats["duration_seconds"] = time.perf_counter() - start
+
+    async def _run_target(self, client, target):
+        # Spread the first scrapes out so the targets do not fire in lockstep
+        await asyncio.sleep(random.uniform(0, self.jitter))
+        while True:
+            started = time.monotonic()
+            await self._scrape_once(client, target)
+            elapsed = time.monotonic() - started
+            delay = self.interval - elapsed + random.uniform(-self.jitter, self.jitter)
+            await asyncio.sleep(max(delay, 0))
+
+    async def run(self, cycles=None):
+        """Runs forever, or scrapes every target cycles times when given."""
+        timeout = httpx.Timeout(self.timeout, connect=min(self.timeout, 10))
+        async with httpx.AsyncClient(timeout=timeout) as client:
+            if cycles is not None:
+                for _ in range(cycles):
+                    await asyncio.gather(
+                        *(self._scrape_once(client, target) for target in self.targets)
+                    )
+                return self.stats
+            await asyncio.gather(
+                *(self._run_target(client, target) for target in self.targets)
+            )
+
+    def render_stats(self):
+        """Per-target scrape stats in the Prometheus text format."""
+        lines = []
+        metrics = [
+            ("ceph_scraper_scrape_duration_seconds", "gauge", "duration_seconds"),
+            ("ceph_scraper_samples", "gauge", "samples"),
+            ("ceph_scraper_unchanged_samples", "gauge", "unchanged"),
+            ("ceph_scraper_rows_per_second", "gauge", "rows_per_sec"),
+            ("ceph_scraper_scrapes_total", "counter", "scrapes"),
+            ("ceph_scraper_failures_total", "counter", "failures"),
+        ]
+        for name, metric_type, key in metrics:
+            lines.append(f"# TYPE {name} {metric_type}")
+            for target, stats in self.stats.items():
+                value = stats[key]
+                if value is not None:
+                    lines.append(f'{name}{{target="{target}"}} {value}')
+        lines.append("# TYPE ceph_scraper_up gauge")
+        for target, stats in self.stats.items():
+            up = 1 if stats["scrapes"] and stats["last_error"] is None else 0
+            lines.append(f'ceph_scraper_up{{target="{target}"}} {up}')
+
+        pool = get_db_pool().stats()
+        lines.append("# TYPE ceph_scraper_db_pool_connections gauge")
+        for state in ("idle", "in_use"):
+            lines.append(f'ceph_scraper_db_pool_connections{{state="{state}"}} {pool[state]}')
+        return "\n".join(lines) + "\n"
+
+    async def serve_stats(self, port):
+        async def handle(reader, writer):
+            await reader.readuntil(b"\r\n\r\n")
+            body = self.render_stats().encode()
+            writer.write(
+                b"HTTP/1.1 200 OK\r\n"
+                b"Content-Type: text/plain; version=0.0.4\r\n"
+                + f"Content-Length: {len(body)}\r\nConnection: close\r\n\r\n".encode()
+                + body
+            )
+            await writer.drain()
+            writer.close()
+
+        return await asyncio.start_server(handle, port=port)
+
+
+async def main_async(args):
+    daemon = ScrapeDaemon(
+        args.cluster,
+        ssh_username=args.ssh_username,
+        ssh_password=args.ssh_password,
+        interval=args.interval,
+        timeout=args.timeout,
+        jitter=args.jitter,
+        concurrency=args.concurrency,
+    )
+    if args.metrics_port:
+        await daemon.serve_stats(args.metrics_port)
+        print(f"Serving scrape stats on :{args.metrics_port}/metrics")
+    if args.once:
+        await daemon.run(cycles=1)
+        print(daemon.render_stats())
+    else:
+        await daemon.run()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Continuously scrape Ceph clusters")
+    parser.add_argument(
+        "--cluster",
+        action="append",
+        default=[ip for ip in os.getenv("CEPH_CLUSTERS", "").split(",") if ip],
+        help=f"Cluster IP to scrape (repeatable), or '{LOCAL_TARGET}' for the sample file",
+    )
+    parser.add_argument("--ssh-username", default=os.getenv("CEPH_SSH_USERNAME"))
+    parser.add_argument("--ssh-password", default=os.getenv("CEPH_SSH_PASSWORD"))
+    parser.add_argument("--interval", type=float, default=SCRAPE_INTERVAL)
+    parser.add_argument("--timeout", type=float, default=SCRAPE_TARGET_TIMEOUT)
+    parser.add_argument("--jitter", type=float, default=SCRAPE_JITTER)
+    parser.add_argument("--concurrency", type=int, default=SCRAPE_CONCURRENCY)
+    parser.add_argument("--metrics-port", type=int, default=0)
+    parser.add_argument("--once", action="store_true", help="Scrape every cluster once and exit")
+    args = parser.parse_args()
+
+    if not args.cluster:
+        parser.error("no clusters given, use --cluster or CEPH_CLUSTERS")
+    asyncio.run(main_async(args))
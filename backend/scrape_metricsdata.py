@@ -1,161 +1,421 @@
+import csv
+import io
+import itertools
+import math
+import os
+import time
 
-
-import json
-import re
-
-import paramiko
+import psycopg2
 import requests
+from psycopg2.extras import execute_values
 
-from .connection import get_db_conn
+from .change_detection import CHANGES_ONLY, get_change_detector
+from .connection import pooled_connection
+from .exposition import label_dict, parse_exposition
+from .hot_store import hot_store
+from .indexes import ensure_metric_indexes, ensure_narrow_indexes
+from .mgr_resolver import is_standby_response, mgr_resolver
+from .rollups import ROLLUPS_ENABLED, refresh_rollups
+from .series import series_cache
+from .storage import (
+    DEFAULT_CLUSTER,
+    SAMPLES_TABLE,
+    STORAGE_LAYOUT,
+    STORAGE_MODE,
+    commit_caches,
+    ensure_narrow_tables,
+    metric_table_name,
+    prepare_metric_table,
+    register_cluster,
+    rollback_caches,
+    run_retention_if_due,
+    scrape_timestamp,
+)
+from .tool_cache import notify_scrape, scrape_committed
 
-TABLE_PREFIX = "ceph_"
-TABLE_SUFFIX = "_metrics"
 LOCAL_SAMPLE_METRICS_FILE = "../data/sample_metrics.txt"
+LOCAL_SOURCE = DEFAULT_CLUSTER
 
-
-# Function to parse labels
-def parse_labels(label_str):
-    labels = {}
-    # Match key="value" pairs including those with spaces
-    label_pattern = r'([a-zA-Z0-9_]+)="([^"]+)"'
-    matches = re.findall(label_pattern, label_str)
-    for match in matches:
-        labels[match[0]] = match[1]
-    return labels
+# "bulk" streams each table through COPY in a single transaction per scrape,
+# "row" keeps the original INSERT-per-sample behaviour.
+WRITE_MODE = os.getenv("SCRAPE_WRITE_MODE", "bulk")
+# Samples parsed and written per batch; 0 writes the whole scrape at once
+BATCH_SIZE = int(os.getenv("SCRAPE_BATCH_SIZE", "5000"))
+SCRAPE_TIMEOUT = int(os.getenv("SCRAPE_TIMEOUT", "30"))
+# Fetches tried per scrape while following a mgr failover
+MGR_FETCH_ATTEMPTS = 3
 
 
 def get_active_mgr_ip(cluster_ip, ssh_username, ssh_password):
     try:
-        # Establish SSH connection
-        ssh = paramiko.SSHClient()
-        ssh.set_missing_host_key_policy(paramiko.AutoAddPolicy())
-        ssh.connect(cluster_ip, username=ssh_username, password=ssh_password)
-
-        # Run the Ceph command to get manager details
-        stdin, stdout, stderr = ssh.exec_command("cephadm shell ceph mgr dump -f json")
-        output = stdout.read().decode()
-
-        # Close SSH connection
-        ssh.close()
-
-        # Parse JSON output
-        mgr_data = json.loads(output)
-
-        # Extract active manager name
-        
-        active_addr = mgr_data.get("active_addr", None)
-        if not active_addr:
-            print("No active mgr found")
-            return None
-        else:
-            active_addr = active_addr.split(":")[0]
-            return active_addr
-
+        # Cached per cluster, SSH is only used when the entry has expired
+        endpoint = mgr_resolver.resolve(cluster_ip, ssh_username, ssh_password)
     except Exception as e:
         print(f"Error: {e}")
         return None
 
+    if not endpoint["active"]:
+        print("No active mgr found")
+        return None
+    return endpoint["active"]
 
-# Fetch Prometheus metrics
-def scrape_metrics(cluster_ip, ssh_username, ssh_password):
-    if cluster_ip:
-        ip = get_active_mgr_ip(cluster_ip, ssh_username, ssh_password)
-        url = f"http://{ip}:9283/metrics"
-        response = requests.get(url)
-        metrics_data = response.text.splitlines()
-    else:
-        metrics_data = open(LOCAL_SAMPLE_METRICS_FILE, "r").read().splitlines()
-        metrics_data = [line for line in metrics_data if line.strip()]
-
-    # Connect to PostgreSQL once
-    conn = get_db_conn()
-    if not conn:
-        print("Database connection failed. Exiting...")
-        exit()
-
-    # Parse metrics and process each line
-    cleaned_list = [line for line in metrics_data if line.strip()]
-    metrics_by_table = {}
-    for line in cleaned_list:
-    
-        if line.startswith("#"):  # Skip comment lines
-            continue
-
-        # Example line format:
-        # ceph_mon_metadata{ceph_daemon="mon.ceph-sangadi-nvme-ixwhtf-node1-installer",hostname="ceph-sangadi-nvme-ixwhtf-node1-installer",public_addr="10.0.65.187",rank="0",ceph_version="ceph version 19.2.0-79.el9cp (4f3da703296998ada04b48f8565da9952ce77eb8) squid (stable)"} 1.0
-
-        print("=================================")
-        print(line)
-        metric_parts = line.rsplit(" ", 1)  # Split only on the last space to separate the value
-
-        metric_name_and_labels = metric_parts[0]
-        metric_value_str = metric_parts[1]
-
-        # Extract metric name and labels
-        metric_name = metric_name_and_labels.split("{")[
-            0
-        ]  # Extract metric name before '{'
-        metric_labels_str = (
-            metric_name_and_labels.split("{")[1][:-1]
-            if "{" in metric_name_and_labels
-            else ""
-        )  # Extract labels inside '{}'
-
-        # Parse the labels into a dictionary
-        metric_labels = parse_labels(metric_labels_str)
-
-        # Convert the metric value to float
+
+def open_metrics_stream(cluster_ip, ssh_username, ssh_password):
+    """Opens the /metrics response of the active mgr, following mgr failovers.
+
+    Raises when no mgr answers with a successful status.
+    """
+    url = mgr_resolver.metrics_url(cluster_ip, ssh_username, ssh_password)
+    for _ in range(MGR_FETCH_ATTEMPTS):
+        if not url:
+            break
         try:
-            metric_value = float(metric_value_str)
-        except ValueError:
-            print(f"Error converting '{metric_value_str}' to float")
-            continue
+            response = requests.get(
+                url, stream=True, timeout=SCRAPE_TIMEOUT, allow_redirects=False
+            )
+        except requests.RequestException as err:
+            print(f"Fetching {url} failed: {err}")
+        else:
+            if response.is_redirect and response.headers.get("Location"):
+                response.close()
+                url = mgr_resolver.follow_redirect(cluster_ip, response.headers["Location"])
+                continue
+            if not is_standby_response(response.status_code, response.headers):
+                try:
+                    response.raise_for_status()
+                except requests.HTTPError:
+                    response.close()
+                    raise
+                return response
+            response.close()
+        url = mgr_resolver.failover(cluster_ip, ssh_username, ssh_password)
+    raise RuntimeError(f"No mgr of {cluster_ip} is serving metrics")
+
+
+def batched(items, size):
+    # size <= 0 disables batching, the whole scrape becomes one batch
+    batch = []
+    for item in items:
+        batch.append(item)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
 
+def group_by_table(samples):
+    metrics_by_table = {}
+    for sample in samples:
         # Create table name dynamically from metric name
-        table_name = f"{metric_name.lower().replace('_', '').replace(':', '')}"  # e.g., ceph_mon_quorum_status_metrics
-        table_name = f"{TABLE_PREFIX}{table_name}{TABLE_SUFFIX}"
-        
-        metrics_by_table.setdefault(table_name, []).append((metric_name, json.dumps(metric_labels), metric_value))   
-    
-    for table_name, rows in metrics_by_table.items():
-        cur = conn.cursor()
-        delete_table_query = f"DROP TABLE IF EXISTS {table_name}"
-        cur.execute(delete_table_query)
-
-        # Create the table dynamically based on the metric name if it doesn't exist
-        create_table_query = f"""
-        CREATE TABLE IF NOT EXISTS {table_name} (
-            metric_name VARCHAR NOT NULL,
-            labels JSONB,
-            value DOUBLE PRECISION,
-            timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-        );
-        """
-        
-        # Create the table if it doesn't exist
-        cur.execute(create_table_query)
-        
-        conn.commit() # Commit the table creation
+        table_name = metric_table_name(sample.name)  # e.g., ceph_cephosdup_metrics
+        metrics_by_table.setdefault(table_name, []).append(
+            (sample.name, sample.labels, sample.value)
+        )
+    return metrics_by_table
+
+
+# Fetch Prometheus metrics
+def scrape_metrics(
+    cluster_ip=None,
+    ssh_username=None,
+    ssh_password=None,
+    write_mode=WRITE_MODE,
+    storage_mode=STORAGE_MODE,
+    storage_layout=STORAGE_LAYOUT,
+    batch_size=BATCH_SIZE,
+):
+    # Example line format:
+    # ceph_mon_metadata{ceph_daemon="mon.ceph-sangadi-nvme-ixwhtf-node1-installer",hostname="ceph-sangadi-nvme-ixwhtf-node1-installer",public_addr="10.0.65.187",rank="0",ceph_version="ceph version 19.2.0-79.el9cp (4f3da703296998ada04b48f8565da9952ce77eb8) squid (stable)"} 1.0
+    if not cluster_ip:
+        with open(LOCAL_SAMPLE_METRICS_FILE, "r") as metrics_file:
+            return ingest_metric_lines(
+                metrics_file, write_mode, storage_mode, storage_layout, batch_size, LOCAL_SOURCE
+            )
+
+    # The mgr is resolved and the response status checked before anything is
+    # written; fetch errors propagate to the caller.
+    with open_metrics_stream(cluster_ip, ssh_username, ssh_password) as response:
+        # The body is read incrementally while the batches are written
+        lines = response.iter_lines(chunk_size=64 * 1024, decode_unicode=True)
+        return ingest_metric_lines(
+            lines, write_mode, storage_mode, storage_layout, batch_size, cluster_ip
+        )
+
+
+def scrape_error(result):
+    """Why a scrape_metrics()/ingest_metric_lines() result is a failure, or None.
+
+    Failed fetches and writes raise; this covers the results they return.
+    """
+    if result is None:
+        return "Database connection failed"
+    if not result["rows"] and not result["unchanged"]:
+        return "The scrape contained no samples"
+    return None
+
+
+def ingest_metric_lines(
+    lines,
+    write_mode=WRITE_MODE,
+    storage_mode=STORAGE_MODE,
+    storage_layout=STORAGE_LAYOUT,
+    batch_size=BATCH_SIZE,
+    source=LOCAL_SOURCE,
+    changes_only=CHANGES_ONLY,
+):
+    """Parses exposition lines and writes them as one scrape of source.
+
+    source is the cluster the samples are tagged with. Errors reading the
+    lines or writing the scrape are raised after the transaction is rolled
+    back; None means no database connection was available.
+    """
+    # Lines are fetched, parsed and written batch by batch, so memory use
+    # depends on batch_size rather than on the size of the scrape.
+    batches = batched(parse_exposition(lines), batch_size)
+    if hot_store.enabled:
+        batches = hot_store.record_batches(source, batches)
+
+    # Skipping unchanged samples only makes sense when history is kept;
+    # a "replace" snapshot has to contain every series.
+    detector = None
+    if changes_only and storage_mode == "append" and write_mode != "row":
+        detector = get_change_detector(source)
+        detector.begin()
+        batches = detector.filter_batches(batches)
+
+    # The first batch is read before a connection is checked out, so a fetch
+    # that fails straight away never opens a transaction.
+    batches = iter(batches)
+    try:
+        first = next(batches, None)
+    except Exception:
+        hot_store.rollback(source)
+        if detector is not None:
+            detector.rollback()
+        raise
+    if first is not None:
+        batches = itertools.chain([first], batches)
 
+    with pooled_connection() as conn:
+        if not conn:
+            print("Database connection failed. Exiting...")
+            hot_store.rollback(source)
+            if detector is not None:
+                detector.rollback()
+            return None
+
+        start = time.perf_counter()
+        if storage_layout == "narrow":
+            rows_written, tables = write_samples_narrow(
+                conn, batches, storage_mode, detector, source
+            )
+            write_mode = "narrow"
+        elif write_mode == "row":
+            rows_written, tables = write_rows_individually(conn, batches, storage_mode, source)
+        else:
+            rows_written, tables = write_rows_bulk(
+                conn, batches, storage_mode, detector, source
+            )
+        elapsed = time.perf_counter() - start
+
+        if storage_mode == "append":
+            if ROLLUPS_ENABLED and rows_written:
+                refresh_rollups(conn, storage_layout)
+            run_retention_if_due(conn)
+
+    rows_per_sec = rows_written / elapsed if elapsed > 0 else 0.0
+    unchanged = detector.skipped if detector is not None else 0
+    print(
+        f"Scrape wrote {rows_written} rows into {tables} tables "
+        f"in {elapsed:.2f}s ({rows_per_sec:.0f} rows/s, mode={write_mode}, "
+        f"unchanged={unchanged})"
+    )
+    return {
+        "rows": rows_written,
+        "tables": tables,
+        "seconds": elapsed,
+        "rows_per_sec": rows_per_sec,
+        "unchanged": unchanged,
+    }
+
+
+def format_value(value):
+    # PostgreSQL spells the special floats differently from Python's repr
+    if math.isnan(value):
+        return "NaN"
+    if math.isinf(value):
+        return "Infinity" if value > 0 else "-Infinity"
+    return repr(value)
+
+
+def copy_rows(cur, table_name, rows, cluster=DEFAULT_CLUSTER):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    for metric_name, labels, value in rows:
+        writer.writerow((metric_name, labels, format_value(value), cluster))
+    buffer.seek(0)
+    cur.copy_expert(
+        f"COPY {table_name} (metric_name, labels, value, cluster) FROM STDIN WITH (FORMAT csv)",
+        buffer,
+    )
+
+
+def finish_scrape(conn, cur, detector, cluster=DEFAULT_CLUSTER, now=None):
+    """Commits a scrape, recording series that disappeared since the last one."""
+    register_cluster(cur, cluster, now or scrape_timestamp(cur))
+    stale = detector.write_stale_markers(cur) if detector is not None else ()
+    notify_scrape(cur)
+    conn.commit()
+    commit_caches(conn)
+    hot_store.commit(cluster)
+    scrape_committed()
+    if detector is not None:
+        detector.commit(stale)
+
+
+def prepare_table(cur, table_name, rows, storage_mode, now, cluster=DEFAULT_CLUSTER):
+    prepare_metric_table(cur, table_name, rows[0][0], storage_mode, now, cluster)
+    # Snapshot tables stay small, only the growing history tables are indexed
+    if storage_mode == "append":
+        ensure_metric_indexes(cur, table_name, label_dict(rows[0][1]))
+
+
+def write_rows_bulk(
+    conn, batches, storage_mode=STORAGE_MODE, detector=None, cluster=DEFAULT_CLUSTER
+):
+    """Writes every batch of a scrape in one transaction using COPY."""
+    rows_written = 0
+    prepared = set()
+    cur = conn.cursor()
+    try:
+        now = scrape_timestamp(cur)
+        for batch in batches:
+            for table_name, rows in group_by_table(batch).items():
+                # Tables are prepared once per scrape, not once per batch
+                if table_name not in prepared:
+                    prepare_table(cur, table_name, rows, storage_mode, now, cluster)
+                    prepared.add(table_name)
+
+                # Fall back to multi-row INSERTs where COPY is not available
+                # (e.g. behind some poolers), without losing the transaction.
+                cur.execute("SAVEPOINT bulk_copy")
+                try:
+                    copy_rows(cur, table_name, rows, cluster)
+                except psycopg2.Error as err:
+                    print(f"COPY into {table_name} failed ({err}), using execute_values")
+                    cur.execute("ROLLBACK TO SAVEPOINT bulk_copy")
+                    execute_values(
+                        cur,
+                        f"INSERT INTO {table_name} (metric_name, labels, value, cluster) VALUES %s",
+                        [(*row, cluster) for row in rows],
+                        page_size=1000,
+                    )
+                cur.execute("RELEASE SAVEPOINT bulk_copy")
+                rows_written += len(rows)
+
+        finish_scrape(conn, cur, detector, cluster, now)
+    except Exception as err:
+        print(f"Scrape error: {err}")
+        conn.rollback()
+        rollback_caches(conn)
+        hot_store.rollback(cluster)
+        if detector is not None:
+            detector.rollback()
+        raise
+    finally:
+        cur.close()
+    return rows_written, len(prepared)
+
+
+def write_samples_narrow(
+    conn, batches, storage_mode=STORAGE_MODE, detector=None, cluster=DEFAULT_CLUSTER
+):
+    """Writes every batch of a scrape into the series/samples layout in one transaction."""
+    rows_written = 0
+    metric_names = set()
+    cur = conn.cursor()
+    try:
+        now = scrape_timestamp(cur)
+        ensure_narrow_tables(cur, storage_mode, now, cluster)
+        ensure_narrow_indexes(cur)
+
+        for batch in batches:
+            keys = dict.fromkeys((sample.name, sample.labels) for sample in batch)
+            series_ids = series_cache.resolve(cur, keys, cluster)
+
+            buffer = io.StringIO()
+            for sample in batch:
+                series_id = series_ids[(sample.name, sample.labels)]
+                buffer.write(f"{series_id}\t{format_value(sample.value)}\n")
+                metric_names.add(sample.name)
+            buffer.seek(0)
+            cur.copy_expert(
+                f"COPY {SAMPLES_TABLE} (series_id, value) FROM STDIN", buffer
+            )
+            rows_written += len(batch)
+
+        finish_scrape(conn, cur, detector, cluster, now)
+    except Exception as err:
+        print(f"Scrape error: {err}")
+        conn.rollback()
+        # Tables and series ids created inside the transaction no longer exist
+        rollback_caches(conn)
+        hot_store.rollback(cluster)
+        if detector is not None:
+            detector.rollback()
+        raise
+    finally:
+        cur.close()
+    return rows_written, len(metric_names)
+
+
+def write_rows_individually(conn, batches, storage_mode=STORAGE_MODE, cluster=DEFAULT_CLUSTER):
+    rows_written = 0
+    prepared = set()
+    for batch in batches:
+        for table_name, rows in group_by_table(batch).items():
+            cur = conn.cursor()
+            try:
+                if table_name not in prepared:
+                    prepare_table(
+                        cur, table_name, rows, storage_mode, scrape_timestamp(cur), cluster
+                    )
+                    conn.commit()  # Commit the table creation
+                    commit_caches(conn)
+                    prepared.add(table_name)
+
+                for row in rows:
+                    # Execute insert query
+                    cur.execute(
+                        f"INSERT INTO {table_name} (metric_name, labels, value, cluster) "
+                        "VALUES (%s, %s, %s, %s)",
+                        (*row, cluster),
+                    )
+                    conn.commit()
+                    rows_written += 1
+
+            except Exception as err:
+                print(f"Database error: {err}")
+                conn.rollback()
+                rollback_caches(conn)
+                hot_store.rollback(cluster)
+                raise
+            finally:
+                cur.close()
+
+    if rows_written:
+        cur = conn.cursor()
         try:
-            for row in rows:
-
-                # Execute insert query
-                cur.execute(
-                    f"INSERT INTO {table_name} (metric_name, labels, value) VALUES (%s, %s, %s)",
-                    row
-                )
-                conn.commit()
-                
-                print(
-                    f"Inserted {metric_name} with labels {json.dumps(metric_labels)} and value {metric_value} into {table_name}"
-                )
-
-        except Exception as err:
-            print(f"Database error: {err}")
-            conn.rollback()
+            register_cluster(cur, cluster, scrape_timestamp(cur))
+            notify_scrape(cur)
+            conn.commit()
+            commit_caches(conn)
         finally:
             cur.close()
+        hot_store.commit(cluster)
+        scrape_committed()
+    return rows_written, len(prepared)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,74 @@
+from psycopg2.extras import execute_values
+
+from .exposition import canonical_labels
+from .storage import DEFAULT_CLUSTER, SERIES_TABLE, TransactionCache
+
+
+class SeriesCache:
+    """In-process map of (cluster, metric_name, canonical labels) to series_id.
+
+    Ids created by a scrape are only shared once its transaction commits.
+    """
+
+    def __init__(self):
+        self._ids = TransactionCache()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self._ids)
+
+    def clear(self):
+        self._ids.clear()
+
+    def resolve(self, cur, keys, cluster=DEFAULT_CLUSTER):
+        """Returns {(metric_name, labels): series_id} for the series of cluster,
+        creating unknown series in one round trip each way."""
+        known = self._ids.get_many(cur, [(cluster, *key) for key in keys])
+        resolved = {}
+        missing = []
+        for key in keys:
+            series_id = known.get((cluster, *key))
+            if series_id is None:
+                missing.append(key)
+            else:
+                resolved[key] = series_id
+        # Only statistics, an occasional lost update does not matter
+        self.hits += len(resolved)
+        self.misses += len(missing)
+
+        if missing:
+            wanted = [(cluster, *key) for key in missing]
+            execute_values(
+                cur,
+                f"""
+                INSERT INTO {SERIES_TABLE} (cluster, metric_name, labels) VALUES %s
+                ON CONFLICT (cluster, metric_name, labels) DO NOTHING
+                """,
+                wanted,
+                template="(%s, %s, %s::jsonb)",
+                page_size=1000,
+            )
+            rows = execute_values(
+                cur,
+                f"""
+                SELECT s.series_id, s.metric_name, s.labels
+                FROM {SERIES_TABLE} s
+                JOIN (VALUES %s) AS wanted (cluster, metric_name, labels)
+                  ON s.cluster = wanted.cluster
+                 AND s.metric_name = wanted.metric_name AND s.labels = wanted.labels
+                """,
+                wanted,
+                template="(%s, %s, %s::jsonb)",
+                page_size=len(missing),
+                fetch=True,
+            )
+            for series_id, metric_name, labels in rows:
+                key = (metric_name, canonical_labels(labels))
+                self._ids.set(cur, (cluster, *key), series_id)
+                resolved[key] = series_id
+
+        return resolved
+
+
+series_cache = SeriesCache()
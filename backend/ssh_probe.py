@@ -0,0 +1,104 @@
+"""Checks SSH access to many clusters at once, e.g. when onboarding a fleet.
+
+Every probe first tries a plain TCP connect with a short timeout, so dead
+hosts fail fast, then authenticates through the resolver's SSH session pool.
+The authenticated session stays in the pool, so the active mgr lookup that
+follows (and later scrapes) reuse it instead of logging in again.
+"""
+
+import argparse
+import os
+import socket
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+import paramiko
+
+from .mgr_resolver import mgr_resolver
+
+SSH_PORT = 22
+SSH_PROBE_WORKERS = int(os.getenv("SSH_PROBE_WORKERS", "16"))
+SSH_PROBE_TCP_TIMEOUT = float(os.getenv("SSH_PROBE_TCP_TIMEOUT", "3"))
+
+ProbeResult = namedtuple(
+    "ProbeResult", ["ip", "reachable", "authenticated", "active_mgr", "error", "seconds"]
+)
+
+
+def probe_cluster(
+    ip, username, password, resolve_mgr=True, tcp_timeout=SSH_PROBE_TCP_TIMEOUT
+):
+    """Probes one cluster; never raises, failures are reported in the result."""
+    start = time.perf_counter()
+
+    def result(reachable, authenticated, active_mgr=None, error=None):
+        return ProbeResult(
+            ip, reachable, authenticated, active_mgr, error, time.perf_counter() - start
+        )
+
+    try:
+        socket.create_connection((ip, SSH_PORT), timeout=tcp_timeout).close()
+    except OSError as err:
+        return result(False, False, error=f"Unreachable: {err}")
+
+    try:
+        mgr_resolver.ssh_sessions.get(ip, username, password)
+    except (paramiko.SSHException, OSError, EOFError) as err:
+        return result(True, False, error=f"SSH login failed: {err}")
+
+    if not resolve_mgr:
+        return result(True, True)
+    try:
+        endpoint = mgr_resolver.resolve(ip, username, password)
+    except Exception as err:
+        return result(True, True, error=f"Active mgr lookup failed: {err}")
+    if not endpoint["active"]:
+        return result(True, True, error="No active mgr found")
+    return result(True, True, endpoint["active"])
+
+
+def probe_clusters(ips, username, password, resolve_mgr=True, max_workers=SSH_PROBE_WORKERS):
+    """Probes every IP concurrently; returns {ip: ProbeResult} in input order."""
+    ips = list(dict.fromkeys(ips))
+    if not ips:
+        return {}
+    with ThreadPoolExecutor(
+        max_workers=min(max_workers, len(ips)), thread_name_prefix="ssh-probe"
+    ) as executor:
+        results = executor.map(
+            lambda ip: probe_cluster(ip, username, password, resolve_mgr), ips
+        )
+        return dict(zip(ips, results))
+
+
+def print_results(results):
+    for result in results.values():
+        if result.authenticated and not result.error:
+            print(f"✅ {result.ip}: active mgr {result.active_mgr or '-'} ({result.seconds:.1f}s)")
+        else:
+            print(f"❌ {result.ip}: {result.error} ({result.seconds:.1f}s)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Check SSH access to Ceph clusters in parallel")
+    parser.add_argument("ips", nargs="*", help="Cluster IPs")
+    parser.add_argument("--file", help="File with one cluster IP per line")
+    parser.add_argument("--ssh-username", default=os.getenv("CEPH_SSH_USERNAME"))
+    parser.add_argument("--ssh-password", default=os.getenv("CEPH_SSH_PASSWORD"))
+    parser.add_argument("--workers", type=int, default=SSH_PROBE_WORKERS)
+    parser.add_argument(
+        "--no-mgr", action="store_true", help="Only log in, skip the active mgr lookup"
+    )
+    args = parser.parse_args()
+
+    ips = list(args.ips)
+    if args.file:
+        with open(args.file) as ip_file:
+            ips += [line.strip() for line in ip_file if line.strip()]
+    start = time.perf_counter()
+    results = probe_clusters(
+        ips, args.ssh_username, args.ssh_password, not args.no_mgr, args.workers
+    )
+    print_results(results)
+    print(f"Probed {len(results)} clusters in {time.perf_counter() - start:.1f}s")
@@ -0,0 +1,550 @@
+import argparse
+import hashlib
+import os
+import threading
+import time
+from datetime import datetime, timedelta
+from functools import lru_cache
+
+from .connection import get_db_conn
+
+# "replace" drops and recreates every metric table on each scrape (snapshot of
+# the latest scrape only), "append" keeps history in day-partitioned tables.
+STORAGE_MODE = os.getenv("METRICS_STORAGE_MODE", "replace")
+# "wide" stores one table per metric name, "narrow" interns every series into
+# a single series table and keeps samples as (series_id, ts, value).
+STORAGE_LAYOUT = os.getenv("METRICS_STORAGE_LAYOUT", "wide")
+RETENTION_DAYS = int(os.getenv("METRICS_RETENTION_DAYS", "14"))
+RETENTION_INTERVAL_SECONDS = int(os.getenv("METRICS_RETENTION_INTERVAL", "3600"))
+
+SCHEMA_VERSION = 2
+REGISTRY_TABLE = "ceph_metrics_schema_registry"
+PARTITIONS_TABLE = "ceph_metrics_partitions"
+SERIES_TABLE = "ceph_series"
+SAMPLES_TABLE = "ceph_samples"
+# Series that stopped being reported, when only changed samples are written
+STALE_TABLE = "ceph_stale_series"
+# Every cluster that was ever scraped, for fanning a tool out to all of them
+CLUSTERS_TABLE = "ceph_clusters"
+# Cluster tag of the samples read from the local sample file
+DEFAULT_CLUSTER = "local"
+TABLE_PREFIX = "ceph_"
+TABLE_SUFFIX = "_metrics"
+MAX_IDENTIFIER_LENGTH = 63
+
+# Statements needed to bring a table registered at version N-1 up to N
+SCHEMA_MIGRATIONS = {
+    # Samples are tagged with the cluster they were scraped from
+    2: [
+        f"ALTER TABLE {{table}} ADD COLUMN IF NOT EXISTS cluster VARCHAR NOT NULL "
+        f"DEFAULT '{DEFAULT_CLUSTER}'",
+    ],
+}
+# Same for the series/samples tables of the narrow layout
+NARROW_SCHEMA_MIGRATIONS = {
+    2: [
+        f"ALTER TABLE {SERIES_TABLE} ADD COLUMN IF NOT EXISTS cluster VARCHAR NOT NULL "
+        f"DEFAULT '{DEFAULT_CLUSTER}'",
+        f"ALTER TABLE {SERIES_TABLE} DROP CONSTRAINT IF EXISTS {SERIES_TABLE}_metric_name_labels_key",
+        f"ALTER TABLE {SERIES_TABLE} ADD UNIQUE (cluster, metric_name, labels)",
+    ],
+}
+
+_caches = []
+_REMOVED = object()
+
+
+class TransactionCache:
+    """A map shared by every thread writing scrapes, e.g. of the tables known to exist.
+
+    What a transaction sets or discards stays pending on its connection, and
+    only that connection sees it, until commit_caches() publishes it;
+    rollback_caches() drops it. So a scrape never skips creating a table
+    that another scrape created in a transaction that may still roll back.
+    """
+
+    def __init__(self):
+        self._committed = {}
+        self._pending = {}  # connection -> {key: value, or _REMOVED}
+        self._lock = threading.Lock()
+        _caches.append(self)
+
+    def __len__(self):
+        with self._lock:
+            return len(self._committed)
+
+    def _lookup(self, pending, key, default):
+        value = pending.get(key, self._committed.get(key, default))
+        return default if value is _REMOVED else value
+
+    def get(self, cur, key, default=None):
+        with self._lock:
+            return self._lookup(self._pending.get(cur.connection, {}), key, default)
+
+    def get_many(self, cur, keys):
+        """{key: value} of the keys that are set."""
+        with self._lock:
+            pending = self._pending.get(cur.connection, {})
+            found = {key: self._lookup(pending, key, None) for key in keys}
+        return {key: value for key, value in found.items() if value is not None}
+
+    def snapshot(self, cur):
+        with self._lock:
+            items = {**self._committed, **self._pending.get(cur.connection, {})}
+        return {key: value for key, value in items.items() if value is not _REMOVED}
+
+    def set(self, cur, key, value=True):
+        with self._lock:
+            self._pending.setdefault(cur.connection, {})[key] = value
+
+    def discard(self, cur, key):
+        with self._lock:
+            self._pending.setdefault(cur.connection, {})[key] = _REMOVED
+
+    def commit(self, conn):
+        with self._lock:
+            for key, value in self._pending.pop(conn, {}).items():
+                if value is _REMOVED:
+                    self._committed.pop(key, None)
+                else:
+                    self._committed[key] = value
+
+    def rollback(self, conn):
+        with self._lock:
+            self._pending.pop(conn, None)
+
+    def clear(self):
+        with self._lock:
+            self._committed.clear()
+            self._pending.clear()
+
+
+def commit_caches(conn):
+    """Publishes what conn's transaction put into the caches; call after conn.commit()."""
+    for cache in _caches:
+        cache.commit(conn)
+
+
+def rollback_caches(conn):
+    for cache in _caches:
+        cache.rollback(conn)
+
+
+# table_name -> schema version
+_registry = TransactionCache()
+# REGISTRY_TABLE once the registry has been read
+_registry_loaded = TransactionCache()
+_known_partitions = TransactionCache()
+_verified_tables = TransactionCache()
+_snapshot_tables = TransactionCache()
+_last_retention_run = 0.0
+_retention_lock = threading.Lock()
+
+
+@lru_cache(maxsize=None)
+def metric_table_name(metric_name):
+    # e.g. ceph_osd_up -> ceph_cephosdup_metrics
+    table_name = metric_name.lower().replace("_", "").replace(":", "")
+    return f"{TABLE_PREFIX}{table_name}{TABLE_SUFFIX}"
+
+
+def lock_schema(cur):
+    """Serialises table creation with other scrapes until the transaction ends.
+
+    Concurrent CREATE TABLE IF NOT EXISTS of the same name can still fail,
+    so only call this on cache misses, right before the DDL.
+    """
+    cur.execute("SELECT pg_advisory_xact_lock(hashtext(%s))", (REGISTRY_TABLE,))
+
+
+def metric_source(metric_name, layout=None):
+    """Returns (FROM item, params) exposing cluster, metric_name, labels, value and timestamp.
+
+    Queries written against the per-metric tables run unchanged against the
+    narrow layout, where the relation is a join of samples and series. The
+    params go before those of the rest of the query.
+    """
+    table_name = metric_table_name(metric_name)
+    if (layout or STORAGE_LAYOUT) != "narrow":
+        return table_name, []
+    source = f"""(
+        SELECT s.cluster, s.metric_name, s.labels, p.value, p.ts AS timestamp
+        FROM {SAMPLES_TABLE} p
+        JOIN {SERIES_TABLE} s ON s.series_id = p.series_id
+        WHERE s.metric_name = %s
+    ) AS {table_name}"""
+    return source, [metric_name]
+
+
+def _create_snapshot_table(cur, table_name):
+    cur.execute(
+        f"""
+        CREATE TABLE IF NOT EXISTS {table_name} (
+            metric_name VARCHAR NOT NULL,
+            labels JSONB,
+            value DOUBLE PRECISION,
+            timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            cluster VARCHAR NOT NULL DEFAULT '{DEFAULT_CLUSTER}'
+        );
+        """
+    )
+
+
+def reset_snapshot_table(cur, table_name, cluster=DEFAULT_CLUSTER):
+    """Empties the cluster's rows of a "replace" snapshot table.
+
+    The table holds the latest scrape of every cluster, so a scrape only
+    replaces the rows of the cluster it came from.
+    """
+    if not _snapshot_tables.get(cur, table_name):
+        lock_schema(cur)
+        cur.execute(
+            "SELECT relkind FROM pg_class WHERE relname = %s AND relkind IN ('r', 'p')",
+            (table_name,),
+        )
+        row = cur.fetchone()
+        if row is not None and row[0] == "p":
+            # Left behind by "append" mode; the snapshot starts over
+            cur.execute(f"DROP TABLE {table_name}")
+        elif row is not None:
+            # Snapshot tables created before samples were tagged with a cluster
+            cur.execute(
+                f"ALTER TABLE {table_name} ADD COLUMN IF NOT EXISTS cluster VARCHAR NOT NULL "
+                f"DEFAULT '{DEFAULT_CLUSTER}'"
+            )
+        _create_snapshot_table(cur, table_name)
+        _snapshot_tables.set(cur, table_name)
+    cur.execute(f"DELETE FROM {table_name} WHERE cluster = %s", (cluster,))
+
+
+def ensure_registry(cur):
+    cur.execute(
+        f"""
+        CREATE TABLE IF NOT EXISTS {REGISTRY_TABLE} (
+            table_name VARCHAR PRIMARY KEY,
+            metric_name VARCHAR NOT NULL,
+            schema_version INTEGER NOT NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        );
+        CREATE TABLE IF NOT EXISTS {PARTITIONS_TABLE} (
+            partition_name VARCHAR PRIMARY KEY,
+            table_name VARCHAR NOT NULL,
+            range_start TIMESTAMP NOT NULL,
+            range_end TIMESTAMP NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS {STALE_TABLE} (
+            metric_name VARCHAR NOT NULL,
+            labels JSONB,
+            stale_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+            cluster VARCHAR NOT NULL DEFAULT '{DEFAULT_CLUSTER}'
+        );
+        ALTER TABLE {STALE_TABLE} ADD COLUMN IF NOT EXISTS cluster VARCHAR NOT NULL
+            DEFAULT '{DEFAULT_CLUSTER}';
+        CREATE TABLE IF NOT EXISTS {CLUSTERS_TABLE} (
+            cluster VARCHAR PRIMARY KEY,
+            first_scrape_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+            last_scrape_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+        );
+        """
+    )
+
+
+def register_cluster(cur, cluster, now):
+    _read_registry(cur)  # creates the clusters table
+    cur.execute(
+        f"""
+        INSERT INTO {CLUSTERS_TABLE} (cluster, first_scrape_at, last_scrape_at)
+        VALUES (%s, %s, %s)
+        ON CONFLICT (cluster) DO UPDATE SET last_scrape_at = EXCLUDED.last_scrape_at
+        """,
+        (cluster, now, now),
+    )
+
+
+def list_clusters_query():
+    return f"SELECT cluster FROM {CLUSTERS_TABLE} ORDER BY cluster", []
+
+
+def _read_registry(cur):
+    if _registry_loaded.get(cur, REGISTRY_TABLE):
+        return
+    lock_schema(cur)
+    ensure_registry(cur)
+    cur.execute(f"SELECT table_name, schema_version FROM {REGISTRY_TABLE}")
+    for table_name, version in cur.fetchall():
+        _registry.set(cur, table_name, version)
+    cur.execute(f"SELECT partition_name FROM {PARTITIONS_TABLE}")
+    for (name,) in cur.fetchall():
+        _known_partitions.set(cur, name)
+    _registry_loaded.set(cur, REGISTRY_TABLE)
+
+
+def load_registry(cur):
+    """{table_name: schema version} of the registered tables, as cur's transaction sees them."""
+    _read_registry(cur)
+    return _registry.snapshot(cur)
+
+
+def _is_plain_table(cur, table_name):
+    cur.execute(
+        "SELECT relkind FROM pg_class WHERE relname = %s AND relkind IN ('r', 'p')",
+        (table_name,),
+    )
+    row = cur.fetchone()
+    return row is not None and row[0] == "r"
+
+
+def _replace_snapshot_table(cur, table_name):
+    """Drops a table "replace" mode left in place of a partitioned one.
+
+    Snapshot tables only ever hold the last scrape, so nothing is lost.
+    Returns True when the table has to be created again.
+    """
+    if _verified_tables.get(cur, table_name):
+        return False
+    _verified_tables.set(cur, table_name)
+    lock_schema(cur)
+    if not _is_plain_table(cur, table_name):
+        return False
+
+    print(f"Replacing snapshot table {table_name} with a partitioned table")
+    cur.execute(f"DROP TABLE {table_name}")
+    cur.execute(
+        f"DELETE FROM {PARTITIONS_TABLE} WHERE table_name = %s RETURNING partition_name",
+        (table_name,),
+    )
+    for (name,) in cur.fetchall():
+        _known_partitions.discard(cur, name)
+    return True
+
+
+def _migrate_table(cur, table_name, from_version, migrations=SCHEMA_MIGRATIONS):
+    print(f"Migrating {table_name} from schema version {from_version} to {SCHEMA_VERSION}")
+    for version in range(from_version + 1, SCHEMA_VERSION + 1):
+        for statement in migrations.get(version, []):
+            cur.execute(statement.format(table=table_name))
+    cur.execute(
+        f"UPDATE {REGISTRY_TABLE} SET schema_version = %s, updated_at = CURRENT_TIMESTAMP "
+        "WHERE table_name = %s",
+        (SCHEMA_VERSION, table_name),
+    )
+
+
+def ensure_metric_table(cur, table_name, metric_name):
+    """Creates a day-partitioned metric table once and records it in the registry."""
+    _read_registry(cur)
+    version = _registry.get(cur, table_name)
+    if _replace_snapshot_table(cur, table_name):
+        version = None
+    if version == SCHEMA_VERSION:
+        return
+    lock_schema(cur)
+    if version is not None:
+        _migrate_table(cur, table_name, version)
+        _registry.set(cur, table_name, SCHEMA_VERSION)
+        return
+
+    cur.execute(
+        f"""
+        CREATE TABLE IF NOT EXISTS {table_name} (
+            metric_name VARCHAR NOT NULL,
+            labels JSONB,
+            value DOUBLE PRECISION,
+            timestamp TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+            cluster VARCHAR NOT NULL DEFAULT '{DEFAULT_CLUSTER}'
+        ) PARTITION BY RANGE (timestamp);
+        """
+    )
+    cur.execute(
+        f"""
+        INSERT INTO {REGISTRY_TABLE} (table_name, metric_name, schema_version)
+        VALUES (%s, %s, %s)
+        ON CONFLICT (table_name) DO UPDATE SET
+            schema_version = EXCLUDED.schema_version,
+            updated_at = CURRENT_TIMESTAMP
+        """,
+        (table_name, metric_name, SCHEMA_VERSION),
+    )
+    _registry.set(cur, table_name, SCHEMA_VERSION)
+
+
+def partition_name(table_name, day):
+    name = f"{table_name}_p{day:%Y%m%d}"
+    if len(name) <= MAX_IDENTIFIER_LENGTH:
+        return name
+    # Keep long names unique once PostgreSQL would truncate them
+    digest = hashlib.md5(table_name.encode()).hexdigest()[:8]
+    keep = MAX_IDENTIFIER_LENGTH - len(digest) - len(f"__p{day:%Y%m%d}")
+    return f"{table_name[:keep]}_{digest}_p{day:%Y%m%d}"
+
+
+def ensure_partition(cur, table_name, day):
+    day = datetime(day.year, day.month, day.day)
+    name = partition_name(table_name, day)
+    if _known_partitions.get(cur, name):
+        return name
+
+    range_end = day + timedelta(days=1)
+    lock_schema(cur)
+    cur.execute(
+        f"""
+        CREATE TABLE IF NOT EXISTS {name} PARTITION OF {table_name}
+        FOR VALUES FROM (%s) TO (%s)
+        """,
+        (day, range_end),
+    )
+    cur.execute(
+        f"""
+        INSERT INTO {PARTITIONS_TABLE} (partition_name, table_name, range_start, range_end)
+        VALUES (%s, %s, %s, %s)
+        ON CONFLICT (partition_name) DO NOTHING
+        """,
+        (name, table_name, day, range_end),
+    )
+    _known_partitions.set(cur, name)
+    return name
+
+
+def _create_samples_table(cur, partitioned):
+    partition_clause = "PARTITION BY RANGE (ts)" if partitioned else ""
+    cur.execute(
+        f"""
+        CREATE TABLE IF NOT EXISTS {SAMPLES_TABLE} (
+            series_id INTEGER NOT NULL,
+            ts TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+            value DOUBLE PRECISION
+        ) {partition_clause};
+        """
+    )
+
+
+def ensure_narrow_tables(cur, storage_mode, now, cluster=DEFAULT_CLUSTER):
+    """Creates the series and samples tables used by the narrow layout."""
+    _read_registry(cur)
+    version = _registry.get(cur, SAMPLES_TABLE)
+    if version != SCHEMA_VERSION:
+        lock_schema(cur)
+    if version is not None and version != SCHEMA_VERSION:
+        _migrate_table(cur, SAMPLES_TABLE, version, NARROW_SCHEMA_MIGRATIONS)
+        _registry.set(cur, SAMPLES_TABLE, SCHEMA_VERSION)
+    if version is None:
+        cur.execute(
+            f"""
+            CREATE TABLE IF NOT EXISTS {SERIES_TABLE} (
+                series_id SERIAL PRIMARY KEY,
+                cluster VARCHAR NOT NULL DEFAULT '{DEFAULT_CLUSTER}',
+                metric_name VARCHAR NOT NULL,
+                labels JSONB NOT NULL,
+                UNIQUE (cluster, metric_name, labels)
+            );
+            """
+        )
+        _create_samples_table(cur, partitioned=storage_mode == "append")
+        cur.execute(
+            f"""
+            INSERT INTO {REGISTRY_TABLE} (table_name, metric_name, schema_version)
+            VALUES (%s, %s, %s)
+            ON CONFLICT (table_name) DO NOTHING
+            """,
+            (SAMPLES_TABLE, "*", SCHEMA_VERSION),
+        )
+        _registry.set(cur, SAMPLES_TABLE, SCHEMA_VERSION)
+
+    if storage_mode == "append":
+        if _replace_snapshot_table(cur, SAMPLES_TABLE):
+            _create_samples_table(cur, partitioned=True)
+        ensure_partition(cur, SAMPLES_TABLE, now)
+        ensure_partition(cur, SAMPLES_TABLE, now + timedelta(days=1))
+    else:
+        # Series ids stay stable, only the samples of each cluster's last
+        # scrape are kept
+        cur.execute(
+            f"""
+            DELETE FROM {SAMPLES_TABLE}
+            WHERE series_id IN (SELECT series_id FROM {SERIES_TABLE} WHERE cluster = %s)
+            """,
+            (cluster,),
+        )
+
+
+def scrape_timestamp(cur):
+    # Same clock as the column default, constant for the whole transaction
+    cur.execute("SELECT LOCALTIMESTAMP")
+    return cur.fetchone()[0]
+
+
+def prepare_metric_table(
+    cur, table_name, metric_name, storage_mode, now, cluster=DEFAULT_CLUSTER
+):
+    if storage_mode == "append":
+        ensure_metric_table(cur, table_name, metric_name)
+        ensure_partition(cur, table_name, now)
+        # Pre-create tomorrow so scrapes spanning midnight still land somewhere
+        ensure_partition(cur, table_name, now + timedelta(days=1))
+    else:
+        reset_snapshot_table(cur, table_name, cluster)
+
+
+def drop_expired_partitions(conn, retention_days=RETENTION_DAYS):
+    """Drops whole partitions that ended more than retention_days ago."""
+    cur = conn.cursor()
+    try:
+        lock_schema(cur)
+        ensure_registry(cur)
+        cur.execute(
+            f"""
+            SELECT partition_name FROM {PARTITIONS_TABLE}
+            WHERE range_end <= LOCALTIMESTAMP - make_interval(days => %s)
+            ORDER BY range_end
+            """,
+            (retention_days,),
+        )
+        expired = [row[0] for row in cur.fetchall()]
+        for name in expired:
+            cur.execute(f"DROP TABLE IF EXISTS {name}")
+            cur.execute(
+                f"DELETE FROM {PARTITIONS_TABLE} WHERE partition_name = %s", (name,)
+            )
+            _known_partitions.discard(cur, name)
+        cur.execute(
+            f"DELETE FROM {STALE_TABLE} WHERE stale_at < LOCALTIMESTAMP - make_interval(days => %s)",
+            (retention_days,),
+        )
+        conn.commit()
+        commit_caches(conn)
+    except Exception as err:
+        print(f"Retention error: {err}")
+        conn.rollback()
+        rollback_caches(conn)
+        return []
+    finally:
+        cur.close()
+
+    if expired:
+        print(f"Dropped {len(expired)} partitions older than {retention_days} days")
+    return expired
+
+
+def run_retention_if_due(conn, retention_days=RETENTION_DAYS):
+    global _last_retention_run
+    # Concurrent scrapes of several clusters would otherwise all see it due
+    with _retention_lock:
+        now = time.monotonic()
+        if _last_retention_run and now - _last_retention_run < RETENTION_INTERVAL_SECONDS:
+            return []
+        _last_retention_run = now
+    return drop_expired_partitions(conn, retention_days)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Drop expired metric partitions")
+    parser.add_argument("--retention-days", type=int, default=RETENTION_DAYS)
+    args = parser.parse_args()
+
+    conn = get_db_conn()
+    if not conn:
+        print("Database connection failed. Exiting...")
+    else:
+        drop_expired_partitions(conn, args.retention_days)
+        conn.close()
@@ -0,0 +1,112 @@
+"""Streams an agent run as text chunks, e.g. into st.write_stream.
+
+The agent runs in a worker thread with a callback handler that turns LLM
+tokens and tool start/end events into chunks, so the first chunk arrives
+with the first token instead of after the whole generation.
+"""
+
+import queue
+import threading
+
+from langchain_core.callbacks import BaseCallbackHandler
+
+# Text that precedes the final answer in the ReAct agents' output
+ANSWER_MARKERS = ("AI:", "Final Answer:")
+_DONE = object()
+
+
+def _answer_start(text):
+    """Index where the final answer starts in text, or None."""
+    found = [text.find(marker) + len(marker) for marker in ANSWER_MARKERS if marker in text]
+    return min(found) if found else None
+
+
+class StreamingCallbackHandler(BaseCallbackHandler):
+    """Queues the final answer's tokens and the tool events of an agent run.
+
+    LLMs that stream (Ollama) report every token; for those that do not
+    (WatsonxLLM) the answer is queued in one piece when the call ends.
+    """
+
+    def __init__(self, show_tools=True):
+        self.events = queue.Queue()
+        self.show_tools = show_tools
+        self.answer_streamed = False
+        self._buffer = ""
+        self._got_tokens = False
+        self._in_answer = False
+
+    def on_llm_start(self, serialized, prompts, **kwargs):
+        self._buffer = ""
+        self._got_tokens = False
+        self._in_answer = False
+
+    def _feed(self, text):
+        if self._in_answer:
+            self.events.put(text)
+            return
+        self._buffer += text
+        start = _answer_start(self._buffer)
+        if start is not None:
+            self._in_answer = True
+            self.answer_streamed = True
+            answer = self._buffer[start:].lstrip()
+            if answer:
+                self.events.put(answer)
+
+    def on_llm_new_token(self, token, **kwargs):
+        self._got_tokens = True
+        self._feed(token)
+
+    def on_llm_end(self, response, **kwargs):
+        if self._got_tokens:
+            return
+        for generations in response.generations:
+            for generation in generations:
+                self._feed(generation.text)
+
+    def on_tool_start(self, serialized, input_str, **kwargs):
+        if self.show_tools:
+            name = (serialized or {}).get("name", "tool")
+            self.events.put(f"\n\n🔧 _Running {name}({input_str})..._\n\n")
+
+    def on_tool_end(self, output, **kwargs):
+        if self.show_tools:
+            self.events.put("✅ _Done_\n\n")
+
+    def on_tool_error(self, error, **kwargs):
+        self.events.put(f"\n\n❌ Tool error: {error}\n\n")
+
+
+def stream_agent(run, query, show_tools=True):
+    """Yields text chunks of run(query, callbacks=[handler]) as they are produced.
+
+    run is e.g. agent.run. The generator's return value is the agent's
+    output, for callers that keep it (yield from stream_agent(...)).
+    """
+    handler = StreamingCallbackHandler(show_tools)
+    result = {}
+
+    def worker():
+        try:
+            result["output"] = run(query, callbacks=[handler])
+        except Exception as err:
+            result["error"] = err
+        finally:
+            handler.events.put(_DONE)
+
+    threading.Thread(target=worker, name="agent-stream", daemon=True).start()
+    while True:
+        chunk = handler.events.get()
+        if chunk is _DONE:
+            break
+        yield chunk
+
+    if "error" in result:
+        yield f"\n\n❌ Error: {result['error']}"
+        return None
+    output = result.get("output")
+    # return_direct tools and unprefixed answers never went through the markers
+    if not handler.answer_streamed and output:
+        yield str(output)
+    return output
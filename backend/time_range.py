@@ -0,0 +1,181 @@
+"""Time windows for the tool queries, e.g. "last 15m" or "2025-02-14 to 2025-02-15"."""
+
+import os
+import re
+from collections import namedtuple
+from datetime import datetime, timedelta
+
+# Window used when a tool is called without one; "all" scans all history
+DEFAULT_TIME_RANGE = os.getenv("TOOL_DEFAULT_TIME_RANGE", "last 24h")
+
+# Appended to the agent Tool descriptions so the LLM knows what to pass
+TIME_RANGE_HELP = (
+    "Optional input: a time range such as 'last 15m', 'last 6h', 'last 7d', "
+    "'2025-02-14 16:40 to 2025-02-17 16:40' or 'all'. "
+    f"Defaults to '{DEFAULT_TIME_RANGE}'."
+)
+
+_UNITS = {
+    "s": "seconds",
+    "sec": "seconds",
+    "second": "seconds",
+    "m": "minutes",
+    "min": "minutes",
+    "minute": "minutes",
+    "h": "hours",
+    "hr": "hours",
+    "hour": "hours",
+    "d": "days",
+    "day": "days",
+    "w": "weeks",
+    "week": "weeks",
+}
+_UNIT_PATTERN = r"(?:s|secs?|seconds?|m|mins?|minutes?|h|hrs?|hours?|d|days?|w|weeks?)"
+_RELATIVE_RE = re.compile(
+    rf"(?:last|past)?\s*(\d+(?:\.\d+)?)?\s*({_UNIT_PATTERN})",
+    re.IGNORECASE,
+)
+_DATE_PATTERN = r"\d{4}-\d{2}-\d{2}(?:[ T]\d{1,2}:\d{2}(?::\d{2})?)?"
+# Time ranges inside a free-text question, e.g. "crashes in the last 2 hours?"
+_RELATIVE_SEARCH = re.compile(
+    rf"\b(?:last|past|previous)\s+((?:\d+(?:\.\d+)?\s*)?{_UNIT_PATTERN})\b", re.IGNORECASE
+)
+_ABSOLUTE_SEARCH = re.compile(
+    rf"({_DATE_PATTERN})\s+(?:to|until|and)\s+({_DATE_PATTERN})", re.IGNORECASE
+)
+_SINCE_SEARCH = re.compile(rf"\bsince\s+({_DATE_PATTERN})", re.IGNORECASE)
+_ALL_SEARCH = re.compile(r"\b(?:all time|ever)\b", re.IGNORECASE)
+_ABSOLUTE_SEPARATORS = re.compile(r"\s+(?:to|until|and)\s+|\s*\.\.\s*|\s*,\s*", re.IGNORECASE)
+_ALL = {"all", "all time", "everything"}
+
+
+class TimeRange(namedtuple("TimeRange", ["start", "end", "last"])):
+    """Either a window ending now (last) or absolute start/end bounds (or none)."""
+
+    __slots__ = ()
+
+    @property
+    def unbounded(self):
+        return self.last is None and self.start is None and self.end is None
+
+    def seconds(self):
+        """Length of the window, None when it reaches back to the first sample."""
+        if self.last is not None:
+            return self.last.total_seconds()
+        if self.start is None:
+            return None
+        return ((self.end or datetime.now()) - self.start).total_seconds()
+
+    def where(self, column="timestamp", lookback=0):
+        """SQL condition and parameters restricting column to the window.
+
+        Relative windows are evaluated by the database against the same clock
+        the scraper stamps samples with, and still allow partition pruning.
+        lookback moves the lower bound back by that many seconds.
+        """
+        if self.last is not None:
+            seconds = self.seconds() + lookback
+            return f"{column} >= LOCALTIMESTAMP - %s::interval", [f"{seconds} seconds"]
+        conditions, params = [], []
+        if self.start is not None:
+            conditions.append(f"{column} >= %s")
+            params.append(self.start - timedelta(seconds=lookback))
+        if self.end is not None:
+            conditions.append(f"{column} <= %s")
+            params.append(self.end)
+        return " AND ".join(conditions) or "TRUE", params
+
+    def __str__(self):
+        if self.last is not None:
+            return f"last {_format_duration(self.last)}"
+        if self.unbounded:
+            return "all time"
+        start = self.start.isoformat(" ") if self.start else "the first sample"
+        end = self.end.isoformat(" ") if self.end else "now"
+        return f"{start} to {end}"
+
+
+def _format_duration(delta):
+    seconds = int(delta.total_seconds())
+    for unit, size in (("d", 86400), ("h", 3600), ("m", 60)):
+        if seconds and seconds % size == 0:
+            return f"{seconds // size}{unit}"
+    return f"{seconds}s"
+
+
+def _parse_timestamp(text):
+    try:
+        return datetime.fromisoformat(text.strip().replace("T", " ").rstrip("Z"))
+    except ValueError:
+        raise ValueError(f"Invalid timestamp '{text.strip()}', use YYYY-MM-DD [HH:MM[:SS]]")
+
+
+def parse_time_range(text=None, default=DEFAULT_TIME_RANGE):
+    """Parses a relative ("last 15m", "2 hours") or absolute ("A to B", "since A") window."""
+    if isinstance(text, TimeRange):
+        return text
+    if text is None:
+        text = default
+    # Agents like to wrap their input in quotes or prefix it with the argument name
+    text = text.strip().strip("'\"`").strip()
+    text = re.sub(r"^(?:time[_ ]?range|window)\s*[:=]\s*", "", text, flags=re.IGNORECASE)
+    lowered = text.lower()
+    if lowered in ("", "none", "null"):
+        return parse_time_range(default, default)
+    if lowered in _ALL:
+        return TimeRange(None, None, None)
+
+    relative = _RELATIVE_RE.fullmatch(lowered)
+    if relative:
+        amount = float(relative.group(1) or 1)
+        unit = relative.group(2).rstrip("s") or "s"
+        delta = timedelta(**{_UNITS.get(unit, _UNITS.get(relative.group(2))): amount})
+        if delta.total_seconds() <= 0:
+            raise ValueError(f"Empty time range '{text}'")
+        return TimeRange(None, None, delta)
+
+    if lowered.startswith("since "):
+        return TimeRange(_parse_timestamp(text[len("since ") :]), None, None)
+
+    bounds = _ABSOLUTE_SEPARATORS.split(re.sub(r"^(?:from|between)\s+", "", text, flags=re.I))
+    if len(bounds) == 2:
+        start, end = _parse_timestamp(bounds[0]), _parse_timestamp(bounds[1])
+        if end <= start:
+            raise ValueError(f"Time range '{text}' ends before it starts")
+        return TimeRange(start, end, None)
+    if len(bounds) == 1:
+        start = _parse_timestamp(bounds[0])
+        if len(bounds[0].strip()) == len("YYYY-MM-DD"):
+            # A bare date means that whole day
+            return TimeRange(start, start + timedelta(days=1), None)
+        return TimeRange(start, None, None)
+
+    raise ValueError(
+        f"Invalid time range '{text}', use e.g. 'last 15m' or '2025-02-14 16:40 to 2025-02-17 16:40'"
+    )
+
+
+def find_time_range(text):
+    """The time range mentioned in a question, as text for parse_time_range, or None."""
+    match = _ABSOLUTE_SEARCH.search(text)
+    if match:
+        return f"{match.group(1)} to {match.group(2)}"
+    match = _SINCE_SEARCH.search(text)
+    if match:
+        return f"since {match.group(1)}"
+    match = _RELATIVE_SEARCH.search(text)
+    if match:
+        return f"last {match.group(1)}"
+    if _ALL_SEARCH.search(text):
+        return "all"
+    return None
+
+
+def tool_time_range(text=None):
+    """parse_time_range for tool inputs: agents sometimes pass the question
+    itself, which falls back to the default window instead of failing."""
+    try:
+        return parse_time_range(text)
+    except ValueError as err:
+        print(f"{err}; using {DEFAULT_TIME_RANGE}")
+        return parse_time_range(None)
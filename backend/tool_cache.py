@@ -0,0 +1,203 @@
+import inspect
+import os
+import select
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+
+import psycopg2
+import psycopg2.extensions
+
+from .connection import get_db_string
+
+TOOL_CACHE_SIZE = int(os.getenv("TOOL_CACHE_SIZE", "256"))
+# Channel the scraper notifies on when a scrape commits
+SCRAPE_CHANNEL = "ceph_metrics_scrape"
+LISTEN_RETRY_SECONDS = 5
+
+
+class ToolCache:
+    """LRU cache of tool results that is emptied whenever a new scrape commits.
+
+    Results are tagged with the scrape generation they were computed from, so
+    a result that raced a scrape is never stored.
+    """
+
+    def __init__(self, maxsize=TOOL_CACHE_SIZE):
+        self.maxsize = maxsize
+        self.generation = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def get(self, key):
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return True, self._entries[key]
+            self.misses += 1
+            return False, None
+
+    def put(self, key, value, generation):
+        with self._lock:
+            if generation != self.generation:
+                return
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def invalidate(self):
+        with self._lock:
+            self.generation += 1
+            self._entries.clear()
+            self.invalidations += 1
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "maxsize": self.maxsize,
+                "generation": self.generation,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": self.hits / lookups if lookups else 0.0,
+                "invalidations": self.invalidations,
+            }
+
+
+tool_cache = ToolCache()
+
+
+class ScrapeListener(threading.Thread):
+    """LISTENs for scrapes committed by other processes, e.g. the scrape daemon."""
+
+    def __init__(self, cache):
+        super().__init__(name="scrape-listener", daemon=True)
+        self.cache = cache
+        self.connected = threading.Event()
+
+    def run(self):
+        while True:
+            try:
+                conn = psycopg2.connect(get_db_string())
+                conn.set_isolation_level(psycopg2.extensions.ISOLATION_LEVEL_AUTOCOMMIT)
+                with conn.cursor() as cur:
+                    cur.execute(f"LISTEN {SCRAPE_CHANNEL}")
+                # Anything cached before we listened may already be stale
+                self.cache.invalidate()
+                self.connected.set()
+                while True:
+                    if select.select([conn], [], [], LISTEN_RETRY_SECONDS) == ([], [], []):
+                        continue
+                    conn.poll()
+                    if conn.notifies:
+                        conn.notifies.clear()
+                        self.cache.invalidate()
+            except (psycopg2.Error, OSError) as err:
+                print(f"Scrape listener error: {err}")
+            self.connected.clear()
+            time.sleep(LISTEN_RETRY_SECONDS)
+
+
+_listener = None
+_listener_lock = threading.Lock()
+
+
+def ensure_listener():
+    global _listener
+    if _listener is None:
+        with _listener_lock:
+            if _listener is None:
+                _listener = ScrapeListener(tool_cache)
+                _listener.start()
+    return _listener
+
+
+def notify_scrape(cur):
+    """Queues the scrape notification; PostgreSQL only delivers it on commit."""
+    cur.execute("SELECT pg_notify(%s, '')", (SCRAPE_CHANNEL,))
+
+
+def scrape_committed():
+    tool_cache.invalidate()
+
+
+def _is_error(result):
+    if result is None:
+        return True
+    if isinstance(result, str):
+        return result.startswith("❌")
+    if isinstance(result, dict):
+        return result.get("status") == "error"
+    return False
+
+
+def _is_partial(result):
+    """Fan-out results missing clusters that timed out; a retry may get them."""
+    if getattr(result, "partial", False):
+        return True
+    return isinstance(result, dict) and "partial" in result
+
+
+def _cache_key(func, args, kwargs):
+    """The lookup key, or None for unhashable arguments."""
+    key = (func.__name__, args, tuple(sorted(kwargs.items())))
+    try:
+        hash(key)
+    except TypeError:
+        return None
+    return key
+
+
+def cached_tool(func):
+    """Caches func's results by arguments until the next scrape commits.
+
+    Works for both plain and async tool functions.
+    """
+
+    if inspect.iscoroutinefunction(func):
+
+        @wraps(func)
+        async def async_wrapper(*args, **kwargs):
+            if not ensure_listener().connected.is_set():
+                return await func(*args, **kwargs)
+            key = _cache_key(func, args, kwargs)
+            if key is None:
+                return await func(*args, **kwargs)
+
+            found, result = tool_cache.get(key)
+            if found:
+                return result
+            generation = tool_cache.generation
+            result = await func(*args, **kwargs)
+            if not _is_error(result) and not _is_partial(result):
+                tool_cache.put(key, result, generation)
+            return result
+
+        return async_wrapper
+
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        # Without the listener, scrapes by other processes would go unnoticed
+        if not ensure_listener().connected.is_set():
+            return func(*args, **kwargs)
+        key = _cache_key(func, args, kwargs)
+        if key is None:
+            return func(*args, **kwargs)
+
+        found, result = tool_cache.get(key)
+        if found:
+            return result
+        generation = tool_cache.generation
+        result = func(*args, **kwargs)
+        if not _is_error(result) and not _is_partial(result):
+            tool_cache.put(key, result, generation)
+        return result
+
+    return wrapper
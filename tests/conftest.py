@@ -0,0 +1,24 @@
+import threading
+
+import pytest
+
+from backend import response_cache, tool_cache
+
+
+class ConnectedListener:
+    def __init__(self):
+        self.connected = threading.Event()
+        self.connected.set()
+
+
+@pytest.fixture
+def fresh_tool_cache(monkeypatch):
+    """An empty ToolCache in place of the shared one, with the scrape listener
+    reported as connected so results are cached without a database."""
+    cache = tool_cache.ToolCache(maxsize=4)
+    listener = ConnectedListener()
+    monkeypatch.setattr(tool_cache, "tool_cache", cache)
+    monkeypatch.setattr(tool_cache, "ensure_listener", lambda: listener)
+    monkeypatch.setattr(response_cache, "tool_cache", cache)
+    monkeypatch.setattr(response_cache, "ensure_listener", lambda: listener)
+    return cache
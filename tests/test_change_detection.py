@@ -0,0 +1,51 @@
+from backend.change_detection import ChangeDetector
+from backend.exposition import Sample
+
+
+def sample(name, value, labels="{}"):
+    return Sample(name, labels, value, None)
+
+
+def scrape(detector, *samples):
+    detector.begin()
+    return detector.filter(list(samples))
+
+
+def test_only_changed_samples_are_written():
+    detector = ChangeDetector(heartbeat=900)
+    assert len(scrape(detector, sample("a", 1), sample("b", 2))) == 2
+    detector.commit()
+    assert scrape(detector, sample("a", 1), sample("b", 3)) == [sample("b", 3)]
+    assert (detector.written, detector.skipped) == (1, 1)
+
+
+def test_unchanged_nan_is_skipped():
+    detector = ChangeDetector()
+    scrape(detector, sample("a", float("nan")))
+    detector.commit()
+    assert scrape(detector, sample("a", float("nan"))) == []
+
+
+def test_heartbeat_rewrites_unchanged_samples():
+    detector = ChangeDetector(heartbeat=0)
+    scrape(detector, sample("a", 1))
+    detector.commit()
+    assert scrape(detector, sample("a", 1)) == [sample("a", 1)]
+
+
+def test_rolled_back_scrape_is_written_in_full_next_time():
+    detector = ChangeDetector()
+    scrape(detector, sample("a", 1))
+    detector.rollback()
+    assert scrape(detector, sample("a", 1)) == [sample("a", 1)]
+
+
+def test_missing_series_are_stale_and_written_again_when_back():
+    detector = ChangeDetector()
+    scrape(detector, sample("a", 1), sample("b", 1))
+    detector.commit()
+    scrape(detector, sample("a", 1))
+    stale = detector.stale_series()
+    assert stale == [("b", "{}")]
+    detector.commit(stale)
+    assert scrape(detector, sample("a", 1), sample("b", 1)) == [sample("b", 1)]
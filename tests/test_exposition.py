@@ -0,0 +1,100 @@
+import math
+
+import pytest
+
+from backend.exposition import ExpositionParser, label_dict, parse_exposition
+
+
+def parse(*lines, openmetrics=False):
+    parser = ExpositionParser(openmetrics)
+    return list(parser.parse(lines)), parser
+
+
+def labels(sample):
+    return label_dict(sample.labels)
+
+
+def test_plain_sample():
+    (sample,), _ = parse("ceph_health_status 1")
+    assert (sample.name, sample.labels, sample.value, sample.timestamp) == (
+        "ceph_health_status",
+        "{}",
+        1.0,
+        None,
+    )
+
+
+def test_escaped_quote_in_label_value():
+    (sample,), parser = parse('m{path="C:\\"x"} 1')
+    assert labels(sample) == {"path": 'C:"x'}
+    assert parser.errors == 0
+
+
+def test_escaped_backslash_and_newline():
+    (sample,), _ = parse('m{a="x\\\\",b="line\\nbreak"} 1')
+    assert labels(sample) == {"a": "x\\", "b": "line\nbreak"}
+
+
+def test_comma_and_brace_inside_label_value():
+    (sample,), _ = parse('m{a="1,2",b="}"} 3')
+    assert labels(sample) == {"a": "1,2", "b": "}"}
+
+
+def test_empty_label_value_and_trailing_comma():
+    (sample,), _ = parse('m{a="",b="x",} 1')
+    assert labels(sample) == {"a": "", "b": "x"}
+
+
+def test_label_order_is_canonical():
+    first, _ = parse('m{b="2",a="1"} 1')
+    second, _ = parse('m{a="1",b="2"} 1')
+    assert first[0].labels == second[0].labels
+
+
+@pytest.mark.parametrize(
+    "line",
+    ['m{a="x} 1', 'm{a=x} 1', 'm{a="1" b="2"} 1', "m{a=\"1\"} not-a-number", "9m 1"],
+)
+def test_malformed_lines_are_counted_and_skipped(line):
+    samples, parser = parse(line, "ok 1")
+    assert [sample.name for sample in samples] == ["ok"]
+    assert parser.errors == 1
+
+
+def test_special_values():
+    samples, _ = parse("a NaN", "b +Inf", "c -Inf")
+    assert math.isnan(samples[0].value)
+    assert samples[1].value == math.inf
+    assert samples[2].value == -math.inf
+
+
+def test_timestamp_units():
+    (text_format,), _ = parse("m 1 1700000000000")
+    (openmetrics,), _ = parse("m 1 1700000000", openmetrics=True)
+    assert text_format.timestamp == openmetrics.timestamp == 1700000000.0
+
+
+def test_openmetrics_exemplar_and_eof():
+    samples, _ = parse(
+        'm_total{a="1"} 3 # {trace_id="abc"} 1.0',
+        "# EOF",
+        "after_eof 1",
+        openmetrics=True,
+    )
+    assert [(s.name, s.value) for s in samples] == [("m_total", 3.0)]
+
+
+def test_metadata():
+    _, parser = parse(
+        "# HELP ceph_osd_up OSD status\\nup",
+        "# TYPE ceph_osd_up gauge",
+        "# UNIT ceph_osd_apply_latency_ms milliseconds",
+    )
+    assert parser.help == {"ceph_osd_up": "OSD status\nup"}
+    assert parser.types == {"ceph_osd_up": "gauge"}
+    assert parser.units == {"ceph_osd_apply_latency_ms": "milliseconds"}
+
+
+def test_bytes_and_blank_lines():
+    samples = list(parse_exposition([b"m 1", b"", "  ", "n 2\n"]))
+    assert [s.name for s in samples] == ["m", "n"]
@@ -0,0 +1,44 @@
+import time
+
+from backend.fanout import TopK, fan_out, fan_out_top_k
+
+
+def test_top_k_keeps_the_largest_rows_across_targets():
+    top = TopK(3, key=lambda row: row[1])
+    top.push("a", [("osd.1", 5), ("osd.2", 50)])
+    top.push("b", [("osd.1", 40), ("osd.3", 1)])
+    top.push("c", [("osd.9", 45)])
+    assert top.result() == [("a", ("osd.2", 50)), ("c", ("osd.9", 45)), ("b", ("osd.1", 40))]
+
+
+def test_top_k_keeps_the_first_of_equal_rows():
+    top = TopK(1, key=lambda row: row)
+    top.push("a", [7])
+    top.push("b", [7])
+    assert top.result() == [("a", 7)]
+
+
+def call(target):
+    if target == "slow":
+        time.sleep(1)
+    if target == "broken":
+        raise RuntimeError("connection refused")
+    return [(f"{target}-osd", len(target))]
+
+
+def test_fan_out_top_k_reports_missing_targets():
+    ranked, status = fan_out_top_k(
+        call, ["ab", "abcd", "slow", "broken"], k=1, key=lambda row: row[1], timeout=0.3
+    )
+    assert ranked == [("abcd", ("abcd-osd", 4))]
+    assert sorted(status.answered) == ["ab", "abcd"]
+    assert status.timed_out == ["slow"]
+    assert list(status.failed) == ["broken"]
+    assert status.partial
+    assert status.describe().startswith("⚠️ Partial result from 2 of 4 clusters")
+
+
+def test_fan_out_keeps_target_order_and_drops_duplicates():
+    result = fan_out(call, ["b", "aaa", "b"])
+    assert list(result) == ["b", "aaa"]
+    assert not result.partial
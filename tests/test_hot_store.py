@@ -0,0 +1,121 @@
+
+import pytest
+
+from backend import hot_store as hot_store_module
+from backend.exposition import Sample
+from backend.hot_store import HotStore, ScrapeRing
+from backend.metrics_operations import high_latency_osds_hot, high_latency_osds_response
+from backend.time_range import parse_time_range
+
+
+class Clock:
+    def __init__(self, now):
+        self.now = now
+
+    def time(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock(1000.0)
+    monkeypatch.setattr(hot_store_module, "time", clock)
+    return clock
+
+
+def test_ring_overwrites_the_oldest_scrape():
+    ring = ScrapeRing(3)
+    for timestamp in (10, 20, 30, 40):
+        ring.add_scrape(timestamp, {("m", "{}"): timestamp})
+    assert ring.count == 3
+    assert [ring.timestamps[slot] for slot in ring.slots()] == [40]
+    assert [ring.timestamps[slot] for slot in ring.slots(since=25)] == [40, 30, 20]
+    assert [ring.timestamps[slot] for slot in ring.slots(since=30)] == [40, 30]
+    assert ring.covers(20) and not ring.covers(19)
+
+
+def test_series_missing_from_every_held_scrape_are_dropped():
+    ring = ScrapeRing(2)
+    ring.add_scrape(10, {("a", "{}"): 1, ("b", "{}"): 1})
+    ring.add_scrape(20, {("a", "{}"): 2})
+    ring.add_scrape(30, {("a", "{}"): 3})
+    assert list(ring.series) == [("a", "{}")]
+    assert ring.series[("a", "{}")][ring.head] == 3
+
+
+def scrape(store, source, clock, value, labels='{"instance":"n1"}'):
+    batches = [[Sample("m", labels, value, None)]]
+    for _ in store.record_batches(source, batches):
+        pass
+    store.commit(source)
+    clock.now += 60
+
+
+def samples(window):
+    return sorted((ts, value) for _, ts, value in window.samples("m"))
+
+
+def test_window_selects_the_scrapes_inside_it(clock):
+    store = HotStore(size=5)
+    for value in (1, 2, 3):
+        scrape(store, "10.0.0.1", clock, value)
+    # Scrapes at 1000, 1060 and 1120; now is 1180
+    last_2m = parse_time_range("last 2m")
+    assert store.query(samples, last_2m, "append") == [(1060.0, 2.0), (1120.0, 3.0)]
+    # The window starts before the oldest held scrape
+    assert store.query(samples, parse_time_range("last 10m"), "append") is None
+    # Absolute windows and all history go to the database
+    assert store.query(samples, parse_time_range("all"), "append") is None
+    assert store.query(samples, parse_time_range("last 2m"), "replace") == [(1120.0, 3.0)]
+
+
+def test_window_of_one_cluster(clock):
+    store = HotStore(size=5)
+    scrape(store, "10.0.0.1", clock, 1)
+    scrape(store, "10.0.0.2", clock, 2)
+    window = parse_time_range("last 1h")
+    assert store.query(samples, window, "replace", cluster="10.0.0.2") == [(1060.0, 2.0)]
+    assert store.query(samples, window, "replace", cluster="10.0.0.3") is None
+    assert [samples(part) for part in store.query(lambda w: w.split(), window, "replace")] == [
+        [(1000.0, 1.0)],
+        [(1060.0, 2.0)],
+    ]
+
+
+def test_scrape_is_only_served_once_committed(clock):
+    store = HotStore(size=5)
+    for _ in store.record_batches("10.0.0.1", [[Sample("m", "{}", 1.0, None)]]):
+        pass
+    window = parse_time_range("last 1h")
+    assert store.query(samples, window, "replace") is None
+    store.rollback("10.0.0.1")
+    store.commit("10.0.0.1")
+    assert store.query(samples, window, "replace") is None
+    scrape(store, "10.0.0.1", clock, 2)
+    assert store.query(samples, window, "replace") == [(1000.0, 2.0)]
+
+
+def test_unfinished_scrape_is_never_staged(clock):
+    store = HotStore(size=5)
+    batches = store.record_batches("10.0.0.1", [[Sample("m", "{}", 1.0, None)], []])
+    next(batches)
+    store.commit("10.0.0.1")
+    assert store.stats()["targets"] == 0
+
+
+def test_high_latency_osds_keep_clusters_apart(clock):
+    store = HotStore(size=5)
+    for source, latency in (("10.0.0.1", 20.0), ("10.0.0.2", 300.0)):
+        batch = [Sample("ceph_osd_apply_latency_ms", '{"ceph_daemon":"osd.0"}', latency, None)]
+        for _ in store.record_batches(source, [batch]):
+            pass
+        store.commit(source)
+    rows = store.query(high_latency_osds_hot, parse_time_range("last 1h"), "replace")
+    assert rows == [("10.0.0.2", "osd.0", 300.0), ("10.0.0.1", "osd.0", 20.0)]
+    osds = high_latency_osds_response("last 1h", rows, None)["high_latency_osds"]
+    assert [osd["osd_id"] for osd in osds] == ["osd.0 (10.0.0.2)", "osd.0 (10.0.0.1)"]
+    one_cluster = store.query(
+        high_latency_osds_hot, parse_time_range("last 1h"), "replace", cluster="10.0.0.1"
+    )
+    osds = high_latency_osds_response("last 1h", one_cluster, None)["high_latency_osds"]
+    assert [(osd["osd_id"], osd["cluster"]) for osd in osds] == [("osd.0", "10.0.0.1")]
@@ -0,0 +1,81 @@
+import pytest
+
+from backend.clusters import ALL_CLUSTERS
+from backend.intent_router import (
+    IntentRouter,
+    format_degraded_pgs,
+    format_tool_output,
+    match_intent,
+)
+
+
+@pytest.mark.parametrize(
+    "question, intent",
+    [
+        ("What is the disk occupation?", "disk_occupation"),
+        ("any degraded pgs in the last 6h", "degraded_pgs"),
+        ("have any osds crashed today", "osd_crashes"),
+        ("is the cluster healthy", "cluster_health"),
+        ("which osds have high latency", "high_latency_osds"),
+        ("how many mons are there", "daemon_counts"),
+        ("give me an overview", "cluster_snapshot"),
+        # The snapshot answers every other intent too
+        ("summary of health and latency", "cluster_snapshot"),
+    ],
+)
+def test_match_intent(question, intent):
+    assert match_intent(question)[0] == intent
+
+
+@pytest.mark.parametrize(
+    "question",
+    [
+        "why is the cluster unhealthy",
+        "how do I fix degraded pgs",
+        "tell me about health and latency",
+        "hello there",
+        "disk " * 30,
+    ],
+)
+def test_ambiguous_or_reasoning_questions_fall_through(question):
+    assert match_intent(question) is None
+
+
+def test_match_intent_extracts_time_range_and_cluster():
+    assert match_intent("health of 10.0.65.187 in the last 2h") == (
+        "cluster_health",
+        "last 2h",
+        "10.0.65.187",
+    )
+    assert match_intent("disk usage on all clusters")[2] == ALL_CLUSTERS
+
+
+def test_route_calls_the_handler_directly():
+    calls = []
+
+    def health(time_range, cluster):
+        calls.append((time_range, cluster))
+        return "HEALTH_OK"
+
+    router = IntentRouter({"cluster_health": health})
+    assert router.route("is 10.0.0.1 healthy in the last 1h") == "HEALTH_OK"
+    assert calls == [("last 1h", "10.0.0.1")]
+    assert router.route("why is it unhealthy") is None
+
+
+def test_format_tool_output():
+    assert format_tool_output(None) == "⚠️ No data available."
+    assert format_tool_output("  a  \n\n  b ") == "a\nb"
+    assert format_tool_output({"status": "success", "osd.1": "ok", "osd.2": "down"}) == (
+        "**Osd.1**: ok\n\n**Osd.2**: down"
+    )
+
+
+def test_degraded_pgs_are_answered_in_a_sentence():
+    assert format_degraded_pgs("True", "last 6h") == "🟡 Degraded PGs detected (last 6h)."
+    assert format_degraded_pgs("False", "last 30m") == "✅ No degraded PGs (last 30m)."
+    assert format_degraded_pgs(None) == "⚠️ No data available."
+    router = IntentRouter(
+        {"degraded_pgs": lambda time_range, cluster: format_degraded_pgs("False", time_range)}
+    )
+    assert router.route("any degraded pgs in the last 2 hrs") == "✅ No degraded PGs (last 2h)."
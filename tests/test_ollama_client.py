@@ -0,0 +1,72 @@
+import threading
+import time
+
+import pytest
+
+from backend.benchmarks.ollama_stub import serve_in_thread
+from backend.ollama_client import OllamaClient, OllamaLLM, RequestQueue, keep_alive_value
+
+
+def test_slot_times_out_when_the_queue_is_full():
+    queue = RequestQueue(max_concurrent=1, timeout=0.05)
+    with queue.slot():
+        with pytest.raises(TimeoutError):
+            with queue.slot():
+                pass
+    stats = queue.stats()
+    assert (stats["running"], stats["served"], stats["rejected"]) == (0, 1, 1)
+
+
+def test_waiting_requests_are_served_in_arrival_order():
+    queue = RequestQueue(max_concurrent=1, timeout=5)
+    order = []
+
+    def request(name):
+        with queue.slot():
+            order.append(name)
+
+    with queue.slot():
+        threads = []
+        for name in "abc":
+            thread = threading.Thread(target=request, args=(name,))
+            thread.start()
+            threads.append(thread)
+            # Let it join the queue before the next one arrives
+            while queue.stats()["waiting"] < len(threads):
+                time.sleep(0.001)
+    for thread in threads:
+        thread.join()
+    assert order == ["a", "b", "c"]
+    assert queue.stats()["max_waiting"] == 3
+
+
+def test_keep_alive_value():
+    assert keep_alive_value("-1") == -1
+    assert keep_alive_value("300") == 300
+    assert keep_alive_value("30m") == "30m"
+
+
+@pytest.fixture(scope="module")
+def stub():
+    server = serve_in_thread(load_seconds=0, token_seconds=0.001, response_tokens=20)
+    yield server
+    server.shutdown()
+
+
+def test_generate_and_stats(stub):
+    client = OllamaClient(stub.url, max_concurrent=1)
+    text = client.generate("llama3", "is the cluster healthy", {"num_predict": 3})
+    assert text == "the cluster is "
+    assert client.last_stats["eval_count"] == 3
+    assert client.stats()["running"] == 0
+    client.close()
+
+
+def test_abandoned_stream_frees_its_slot(stub):
+    llm = OllamaLLM(model="llama3", base_url=stub.url)
+    tokens = llm.stream("is the cluster healthy")
+    next(tokens)
+    assert llm.client.queue.stats()["running"] == 1
+    tokens.close()
+    assert llm.client.queue.stats()["running"] == 0
+    assert llm.invoke("hi", options={"num_predict": 2}) == "the cluster "
@@ -0,0 +1,95 @@
+import asyncio
+import threading
+
+from backend import tool_cache
+from backend.response_cache import ResponseCache, normalize_query, query_scope
+
+
+def test_normalize_query_drops_case_punctuation_and_filler():
+    assert normalize_query("Is the cluster healthy?") == "cluster healthy"
+    assert normalize_query("What's the cluster's health") == "cluster health"
+
+
+def test_query_scope_keeps_time_range_and_numbers():
+    assert query_scope("latency of osd 12 in the last 2h") == ("last 2h", ("12", "2"))
+
+
+def test_equivalent_questions_share_an_answer(fresh_tool_cache):
+    cache = ResponseCache()
+    found, _, generation = cache.get("Is the cluster healthy?")
+    assert not found
+    cache.put("Is the cluster healthy?", "HEALTH_OK", generation)
+    assert cache.get("is the cluster healthy") == (True, "HEALTH_OK", generation)
+
+
+def test_a_committed_scrape_empties_the_cache(fresh_tool_cache):
+    cache = ResponseCache()
+    _, _, generation = cache.get("cluster health")
+    cache.put("cluster health", "HEALTH_OK", generation)
+    tool_cache.scrape_committed()
+    found, _, new_generation = cache.get("cluster health")
+    assert not found
+    assert new_generation == generation + 1
+
+
+def test_answer_computed_across_a_scrape_is_not_stored(fresh_tool_cache):
+    cache = ResponseCache()
+    _, _, generation = cache.get("cluster health")
+    tool_cache.scrape_committed()
+    cache.put("cluster health", "HEALTH_OK", generation)
+    assert not cache.get("cluster health")[0]
+
+
+def test_errors_warnings_and_follow_ups_are_not_cached(fresh_tool_cache):
+    cache = ResponseCache()
+    generation = fresh_tool_cache.generation
+    cache.put("disk usage", "❌ Database connection failed", generation)
+    cache.put("degraded pgs", "⚠️ No data available.", generation)
+    cache.put("osd crashes", "   ", generation)
+    assert cache.stats()["size"] == 0
+    # Follow-ups depend on the conversation, so they are never looked up
+    assert cache.get("why is that happening again") == (False, None, None)
+
+
+def test_lru_eviction(fresh_tool_cache):
+    cache = ResponseCache(maxsize=2)
+    generation = fresh_tool_cache.generation
+    cache.put("disk usage", "a", generation)
+    cache.put("degraded pgs", "b", generation)
+    assert cache.get("disk usage")[0]
+    cache.put("osd crashes", "c", generation)
+    assert not cache.get("degraded pgs")[0]
+    assert cache.get("disk usage")[1] == "a"
+    assert cache.stats()["evictions"] == 1
+
+
+def test_similar_question_hits_only_within_the_same_scope(fresh_tool_cache):
+    vectors = {
+        "cluster health last 1h": [1.0, 0.0],
+        "cluster state last 1h": [0.99, 0.05],
+        "cluster state last 2h": [0.99, 0.05],
+    }
+    cache = ResponseCache(embed=lambda text: vectors[text], similarity=0.9)
+    generation = fresh_tool_cache.generation
+    cache.put("cluster health in the last 1h", "HEALTH_OK", generation)
+    assert cache.get("cluster state in the last 1h")[:2] == (True, "HEALTH_OK")
+    assert not cache.get("cluster state in the last 2h")[0]
+    assert cache.stats()["semantic_hits"] == 1
+
+
+def test_async_lookups_embed_off_the_event_loop(fresh_tool_cache):
+    threads = []
+
+    def embed(text):
+        threads.append(threading.current_thread())
+        return [1.0, 0.0] if "health" in text else [0.99, 0.05]
+
+    async def ask():
+        cache = ResponseCache(embed=embed, similarity=0.9)
+        _, _, generation = await cache.aget("cluster health")
+        await cache.aput("cluster health", "HEALTH_OK", generation)
+        return await cache.aget("cluster state")
+
+    assert asyncio.run(ask())[:2] == (True, "HEALTH_OK")
+    assert len(threads) == 2
+    assert threading.main_thread() not in threads
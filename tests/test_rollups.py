@@ -0,0 +1,41 @@
+from datetime import datetime
+
+import pytest
+
+from backend import rollups
+from backend.rollups import pick_resolution, windowed_source
+from backend.time_range import TimeRange, parse_time_range
+
+
+@pytest.mark.parametrize(
+    "window, resolution",
+    [
+        # Fewer than ROLLUP_MIN_BUCKETS one-minute buckets: raw samples
+        ("last 20m", None),
+        ("last 30m", "1m"),
+        ("last 1h", "1m"),
+        ("last 2h", "5m"),
+        ("last 7d", "1h"),
+        ("all", "1h"),
+    ],
+)
+def test_pick_resolution(window, resolution):
+    assert pick_resolution(parse_time_range(window)) == resolution
+
+
+def test_pick_resolution_of_an_absolute_window():
+    day = TimeRange(datetime(2025, 2, 14), datetime(2025, 2, 15), None)
+    assert pick_resolution(day) == "1h"
+
+
+def test_windowed_source_binds_the_metric_name(monkeypatch):
+    monkeypatch.setattr(rollups, "STORAGE_MODE", "append")
+    source, params = windowed_source("ceph_pg_degraded", parse_time_range("last 7d"))
+    assert "FROM ceph_rollup_1h" in source and "metric_name = %s" in source
+    assert params == ["ceph_pg_degraded"]
+
+
+def test_metrics_without_rollups_read_the_raw_samples(monkeypatch):
+    monkeypatch.setattr(rollups, "STORAGE_MODE", "append")
+    source, _ = windowed_source("ceph_osd_up", parse_time_range("last 7d"))
+    assert "ceph_rollup" not in source
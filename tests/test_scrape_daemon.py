@@ -0,0 +1,88 @@
+import asyncio
+import time
+
+import httpx
+import pytest
+
+from backend import scrape_daemon
+from backend.scrape_daemon import LOCAL_TARGET, ScrapeDaemon
+
+
+class SlowWriter:
+    """Stands in for ingest_metric_lines, taking seconds_per_line per line."""
+
+    def __init__(self, seconds_per_line=0.01):
+        self.seconds_per_line = seconds_per_line
+        self.outcomes = []
+        self.running = 0
+
+    def __call__(self, lines, source):
+        self.running += 1
+        try:
+            rows = 0
+            for _ in lines:
+                time.sleep(self.seconds_per_line)
+                rows += 1
+        except Exception:
+            self.outcomes.append("rolled back")
+            raise
+        finally:
+            self.running -= 1
+        self.outcomes.append("committed")
+        return {"rows": rows, "tables": 1, "seconds": 0, "rows_per_sec": 0, "unchanged": 0}
+
+
+@pytest.fixture
+def writer(monkeypatch):
+    writer = SlowWriter()
+    monkeypatch.setattr(scrape_daemon, "ingest_metric_lines", writer)
+    return writer
+
+
+def scrape(daemon, writer, target, transport=None):
+    """The target's stats, and the writer's outcomes as soon as the scrape returned."""
+
+    async def main():
+        async with httpx.AsyncClient(transport=transport) as client:
+            await daemon._scrape_once(client, target)
+        return daemon.stats[target], list(writer.outcomes), writer.running
+
+    return asyncio.run(main())
+
+
+def test_timed_out_local_scrape_rolls_back_before_returning(writer, monkeypatch, tmp_path):
+    metrics = tmp_path / "metrics.txt"
+    metrics.write_text("m 1\n" * 100)
+    monkeypatch.setattr(scrape_daemon, "LOCAL_SAMPLE_METRICS_FILE", str(metrics))
+    daemon = ScrapeDaemon([LOCAL_TARGET], timeout=0.1)
+
+    stats, outcomes, running = scrape(daemon, writer, LOCAL_TARGET)
+    assert stats["failures"] == 1
+    assert (outcomes, running) == (["rolled back"], 0)
+
+
+def test_timed_out_remote_scrape_rolls_back_before_returning(writer, monkeypatch):
+    monkeypatch.setattr(
+        scrape_daemon.mgr_resolver, "metrics_url", lambda *args: "http://mgr:9283/metrics"
+    )
+
+    # The whole payload is queued at once, the writer is still busy with it
+    transport = httpx.MockTransport(lambda request: httpx.Response(200, content=b"m 1\n" * 100))
+    daemon = ScrapeDaemon(["10.0.0.1"], timeout=0.2)
+
+    stats, outcomes, running = scrape(daemon, writer, "10.0.0.1", transport)
+    assert stats["failures"] == 1
+    assert (outcomes, running) == (["rolled back"], 0)
+
+
+def test_remote_scrape_in_time(writer, monkeypatch):
+    writer.seconds_per_line = 0
+    monkeypatch.setattr(
+        scrape_daemon.mgr_resolver, "metrics_url", lambda *args: "http://mgr:9283/metrics"
+    )
+    transport = httpx.MockTransport(lambda request: httpx.Response(200, content=b"m 1\n" * 2500))
+    daemon = ScrapeDaemon(["10.0.0.1"], timeout=5)
+
+    stats, outcomes, _ = scrape(daemon, writer, "10.0.0.1", transport)
+    assert (stats["failures"], stats["samples"]) == (0, 2500)
+    assert outcomes == ["committed"]
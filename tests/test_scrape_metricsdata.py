@@ -0,0 +1,55 @@
+import csv
+import io
+import json
+import math
+
+import pytest
+
+from backend.exposition import canonical_labels
+from backend.scrape_metricsdata import copy_rows, format_value
+
+
+class CopyCursor:
+    def copy_expert(self, sql, buffer):
+        self.sql = sql
+        self.data = buffer.read()
+
+
+def copy(rows, cluster="local"):
+    cur = CopyCursor()
+    copy_rows(cur, "ceph_x_metrics", rows, cluster)
+    return cur
+
+
+@pytest.mark.parametrize(
+    "value, text",
+    [(1.5, "1.5"), (0.1, "0.1"), (1e-300, "1e-300"), (math.nan, "NaN"), (math.inf, "Infinity"), (-math.inf, "-Infinity")],
+)
+def test_format_value_uses_postgres_spellings(value, text):
+    assert format_value(value) == text
+    if not math.isnan(value):
+        assert float(text.replace("Infinity", "inf")) == value
+
+
+def test_copy_rows_uses_csv_with_the_cluster_column():
+    cur = copy([("m", "{}", 1.0)], cluster="10.0.0.1")
+    assert cur.sql == (
+        "COPY ceph_x_metrics (metric_name, labels, value, cluster) FROM STDIN WITH (FORMAT csv)"
+    )
+    assert cur.data == "m,{},1.0,10.0.0.1\r\n"
+
+
+def test_copy_rows_escapes_json_labels():
+    labels = {"path": 'C:\\dir\\"x"', "tab": "a\tb", "line": "a\nb", "list": "1,2", "null": "\\N"}
+    cur = copy([("m", canonical_labels(labels), 2.0)])
+    (row,) = csv.reader(io.StringIO(cur.data))
+    assert row[0] == "m"
+    assert json.loads(row[1]) == labels
+    assert row[2:] == ["2.0", "local"]
+    # No raw newline inside the value: one sample is one line
+    assert cur.data.count("\n") == 1
+
+
+def test_copy_rows_writes_missing_labels_as_null():
+    # An unquoted empty field is NULL in PostgreSQL's CSV format
+    assert copy([("m", None, math.nan)]).data == "m,,NaN,local\r\n"
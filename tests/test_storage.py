@@ -0,0 +1,69 @@
+from datetime import datetime
+
+import pytest
+
+from backend.storage import (
+    TransactionCache,
+    commit_caches,
+    metric_source,
+    partition_name,
+    rollback_caches,
+)
+
+
+class Cursor:
+    def __init__(self, connection):
+        self.connection = connection
+
+
+@pytest.fixture
+def cache():
+    cache = TransactionCache()
+    yield cache
+    cache.clear()
+
+
+def test_entries_are_only_shared_once_committed(cache):
+    a, b = Cursor("conn a"), Cursor("conn b")
+    cache.set(a, "ceph_x_metrics", 2)
+    assert cache.get(a, "ceph_x_metrics") == 2
+    assert cache.get(b, "ceph_x_metrics") is None
+    commit_caches("conn a")
+    assert cache.get(b, "ceph_x_metrics") == 2
+    assert len(cache) == 1
+
+
+def test_rollback_drops_only_that_transactions_entries(cache):
+    a, b = Cursor("conn a"), Cursor("conn b")
+    cache.set(a, "x")
+    cache.set(b, "y")
+    rollback_caches("conn a")
+    commit_caches("conn b")
+    assert cache.snapshot(a) == {"y": True}
+
+
+def test_discard_is_pending_too(cache):
+    a, b = Cursor("conn a"), Cursor("conn b")
+    cache.set(a, "p1")
+    commit_caches("conn a")
+    cache.discard(a, "p1")
+    assert cache.get(a, "p1") is None
+    assert cache.get(b, "p1") is True
+    assert cache.get_many(b, ["p1", "p2"]) == {"p1": True}
+    commit_caches("conn a")
+    assert cache.get(b, "p1") is None
+
+
+def test_partition_name_fits_postgres_identifiers():
+    day = datetime(2025, 2, 14)
+    assert partition_name("ceph_cephosdup_metrics", day) == "ceph_cephosdup_metrics_p20250214"
+    long_name = partition_name("ceph_" + "x" * 80 + "_metrics", day)
+    assert len(long_name) <= 63 and long_name.endswith("_p20250214")
+    assert long_name != partition_name("ceph_" + "x" * 81 + "_metrics", day)
+
+
+def test_metric_source_binds_the_metric_name():
+    assert metric_source("ceph_osd_up", layout="wide") == ("ceph_cephosdup_metrics", [])
+    source, params = metric_source("ceph_osd_up", layout="narrow")
+    assert "'ceph_osd_up'" not in source and "WHERE s.metric_name = %s" in source
+    assert params == ["ceph_osd_up"]
@@ -0,0 +1,93 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from backend.time_range import TimeRange, find_time_range, parse_time_range, tool_time_range
+
+
+@pytest.mark.parametrize(
+    "text, last",
+    [
+        ("last 15m", timedelta(minutes=15)),
+        ("past 2 hours", timedelta(hours=2)),
+        ("7d", timedelta(days=7)),
+        ("1.5h", timedelta(hours=1.5)),
+        ("last hour", timedelta(hours=1)),
+        ("'last 6h'", timedelta(hours=6)),
+        ("time_range: last 30s", timedelta(seconds=30)),
+        ("last 5 mins", timedelta(minutes=5)),
+        ("2 hrs", timedelta(hours=2)),
+        ("10 secs", timedelta(seconds=10)),
+    ],
+)
+def test_relative(text, last):
+    assert parse_time_range(text) == TimeRange(None, None, last)
+
+
+def test_absolute():
+    assert parse_time_range("2025-02-14 16:40 to 2025-02-17 16:40") == TimeRange(
+        datetime(2025, 2, 14, 16, 40), datetime(2025, 2, 17, 16, 40), None
+    )
+    assert parse_time_range("between 2025-02-14 and 2025-02-15").end == datetime(2025, 2, 15)
+
+
+def test_bare_date_is_that_whole_day():
+    assert parse_time_range("2025-02-14") == TimeRange(
+        datetime(2025, 2, 14), datetime(2025, 2, 15), None
+    )
+
+
+def test_since_and_all():
+    assert parse_time_range("since 2025-02-14 08:00") == TimeRange(
+        datetime(2025, 2, 14, 8), None, None
+    )
+    assert parse_time_range("all").unbounded
+    assert parse_time_range("all").seconds() is None
+
+
+def test_empty_input_uses_the_default():
+    assert parse_time_range(None, "last 1h") == parse_time_range("none", "last 1h")
+    assert parse_time_range("", "last 1h").last == timedelta(hours=1)
+
+
+@pytest.mark.parametrize(
+    "text", ["2025-02-17 to 2025-02-14", "0m", "sometime", "2025-02-14 to 2025-02-15 to 2025-02-16"]
+)
+def test_invalid(text):
+    with pytest.raises(ValueError):
+        parse_time_range(text)
+
+
+def test_tool_time_range_falls_back_to_the_default():
+    assert tool_time_range("is the cluster healthy?") == parse_time_range(None)
+
+
+def test_where_clauses():
+    assert parse_time_range("last 1h").where(lookback=60) == (
+        "timestamp >= LOCALTIMESTAMP - %s::interval",
+        ["3660.0 seconds"],
+    )
+    start, end = datetime(2025, 2, 14), datetime(2025, 2, 15)
+    assert TimeRange(start, end, None).where("ts") == ("ts >= %s AND ts <= %s", [start, end])
+    assert TimeRange(None, None, None).where() == ("TRUE", [])
+
+
+def test_str_round_trips():
+    for text in ("last 15m", "last 2h", "last 7d", "all time", "2025-02-14 00:00:00 to 2025-02-15 00:00:00"):
+        assert str(parse_time_range(text)) == text
+
+
+@pytest.mark.parametrize(
+    "question, found",
+    [
+        ("any osd crashes in the last 2 hours?", "last 2 hours"),
+        ("any crash last 5 mins", "last 5 mins"),
+        ("latency over the past 3 hrs?", "last 3 hrs"),
+        ("health from 2025-02-14 to 2025-02-15", "2025-02-14 to 2025-02-15"),
+        ("disk usage since 2025-02-14 10:00", "since 2025-02-14 10:00"),
+        ("has the cluster ever been degraded", "all"),
+        ("is the cluster healthy", None),
+    ],
+)
+def test_find_time_range(question, found):
+    assert find_time_range(question) == found
@@ -0,0 +1,144 @@
+import asyncio
+
+from backend import tool_cache
+from backend.fanout import FanOutResult, FanOutStatus
+from backend.tool_cache import ToolCache, cached_tool
+
+
+def test_lru_evicts_least_recently_used():
+    cache = ToolCache(maxsize=2)
+    cache.put("a", 1, cache.generation)
+    cache.put("b", 2, cache.generation)
+    assert cache.get("a") == (True, 1)
+    cache.put("c", 3, cache.generation)
+    assert cache.get("b") == (False, None)
+    assert cache.get("a") == (True, 1)
+    assert cache.get("c") == (True, 3)
+
+
+def test_invalidate_empties_the_cache_and_bumps_the_generation():
+    cache = ToolCache()
+    cache.put("a", 1, cache.generation)
+    cache.invalidate()
+    assert cache.generation == 1
+    assert cache.get("a") == (False, None)
+    assert cache.stats()["invalidations"] == 1
+
+
+def test_put_of_a_result_that_raced_a_scrape_is_ignored():
+    cache = ToolCache()
+    generation = cache.generation
+    cache.invalidate()
+    cache.put("a", 1, generation)
+    assert cache.get("a") == (False, None)
+
+
+def test_cached_tool_reuses_results_until_a_scrape_commits(fresh_tool_cache):
+    calls = []
+
+    @cached_tool
+    def tool(time_range=None, cluster=None):
+        calls.append((time_range, cluster))
+        return {"status": "success", "health": len(calls)}
+
+    assert tool("last 1h") == {"status": "success", "health": 1}
+    assert tool("last 1h") == {"status": "success", "health": 1}
+    assert tool("last 2h")["health"] == 2
+    tool_cache.scrape_committed()
+    assert tool("last 1h")["health"] == 3
+    assert len(calls) == 3
+
+
+def test_cached_tool_does_not_cache_errors_or_partial_results(fresh_tool_cache):
+    results = iter(
+        [
+            "❌ Database connection failed",
+            None,
+            {"status": "error", "message": "boom"},
+            {"osd.1": "ok", "partial": "⚠️ Partial result"},
+            "ok",
+        ]
+    )
+
+    @cached_tool
+    def tool(time_range=None):
+        return next(results)
+
+    for _ in range(4):
+        tool()
+    assert tool() == "ok"
+    assert tool() == "ok"
+
+
+def test_cached_tool_skips_fan_out_results_with_missing_clusters(fresh_tool_cache):
+    calls = []
+
+    @cached_tool
+    def tool(time_range=None):
+        calls.append(time_range)
+        status = FanOutStatus(timeout=1)
+        status.add("10.0.0.2", TimeoutError())
+        return FanOutResult(status)
+
+    tool()
+    tool()
+    assert len(calls) == 2
+
+
+def test_cached_tool_ignores_a_result_computed_across_a_scrape(fresh_tool_cache):
+    calls = []
+
+    @cached_tool
+    def tool(time_range=None):
+        calls.append(time_range)
+        # A scrape commits while the query runs
+        tool_cache.scrape_committed()
+        return "stale"
+
+    tool()
+    tool()
+    assert len(calls) == 2
+
+
+def test_cached_tool_runs_uncached_without_the_listener(fresh_tool_cache):
+    # Scrapes by other processes would go unnoticed
+    tool_cache.ensure_listener().connected.clear()
+    calls = []
+
+    @cached_tool
+    def tool(time_range=None):
+        calls.append(time_range)
+        return "ok"
+
+    tool()
+    tool()
+    assert len(calls) == 2
+
+
+def test_cached_async_tool(fresh_tool_cache):
+    calls = []
+
+    @cached_tool
+    async def tool(time_range=None, cluster=None):
+        calls.append(time_range)
+        return "ok"
+
+    async def main():
+        return [await tool("last 1h"), await tool("last 1h"), await tool(time_range="last 1h")]
+
+    assert asyncio.run(main()) == ["ok", "ok", "ok"]
+    # Positional and keyword arguments are different keys
+    assert len(calls) == 2
+
+
+def test_unhashable_arguments_are_not_cached(fresh_tool_cache):
+    calls = []
+
+    @cached_tool
+    def tool(time_range=None):
+        calls.append(time_range)
+        return "ok"
+
+    tool(["last 1h"])
+    tool(["last 1h"])
+    assert len(calls) == 2